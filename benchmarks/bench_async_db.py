@@ -0,0 +1,94 @@
+"""
+Throughput comparison of the sync (blocking Session inside ``async def``) and async (AsyncSession) data paths.
+
+Both paths run the same "get post by id" lookup from many concurrent coroutines against a seeded SQLite file,
+while a ticker coroutine measures how late the event loop wakes it up (event loop lag).
+
+Usage:
+    python -m benchmarks.bench_async_db [--posts 2000] [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Post, User
+from src.repository import posts as posts_repository
+
+
+def seed(url: str, posts: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        user = User(username='bench', email='bench@example.com', password='bench')
+        db.add(user)
+        db.flush()
+        db.add_all([Post(photo_url=f'media/{i}.jpg', description=f'post {i}', user_id=user.id)
+                    for i in range(posts)])
+        db.commit()
+    engine.dispose()
+
+
+async def ticker(stop: asyncio.Event, lags: list, interval: float = 0.005) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - started - interval)
+
+
+async def run(name: str, worker, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+
+    async def one():
+        async with semaphore:
+            await worker()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] * 1000 if lags else 0.0
+    print(f'{name:<6} {requests / elapsed:10.1f} req/s   loop lag max {max(lags, default=0) * 1000:7.2f} ms'
+          f'   p99 {p99:7.2f} ms')
+
+
+async def main(posts: int, requests: int, concurrency: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(f'sqlite:///{path}', posts)
+
+    sync_session = sessionmaker(bind=create_engine(f'sqlite:///{path}'))
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}', pool_size=concurrency)
+    async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def sync_worker():
+        # the pre-async repository code: a blocking query inside a coroutine
+        with sync_session() as db:
+            db.scalar(select(Post).filter(Post.id == random.randint(1, posts)))
+
+    async def async_worker():
+        async with async_session() as db:
+            await posts_repository.get_post(random.randint(1, posts), db)
+
+    await run('sync', sync_worker, requests, concurrency)
+    await run('async', async_worker, requests, concurrency)
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.posts, args.requests, args.concurrency))
@@ -0,0 +1,92 @@
+"""
+Cost of a page of the comments listing of a post with thousands of comments: the former N+1 path (one query for
+the page, then one query per comment for its author) against the joined projection
+(comments_repository.get_comments_with_authors, one query per page).
+
+Every page of the post is read through the cursor, as a client scrolling the comments would.
+
+Usage:
+    python -m benchmarks.bench_comments [--comments 5000] [--authors 200] [--limit 100]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Comment, Post, User
+from src.repository import comments as comments_repository
+from src.services.pagination import next_cursor, paginate
+
+
+def seed(url: str, comments: int, authors: int) -> int:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password='bench', first_name='Bench',
+                      last_name=f'User {i}') for i in range(authors)]
+        db.add_all(users)
+        db.flush()
+        post = Post(photo_url='media/bench.jpg', description='bench', user_id=users[0].id)
+        db.add(post)
+        db.flush()
+        db.add_all([Comment(comment_text=f'comment {i}', post_id=post.id, user_id=users[i % authors].id)
+                    for i in range(comments)])
+        db.commit()
+        post_id = post.id
+    engine.dispose()
+    return post_id
+
+
+async def main(comments: int, authors: int, limit: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    post_id = seed(f'sqlite:///{path}', comments, authors)
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', count)
+
+    async def n_plus_one(db, cursor):
+        sql = paginate(select(Comment).filter_by(post_id=post_id), comments_repository.COMMENTS_ORDER, 0, limit, cursor)
+        page = (await db.scalars(sql)).all()
+        for comment in page:
+            author = await db.scalar(select(User).filter_by(id=comment.user_id))
+            (comment.id, comment.comment_text, author.first_name, author.last_name, author.username)
+        return page
+
+    async def joined(db, cursor):
+        page = await comments_repository.get_comments_with_authors(0, limit, db, post_id, cursor)
+        for row in page:
+            (row.id, row.comment_text, row.first_name, row.last_name, row.username)
+        return page
+
+    for name, read_page in (('n+1', n_plus_one), ('joined', joined)):
+        queries[0], pages, cursor = 0, 0, None
+        started = time.perf_counter()
+        while True:
+            async with async_session() as db:
+                page = await read_page(db, cursor)
+            pages += 1
+            cursor = next_cursor(page, comments_repository.COMMENTS_ORDER, limit)
+            if cursor is None:
+                break
+        elapsed = time.perf_counter() - started
+        print(f'{name:<7} {pages} pages   {elapsed / pages * 1000:8.2f} ms/page   {queries[0] / pages:6.1f} queries/page')
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--authors', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.comments, args.authors, args.limit))
@@ -0,0 +1,61 @@
+"""
+Latency of the other requests of a worker during a login storm, with bcrypt verification run inline
+(in the request coroutine, as the login route used to) and in the password pool.
+
+Many concurrent logins verify a password against a bcrypt hash, while a ticker coroutine, standing for the
+other (cheap) requests served by the same worker, measures how late the event loop wakes it up.
+
+Usage:
+    python -m benchmarks.bench_login_storm [--logins 40] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.bench_async_db import ticker
+from src.services.auth import auth_service
+from src.services.password_pool import password_pool
+
+
+async def run(name: str, worker, logins: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+
+    async def one():
+        async with semaphore:
+            await worker()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p50 = lags[len(lags) // 2] * 1000 if lags else 0.0
+    p99 = lags[int(len(lags) * 0.99) - 1] * 1000 if lags else 0.0
+    print(f'{name:<7} {logins / elapsed:8.1f} logins/s   other requests: {len(lags):5} served, '
+          f'lag p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   max {max(lags, default=0) * 1000:7.2f} ms')
+
+
+async def main(logins: int, concurrency: int) -> None:
+    hashed = auth_service.get_password_hash('benchmark')
+
+    async def inline_worker():
+        auth_service.verify_password('benchmark', hashed)
+
+    async def pool_worker():
+        await auth_service.verify_password_async('benchmark', hashed)
+
+    await run('inline', inline_worker, logins, concurrency)
+    await run('pool', pool_worker, logins, concurrency)
+    print(password_pool.stats())
+    password_pool.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
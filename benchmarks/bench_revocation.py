@@ -0,0 +1,56 @@
+"""
+Cost of the revocation check done for every authenticated request (RevocationList.is_revoked), compared with
+decoding the access token, which every request pays anyway.
+
+The list holds --revoked revoked jtis and users; the checked tokens are not revoked, the common case.
+
+Usage:
+    python -m benchmarks.bench_revocation [--revoked 100000] [--checks 100000]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+from src.database.models import RevokedToken
+from src.services.auth import auth_service
+from src.services.revocation import RevocationList, user_key
+
+
+def measure(name: str, func, checks: int) -> float:
+    started = time.perf_counter()
+    for _ in range(checks):
+        func()
+    per_call = (time.perf_counter() - started) / checks * 1e6
+    print(f'{name:<22} {per_call:8.2f} us/call')
+    return per_call
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--revoked', type=int, default=100000)
+    parser.add_argument('--checks', type=int, default=100000)
+    args = parser.parse_args()
+
+    revocations = RevocationList(args.revoked, 0.001)
+    now = datetime.utcnow()
+    for i in range(args.revoked):
+        jti = user_key(i) if i % 10 == 0 else f'{i:032x}'
+        revocations.add(RevokedToken(jti=jti, revoked_at=now, expires_at=now + timedelta(days=1)))
+    print(f'{len(revocations.entries)} revocations, Bloom filter {len(revocations.bloom.bits) / 1024:.0f} KiB, '
+          f'{revocations.bloom.hashes} hashes')
+
+    token = asyncio.run(auth_service.create_access_token(
+        data={'sub': 'user@example.com', 'uid': args.revoked + 1, 'role': 'User', 'active': True, 'ver': 0}))
+    payload = asyncio.run(auth_service.decode_access_token(token))
+    decode = measure('decode access token',
+                     lambda: jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM]),
+                     args.checks // 10)
+    check = measure('is_revoked', lambda: revocations.is_revoked(payload), args.checks)
+    print(f'revocation check: {check / decode * 100:.1f}% of decoding')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Latency of the admin user search (search_repository.get_search_users) on synthetic users: the former ILIKE scan
+over username, first name, last name and email against the trigram index (an FTS5 trigram table on SQLite,
+pg_trgm on Postgres), for growing numbers of users.
+
+Every size searches for whole usernames (one match), last names (about users / 500 matches, a page of 20 is read)
+and short fragments of last names, sorted by username and by relevance (the ILIKE path has no rank,
+it sorts by username).
+
+Usage:
+    python -m benchmarks.bench_user_search [--sizes 10000 100000 1000000] [--queries 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, or_, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.models import Base, User
+from src.repository import search as search_repository
+from src.services.pagination import paginate
+
+FIRST_NAMES = ['Anna', 'Boris', 'Clara', 'Dmytro', 'Elena', 'Fedir', 'Galyna', 'Ihor', 'Kateryna', 'Larysa',
+               'Mykola', 'Nadia', 'Oleh', 'Petro', 'Roksolana', 'Serhii', 'Taras', 'Uliana', 'Vira', 'Yurii']
+SYLLABLES = ['ko', 'shen', 'vy', 'chuk', 'len', 'dar', 'ma', 'ryk', 'sol', 'tan', 'bo', 'hra', 'nyk', 'zu', 'pel']
+BATCH = 10000
+
+
+def last_names(rnd: random.Random) -> list:
+    names = set()
+    while len(names) < 500:
+        names.add(''.join(rnd.choice(SYLLABLES) for _ in range(3)).capitalize())
+    return sorted(names)
+
+
+def seed(url: str, users: int, surnames: list, rnd: random.Random) -> list:
+    usernames = []
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for start in range(0, users, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, users)):
+                first_name, last_name = rnd.choice(FIRST_NAMES), rnd.choice(surnames)
+                username = f'{first_name.lower()}.{last_name.lower()}{i}'
+                usernames.append(username)
+                rows.append({'username': username, 'first_name': first_name, 'last_name': last_name,
+                             'email': f'{username}@example.com', 'password': 'bench'})
+            connection.execute(insert(User), rows)
+    engine.dispose()
+    return usernames
+
+
+async def ilike(search_str: str, sort: str, db) -> list:
+    sql = select(User).filter(or_(User.username.ilike(f'%{search_str}%'), User.first_name.ilike(f'%{search_str}%'),
+                                  User.last_name.ilike(f'%{search_str}%'), User.email.ilike(f'%{search_str}%')))
+    keys = search_repository.get_user_sort_keys('username' if sort == 'relevance' else sort)
+    return (await db.scalars(paginate(sql, keys, 0, 20))).all()
+
+
+async def trigram(search_str: str, sort: str, db) -> list:
+    return await search_repository.get_search_users(search_str, sort, -1 if sort == 'relevance' else 1, 0, 20, db)
+
+
+async def run(users: int, queries: int) -> None:
+    rnd = random.Random(users)
+    surnames = last_names(rnd)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    started = time.perf_counter()
+    usernames = seed(f'sqlite:///{path}', users, surnames, rnd)
+    print(f'{users} users seeded in {time.perf_counter() - started:.1f} s')
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+    workloads = {
+        'username': rnd.choices(usernames, k=queries),
+        'last name': rnd.choices(surnames, k=queries),
+        'fragment': [name[1:5].lower() for name in rnd.choices(surnames, k=queries)],
+    }
+    for workload, searches in workloads.items():
+        for sort in ('username', 'relevance'):
+            timings = {}
+            for name, search in (('ilike', ilike), ('trigram', trigram)):
+                async with async_session() as db:
+                    await search(searches[0], sort, db)
+                    started = time.perf_counter()
+                    for search_str in searches:
+                        await search(search_str, sort, db)
+                    timings[name] = (time.perf_counter() - started) / len(searches) * 1000
+            print(f'  {workload:<10} sort={sort:<10} ilike {timings["ilike"]:9.2f} ms   '
+                  f'trigram {timings["trigram"]:8.2f} ms   x{timings["ilike"] / timings["trigram"]:.0f}')
+    await async_engine.dispose()
+    os.remove(path)
+
+
+async def main(sizes: list, queries: int) -> None:
+    for users in sizes:
+        await run(users, queries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.queries))
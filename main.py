@@ -4,20 +4,46 @@ import pathlib
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connect import get_db
-from src.routes import auth, posts, users, transform_posts, rates, comments, search
+from src.database.connect import get_db, SessionLocal
+from src.repository import search_index
+from src.repository.tags import load_tag_index
+from src.services import cloudynary, renditions, transform_engine, upload_queue
+from src.services.password_pool import password_pool
+from src.services.revocation import revocation_list
+from src.routes import auth, posts, users, transform_posts, rates, comments, search, tags
 from src.services.messages_templates import DB_CONFIG_ERROR, DB_CONNECT_ERROR, WELCOME_MESSAGE
 
 app = FastAPI()
 pathlib.Path("media").mkdir(exist_ok=True)
 app.mount("/media", StaticFiles(directory="media"), name="media")
 
+
+@app.on_event("startup")
+async def startup():
+    async with SessionLocal() as db:
+        await search_index.search_backend.startup(db)
+        await load_tag_index(db)
+    await revocation_list.startup()
+    upload_queue.upload_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await upload_queue.upload_worker.stop()
+    await revocation_list.shutdown()
+    search_index.search_backend.shutdown()
+    renditions.shutdown_pool()
+    transform_engine.transform_engine.shutdown()
+    cloudynary.shutdown_pool()
+    password_pool.shutdown()
+
+
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail=DB_CONFIG_ERROR)
@@ -39,6 +65,7 @@ app.include_router(transform_posts.router, prefix='/api')
 app.include_router(rates.router, prefix='/api')
 app.include_router(search.router, prefix='/api')
 app.include_router(comments.router, prefix='/api')
+app.include_router(tags.router, prefix='/api')
 
 # if __name__ == '__main__':
 #     uvicorn.run(app="main:app", reload=True)
@@ -0,0 +1,24 @@
+"""posts photo_url index
+
+Revision ID: 2f7a9b3c5d18
+Revises: 8c2d4e6f1a37
+Create Date: 2026-10-17 11:02:37.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7a9b3c5d18'
+down_revision = '8c2d4e6f1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_posts_photo_url'), 'posts', ['photo_url'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_posts_photo_url'), table_name='posts')
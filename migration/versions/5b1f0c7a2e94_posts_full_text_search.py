@@ -0,0 +1,39 @@
+"""posts full text search
+
+Revision ID: 5b1f0c7a2e94
+Revises: d3e368749060
+Create Date: 2026-10-16 23:52:10.418236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c7a2e94'
+down_revision = 'd3e368749060'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE TABLE posts_search (post_id INTEGER PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE, "
+                   "document TSVECTOR NOT NULL)")
+        op.execute("CREATE INDEX ix_posts_search_document ON posts_search USING gin (document)")
+        op.execute("INSERT INTO posts_search (post_id, document) "
+                   "SELECT posts.id, setweight(to_tsvector('simple', coalesce(posts.description, '')), 'A') || "
+                   "setweight(to_tsvector('simple', coalesce(string_agg(tags.tag, ' '), '')), 'B') "
+                   "FROM posts LEFT JOIN post_tag ON post_tag.post = posts.id "
+                   "LEFT JOIN tags ON tags.id = post_tag.tag GROUP BY posts.id")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE posts_search USING fts5(description, tags)")
+        op.execute("INSERT INTO posts_search (rowid, description, tags) "
+                   "SELECT posts.id, coalesce(posts.description, ''), coalesce(group_concat(tags.tag, ' '), '') "
+                   "FROM posts LEFT JOIN post_tag ON post_tag.post = posts.id "
+                   "LEFT JOIN tags ON tags.id = post_tag.tag GROUP BY posts.id")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS posts_search")
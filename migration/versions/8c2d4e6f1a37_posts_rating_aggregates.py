@@ -0,0 +1,35 @@
+"""posts rating aggregates
+
+Revision ID: 8c2d4e6f1a37
+Revises: 5b1f0c7a2e94
+Create Date: 2026-10-17 09:14:52.531806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d4e6f1a37'
+down_revision = '5b1f0c7a2e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('rating', sa.Float(), server_default='0', nullable=False))
+    op.execute("UPDATE posts SET "
+               "rating_sum = (SELECT coalesce(sum(rate), 0) FROM rates_posts WHERE photo_id = posts.id), "
+               "rating_count = (SELECT count(id) FROM rates_posts WHERE photo_id = posts.id), "
+               "rating = (SELECT coalesce(avg(CAST(rate AS FLOAT)), 0) FROM rates_posts WHERE photo_id = posts.id)")
+    op.create_index('ix_posts_rating', 'posts', ['rating', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_rating', table_name='posts')
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('rating')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
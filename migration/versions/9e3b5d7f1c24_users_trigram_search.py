@@ -0,0 +1,54 @@
+"""users trigram search
+
+Revision ID: 9e3b5d7f1c24
+Revises: d4f7a1c3e5b8
+Create Date: 2026-10-17 10:41:27.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b5d7f1c24'
+down_revision = 'd4f7a1c3e5b8'
+branch_labels = None
+depends_on = None
+
+USERS_SEARCH_DOCUMENT = ("lower(coalesce(username, '') || ' ' || coalesce(first_name, '') || ' ' || "
+                         "coalesce(last_name, '') || ' ' || coalesce(email, ''))")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX ix_users_search_trgm ON users USING gin (({USERS_SEARCH_DOCUMENT}) gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE users_search USING fts5(username, first_name, last_name, email, "
+                   "content='users', content_rowid='id', tokenize='trigram')")
+        op.execute("CREATE TRIGGER users_search_insert AFTER INSERT ON users BEGIN "
+                   "INSERT INTO users_search (rowid, username, first_name, last_name, email) "
+                   "VALUES (new.id, new.username, new.first_name, new.last_name, new.email); END")
+        op.execute("CREATE TRIGGER users_search_delete AFTER DELETE ON users BEGIN "
+                   "INSERT INTO users_search (users_search, rowid, username, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.email); END")
+        op.execute("CREATE TRIGGER users_search_update AFTER UPDATE OF username, first_name, last_name, email "
+                   "ON users BEGIN "
+                   "INSERT INTO users_search (users_search, rowid, username, first_name, last_name, email) "
+                   "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.email); "
+                   "INSERT INTO users_search (rowid, username, first_name, last_name, email) "
+                   "VALUES (new.id, new.username, new.first_name, new.last_name, new.email); END")
+        # indexes the existing users from the content table
+        op.execute("INSERT INTO users_search (users_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_users_search_trgm")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS users_search_insert")
+        op.execute("DROP TRIGGER IF EXISTS users_search_delete")
+        op.execute("DROP TRIGGER IF EXISTS users_search_update")
+        op.execute("DROP TABLE IF EXISTS users_search")
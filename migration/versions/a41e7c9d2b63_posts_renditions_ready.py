@@ -0,0 +1,25 @@
+"""posts renditions_ready
+
+Revision ID: a41e7c9d2b63
+Revises: 2f7a9b3c5d18
+Create Date: 2026-10-17 12:26:04.118730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41e7c9d2b63'
+down_revision = '2f7a9b3c5d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('renditions_ready', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('renditions_ready')
@@ -0,0 +1,26 @@
+"""posts comment_count
+
+Revision ID: b8d1e4f6c2a9
+Revises: f2c6d9e3a8b4
+Create Date: 2026-10-17 18:12:26.640194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d1e4f6c2a9'
+down_revision = 'f2c6d9e3a8b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("UPDATE posts SET comment_count = (SELECT count(id) FROM comments WHERE post_id = posts.id)")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('comment_count')
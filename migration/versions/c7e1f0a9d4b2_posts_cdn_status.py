@@ -0,0 +1,25 @@
+"""posts cdn_status
+
+Revision ID: c7e1f0a9d4b2
+Revises: a41e7c9d2b63
+Create Date: 2026-10-17 14:02:37.551204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1f0a9d4b2'
+down_revision = 'a41e7c9d2b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('cdn_status', sa.String(length=10), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('cdn_status')
@@ -0,0 +1,51 @@
+"""hot column indexes
+
+Revision ID: d4f7a1c3e5b8
+Revises: b8d1e4f6c2a9
+Create Date: 2026-10-17 19:30:11.284067
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f7a1c3e5b8'
+down_revision = 'b8d1e4f6c2a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # duplicates would break the unique indexes: a user keeps the first rate of a post, a post each tag once
+    op.execute("DELETE FROM rates_posts WHERE id NOT IN (SELECT min(id) FROM rates_posts GROUP BY photo_id, user_id)")
+    op.execute("UPDATE posts SET "
+               "rating_sum = (SELECT coalesce(sum(rate), 0) FROM rates_posts WHERE photo_id = posts.id), "
+               "rating_count = (SELECT count(id) FROM rates_posts WHERE photo_id = posts.id), "
+               "rating = (SELECT coalesce(avg(CAST(rate AS FLOAT)), 0) FROM rates_posts WHERE photo_id = posts.id)")
+    op.execute("DELETE FROM post_tag WHERE id NOT IN (SELECT min(id) FROM post_tag GROUP BY post, tag)")
+
+    op.create_index('ix_posts_user_id_created_at', 'posts', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_posts_created_at', 'posts', ['created_at', 'id'], unique=False)
+    op.create_index('ix_comments_post_id_created_at', 'comments', ['post_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_comments_user_id', 'comments', ['user_id'], unique=False)
+    op.create_index('ix_transform_posts_photo_id_created_at', 'transform_posts', ['photo_id', 'created_at', 'id'],
+                    unique=False)
+    op.create_index('uq_rates_posts_photo_id_user_id', 'rates_posts', ['photo_id', 'user_id'], unique=True)
+    op.create_index('ix_rates_posts_user_id_created_at', 'rates_posts', ['user_id', 'created_at', 'id'], unique=False)
+    with op.batch_alter_table('post_tag') as batch_op:
+        batch_op.create_unique_constraint('uq_post_tag_post_tag', ['post', 'tag'])
+    op.create_index('ix_post_tag_tag', 'post_tag', ['tag'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_tag_tag', table_name='post_tag')
+    with op.batch_alter_table('post_tag') as batch_op:
+        batch_op.drop_constraint('uq_post_tag_post_tag', type_='unique')
+    op.drop_index('ix_rates_posts_user_id_created_at', table_name='rates_posts')
+    op.drop_index('uq_rates_posts_photo_id_user_id', table_name='rates_posts')
+    op.drop_index('ix_transform_posts_photo_id_created_at', table_name='transform_posts')
+    op.drop_index('ix_comments_user_id', table_name='comments')
+    op.drop_index('ix_comments_post_id_created_at', table_name='comments')
+    op.drop_index('ix_posts_created_at', table_name='posts')
+    op.drop_index('ix_posts_user_id_created_at', table_name='posts')
@@ -0,0 +1,25 @@
+"""users token_version
+
+Revision ID: e5a8b2c1f7d3
+Revises: c7e1f0a9d4b2
+Create Date: 2026-10-17 16:21:08.307415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8b2c1f7d3'
+down_revision = 'c7e1f0a9d4b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
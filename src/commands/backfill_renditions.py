@@ -0,0 +1,50 @@
+"""
+Renders the missing renditions (see src/services/renditions.py) of existing posts.
+
+Usage:
+    python -m src.commands.backfill_renditions [--all]
+
+With --all, renditions of every post are rendered again, e.g. after the set of rendition sizes changed.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, update
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal, engine
+from src.database.models import Post
+from src.repository.posts import render_post_renditions
+from src.services import renditions
+
+
+async def main(render_all: bool) -> None:
+    async with SessionLocal() as db:
+        if render_all:
+            await db.execute(update(Post).values(renditions_ready=False))
+            await db.commit()
+        photo_urls = (await db.scalars(select(Post.photo_url).filter(Post.renditions_ready.is_(False))
+                                       .distinct())).all()
+    rendered = failed = 0
+    # as many files at once as the rendition pool renders, so the tasks don't wait for it holding sessions
+    semaphore = asyncio.Semaphore(settings.rendition_workers)
+
+    async def render(photo_url: str) -> None:
+        nonlocal rendered, failed
+        async with semaphore, SessionLocal() as db:
+            if await render_post_renditions(photo_url, db):
+                rendered += 1
+            else:
+                failed += 1
+
+    await asyncio.gather(*(render(photo_url) for photo_url in photo_urls))
+    renditions.shutdown_pool()
+    await engine.dispose()
+    print(f'Renditions rendered for {rendered} files, {failed} failed')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true')
+    args = parser.parse_args()
+    asyncio.run(main(args.all))
@@ -0,0 +1,22 @@
+"""
+Recomputes the rating aggregates (rating_sum, rating_count, rating) of all posts from the rates table.
+Run it once after the migration that adds the columns, or whenever the aggregates are suspected to be out of sync.
+
+Usage:
+    python -m src.commands.recompute_ratings
+"""
+import asyncio
+
+from src.database.connect import SessionLocal, engine
+from src.repository.rates import recompute_ratings
+
+
+async def main() -> None:
+    async with SessionLocal() as db:
+        repaired = await recompute_ratings(db)
+    await engine.dispose()
+    print(f'Rating aggregates repaired for {repaired} posts')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Compares the content-addressed files of the media store with the photo_url of the posts.
+Reports orphaned files (no post references them) and missing files (posts reference them, but they don't exist).
+Renditions (see src/services/renditions.py) belong to the file they were rendered from: they are orphaned
+once no file with the same content is kept.
+
+Usage:
+    python -m src.commands.reconcile_media [--delete] [--min-age 3600]
+
+With --delete, orphaned files older than --min-age seconds are deleted, with their renditions. The age limit keeps
+files of uploads that are still being saved (stored, but their post not committed yet).
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from src.database.connect import SessionLocal, engine
+from src.database.models import Post
+from src.services import media_storage, renditions
+
+
+async def main(delete: bool, min_age: int) -> None:
+    async with SessionLocal() as db:
+        referenced = set((await db.scalars(select(Post.photo_url).distinct())).all())
+    await engine.dispose()
+    blobs = set()
+    renditions_of = defaultdict(list)
+    for path in media_storage.iter_files():
+        sha256 = renditions.rendition_source(path)
+        if sha256 is not None:
+            renditions_of[sha256].append(path)
+        elif media_storage.is_blob_path(path):
+            blobs.add(path)
+    orphans = sorted(blobs - referenced)
+    missing = sorted(path for path in referenced - blobs if path and media_storage.is_blob_path(path))
+    for path in missing:
+        print(f'missing  {path}')
+    deadline = time.time() - min_age
+    deleted = set()
+    for path in orphans:
+        if delete and os.path.getmtime(path) < deadline:
+            await media_storage.delete_file(path)
+            deleted.add(path)
+            print(f'deleted  {path}')
+        else:
+            print(f'orphaned {path}')
+    # the renditions of a deleted file go with it, those left behind by an earlier deletion once they are old enough
+    kept = {media_storage.blob_hash(path) for path in (blobs - deleted) | set(missing)}
+    deleted_hashes = {media_storage.blob_hash(path) for path in deleted}
+    orphaned_renditions = 0
+    for sha256, paths in sorted(renditions_of.items()):
+        if sha256 in kept:
+            continue
+        for path in sorted(paths):
+            orphaned_renditions += 1
+            if delete and (sha256 in deleted_hashes or os.path.getmtime(path) < deadline):
+                await media_storage.delete_file(path)
+                print(f'deleted  {path}')
+            else:
+                print(f'orphaned {path}')
+    print(f'{len(blobs)} files, {len(orphans)} orphaned ({len(deleted)} deleted), {len(missing)} missing, '
+          f'{orphaned_renditions} orphaned renditions')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delete', action='store_true')
+    parser.add_argument('--min-age', type=int, default=3600)
+    args = parser.parse_args()
+    asyncio.run(main(args.delete, args.min_age))
@@ -6,6 +6,40 @@ class Settings(BaseSettings):
     cloudinary_name: str = 'cloud_name'
     cloudinary_api_key: str = 'api_key'
     cloudinary_api_secret: str = 'api_secret'
+    search_backend: str = 'database'
+    search_snapshot_path: str = 'search_index.json.gz'
+    max_upload_size: int = 10 * 1024 * 1024
+    rendition_workers: int = 2
+    transform_engine: str = 'cloudinary'
+    transform_workers: int = 2
+    transform_cache_max_bytes: int = 512 * 1024 * 1024
+    transform_cache_memory_items: int = 4096
+    upload_backend: str = 'cloudinary'
+    upload_registry_path: str = 'uploads.sqlite3'
+    upload_workers: int = 4
+    upload_max_attempts: int = 5
+    cdn_eager_upload: bool = True
+    job_queue_path: str = 'jobs.sqlite3'
+    job_retention: float = 7 * 24 * 3600
+    job_purge_interval: float = 3600
+    qrcode_cache_items: int = 1024
+    user_cache_ttl: float = 10
+    user_cache_size: int = 10000
+    password_workers: int = 2
+    password_queue_limit: int = 64
+    revocation_capacity: int = 100000
+    revocation_error_rate: float = 0.001
+    revocation_sync_interval: float = 5
+    revocation_compact_interval: float = 3600
+    rate_limit_backend: str = 'memory'
+    rate_limit_path: str = 'rate_limits.sqlite3'
+    rate_limit_max_keys: int = 100000
+    rate_limit_login: str = '10/60'
+    rate_limit_upload: str = '20/60'
+    rate_limit_transform: str = '60/60'
+    # comma-separated addresses of the reverse proxies trusted to set X-Forwarded-For. '*' trusts any peer, so only
+    # set it (FORWARDED_ALLOW_IPS=*) where every request comes through a proxy, e.g. the Heroku router
+    forwarded_allow_ips: str = '127.0.0.1'
 
     class Config:
         env_file = ".env"
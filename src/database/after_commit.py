@@ -0,0 +1,31 @@
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'after_commit_pending'
+
+
+def after_commit(db: AsyncSession | Session, change: Callable[[], None]) -> None:
+    """
+    The after_commit function registers a change of in-memory state (e.g. an index) that mirrors a change made in
+    the current transaction of the session: it is applied once the transaction commits and dropped if it rolls back,
+    so memory never holds what the database doesn't.
+
+    :param db: AsyncSession | Session: Database session
+    :param change: Callable: Function applying the change
+    :return: None
+    """
+    db.info.setdefault(PENDING_KEY, []).append(change)
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_pending(session: Session) -> None:
+    for change in session.info.pop(PENDING_KEY, []):
+        change()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_pending(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
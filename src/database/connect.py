@@ -1,17 +1,37 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from src.conf.config import settings
 
 DATABASE_URL = settings.postgres_url
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+def get_async_url(url: str) -> str:
+    """
+    The get_async_url function converts a sync database URL (as used by alembic) into the URL of its
+    async driver, e.g. postgresql:// -> postgresql+asyncpg:// and sqlite:// -> sqlite+aiosqlite://.
+    URLs that already name an async driver are returned unchanged.
+
+    :param url: str: Database URL from the settings
+    :return: Database URL for the async engine
+    """
+    db_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(db_url.drivername, db_url.drivername)
+    return db_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = get_async_url(DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,10 +1,14 @@
 import enum
+from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, func, Table, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, Boolean, DDL, event, Float, Index, false, \
+    UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.sql.sqltypes import DateTime
 
+from src.services.renditions import rendition_urls
+
 Base = declarative_base()
 
 
@@ -24,10 +28,22 @@ class User(Base):
     email = Column(String(250), unique=True)
     password = Column(String(255), nullable=False)
     refresh_token = Column(String(255), nullable=True)
-    created_at = Column('created_at', DateTime, default=func.now())
-    updated_at = Column('updated_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
+    updated_at = Column('updated_at', DateTime, default=datetime.now)
     is_active = Column(Boolean, default=True)
     user_role = Column(Integer, default=UserRole.User.name)
+    # bumped when the role or the status changes, so the claims of the access tokens issued before are stale
+    token_version = Column(Integer, default=0, server_default='0', nullable=False)
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # jti of a revoked token, or user:<id> to revoke every token of the user issued until revoked_at
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
 
 
 post_tag = Table('post_tag',
@@ -37,6 +53,8 @@ post_tag = Table('post_tag',
                      "posts.id", ondelete="CASCADE")),
                  Column("tag", Integer, ForeignKey(
                      "tags.id", ondelete="CASCADE")),
+                 UniqueConstraint("post", "tag", name="uq_post_tag_post_tag"),
+                 Index("ix_post_tag_tag", "tag"),
                  )
 
 
@@ -44,24 +62,41 @@ class Post(Base):
     __tablename__ = "posts"
 
     id = Column(Integer, primary_key=True)
-    photo_url = Column(String())
+    photo_url = Column(String(), index=True)  # files are shared by posts with identical uploads
     description = Column(Text)
-    created_at = Column('created_at', DateTime, default=func.now())
-    updated_at = Column('updated_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
+    updated_at = Column('updated_at', DateTime, default=datetime.now)
     user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
     marked = Column(Boolean, default=False)  # deletion mark
     marked = Column(Boolean)  # deletion mark
+    # rating aggregates, maintained by src/repository/rates.py
+    rating_sum = Column(Integer, default=0, server_default='0', nullable=False)
+    rating_count = Column(Integer, default=0, server_default='0', nullable=False)
+    rating = Column(Float, default=0, server_default='0', nullable=False)  # rating_sum / rating_count
+    rate_count = synonym('rating_count')
+    # maintained by src/repository/comments.py
+    comment_count = Column(Integer, default=0, server_default='0', nullable=False)
+    renditions_ready = Column(Boolean, default=False, server_default=false(), nullable=False)
+    cdn_status = Column(String(10))  # upload of the original to the CDN, see src/services/upload_queue.py
     tags = relationship("Tag", secondary=post_tag,
-                        backref="posts", passive_deletes=True)
+                        backref="posts", passive_deletes=True, lazy="selectin")
     user = relationship('User', backref="photos")
 
+    __table_args__ = (Index('ix_posts_rating', 'rating', 'id'),
+                      Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),
+                      Index('ix_posts_created_at', 'created_at', 'id'))
+
+    @property
+    def renditions(self):
+        return rendition_urls(self.photo_url) if self.renditions_ready else []
+
 
 class Comment(Base):
     __tablename__ = "comments"
 
     id = Column(Integer, primary_key=True)
     comment_text = Column(Text)
-    created_at = Column('created_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
     updated_at = Column('updated_at', DateTime)
 
     post_id = Column(Integer, ForeignKey(Post.id, ondelete="CASCADE"))
@@ -70,14 +105,18 @@ class Comment(Base):
     user = relationship('User', backref="comments")
     post = relationship('Post', backref="comments")
 
+    # the listing of the comments of a post, see COMMENTS_ORDER
+    __table_args__ = (Index('ix_comments_post_id_created_at', 'post_id', 'created_at', 'id'),
+                      Index('ix_comments_user_id', 'user_id'))
+
 
 class Tag(Base):
     __tablename__ = "tags"
 
     id = Column(Integer, primary_key=True)
     tag = Column(String(25), unique=True)
-    created_at = Column('created_at', DateTime, default=func.now())
-    updated_at = Column('updated_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
+    updated_at = Column('updated_at', DateTime, default=datetime.now)
     user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
 
     user = relationship('User', backref="tags")
@@ -89,10 +128,12 @@ class TransformPosts(Base):
     id = Column(Integer, primary_key=True)
     photo_url = Column(String, nullable=False)
     photo_id = Column(Integer, ForeignKey(Post.id, ondelete="CASCADE"))
-    created_at = Column('created_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
 
     post = relationship('Post', backref="transform_posts")
 
+    __table_args__ = (Index('ix_transform_posts_photo_id_created_at', 'photo_id', 'created_at', 'id'),)
+
 
 class RatePost(Base):
     __tablename__ = 'rates_posts'
@@ -101,8 +142,66 @@ class RatePost(Base):
     rate = Column("rate", Integer, default=0)
     photo_id = Column(Integer, ForeignKey(Post.id, ondelete="CASCADE"))
     user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
-    created_at = Column('created_at', DateTime, default=func.now())
-    updated_at = Column('updated_at', DateTime, default=func.now())
+    created_at = Column('created_at', DateTime, default=datetime.now)
+    updated_at = Column('updated_at', DateTime, default=datetime.now)
 
     post = relationship('Post', backref="rates_posts")
     user = relationship('User', backref="rates_posts")
+
+    # a user rates a post once
+    __table_args__ = (Index('uq_rates_posts_photo_id_user_id', 'photo_id', 'user_id', unique=True),
+                      Index('ix_rates_posts_user_id_created_at', 'user_id', 'created_at', 'id'))
+
+
+# Full-text index over post descriptions and tag names, kept up to date by src/repository/search_index.py.
+# It is a side table (a tsvector column with a GIN index on Postgres, an FTS5 virtual table on SQLite)
+# keyed by the post id, so it is created with raw DDL instead of being part of the ORM model.
+event.listen(Post.__table__, "after_create", DDL(
+    "CREATE TABLE posts_search (post_id INTEGER PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)"
+).execute_if(dialect="postgresql"))
+event.listen(Post.__table__, "after_create", DDL(
+    "CREATE INDEX ix_posts_search_document ON posts_search USING gin (document)"
+).execute_if(dialect="postgresql"))
+event.listen(Post.__table__, "after_create", DDL(
+    "CREATE VIRTUAL TABLE posts_search USING fts5(description, tags)"
+).execute_if(dialect="sqlite"))
+event.listen(Post.__table__, "before_drop", DDL(
+    "DROP TABLE IF EXISTS posts_search"
+).execute_if(dialect=("postgresql", "sqlite")))
+
+# Trigram index for the user search, see src/repository/search_index.py. On Postgres it is a pg_trgm GIN index
+# over the searched columns, on SQLite an FTS5 trigram table with the users table as external content,
+# kept up to date by triggers (only the searched columns re-index a user, not e.g. a new refresh token).
+USERS_SEARCH_DOCUMENT = ("lower(coalesce(username, '') || ' ' || coalesce(first_name, '') || ' ' || "
+                         "coalesce(last_name, '') || ' ' || coalesce(email, ''))")
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+).execute_if(dialect="postgresql"))
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE INDEX ix_users_search_trgm ON users USING gin ((" + USERS_SEARCH_DOCUMENT + ") gin_trgm_ops)"
+).execute_if(dialect="postgresql"))
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE VIRTUAL TABLE users_search USING fts5(username, first_name, last_name, email, "
+    "content='users', content_rowid='id', tokenize='trigram')"
+).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE TRIGGER users_search_insert AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_search (rowid, username, first_name, last_name, email) "
+    "VALUES (new.id, new.username, new.first_name, new.last_name, new.email); END"
+).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE TRIGGER users_search_delete AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_search (users_search, rowid, username, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.email); END"
+).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "after_create", DDL(
+    "CREATE TRIGGER users_search_update AFTER UPDATE OF username, first_name, last_name, email ON users BEGIN "
+    "INSERT INTO users_search (users_search, rowid, username, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.username, old.first_name, old.last_name, old.email); "
+    "INSERT INTO users_search (rowid, username, first_name, last_name, email) "
+    "VALUES (new.id, new.username, new.first_name, new.last_name, new.email); END"
+).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "before_drop", DDL(
+    "DROP TABLE IF EXISTS users_search"
+).execute_if(dialect="sqlite"))
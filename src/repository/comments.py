@@ -1,27 +1,48 @@
 from datetime import datetime
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, Comment, Post
 from src.schemas import CommentModel
+from src.services.pagination import paginate
 
+COMMENTS_ORDER = (Comment.created_at, Comment.id)
+# a comment with the names of its author, as CommentResponse needs them
+COMMENT_WITH_AUTHOR = (Comment.id, Comment.comment_text, Comment.created_at, Comment.updated_at, Comment.user_id,
+                       User.first_name, User.last_name, User.username)
 
-async def create_comment(body: CommentModel, id_of_post: int, db: Session, current_user):
+
+async def update_comment_count(post_id: int, delta: int, db: AsyncSession) -> None:
+    """
+    The update_comment_count function changes the comment counter of a post by delta. The new value is computed by
+    the database from the current one, so concurrent comments of the same post don't overwrite each other.
+    The caller commits the change together with the comment itself.
+
+    :param post_id: int: Post's ID
+    :param delta: int: Change of the number of the comments
+    :param db: AsyncSession: Access the database
+    :return: None
+    """
+    await db.execute(update(Post).filter(Post.id == post_id).values(comment_count=Post.comment_count + delta))
+
+
+async def create_comment(body: CommentModel, id_of_post: int, db: AsyncSession, current_user):
     """
     The create_comment function creates a new comment in the database.
         Args:
             body (CommentModel): The CommentModel object that contains the data for creating a new comment.
             id_of_post (int): The ID of the post to which this comment belongs.
-            db (Session): A Session instance used to query and update our database.
+            db (AsyncSession): A Session instance used to query and update our database.
 
     :param body: CommentModel: Get the comment_text from the user
     :param id_of_post: int: Identify the post that the comment is being added to
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: Get the user_id of the current user
-    :return: A comment object
+    :return: A comment object, the comment counter of the post is incremented in the same transaction
     :doc-author: Trelent
     """
-    post = db.query(Post).filter_by(id=id_of_post).first()
+    post = await db.scalar(select(Post).filter_by(id=id_of_post))
     if not post:
         return None
     comment = Comment(
@@ -30,58 +51,62 @@ async def create_comment(body: CommentModel, id_of_post: int, db: Session, curre
         user_id=current_user.id
     )
     db.add(comment)
-    db.commit()
+    await update_comment_count(id_of_post, 1, db)
+    await db.commit()
+    await db.refresh(comment)
     return comment
 
 
-async def get_comments(skip: int, limit: int, db: Session, id_of_post: int):
+async def get_comments_with_authors(skip: int, limit: int, db: AsyncSession, id_of_post: int,
+                                    cursor: str | None = None):
     """
-    The get_comments function takes in a skip, limit, db and id_of_post.
-    It then queries the database for all comments that have the same post_id as id_of_post.
-    It then returns those comments.
+    The get_comments_with_authors function returns a page of the comments of a post, oldest first,
+    each joined with the names of its author. It takes one query for the whole page and returns
+    plain rows (see COMMENT_WITH_AUTHOR) instead of ORM objects.
 
     :param skip: int: Skip a certain amount of comments
     :param limit: int: Limit the number of comments returned
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param id_of_post: int: Filter the comments by post_id
-    :return: A list of comments
+    :param cursor: str: Continue after the page with this cursor instead of skipping
+    :return: A page of rows
     :doc-author: Trelent
     """
-    comments = db.query(Comment).filter_by(post_id=id_of_post).offset(skip).limit(limit).all()
-    return comments
+    sql = select(*COMMENT_WITH_AUTHOR).join(User, Comment.user_id == User.id).filter(Comment.post_id == id_of_post)
+    return (await db.execute(paginate(sql, COMMENTS_ORDER, skip, limit, cursor))).all()
 
 
-async def get_comment(db: Session, comment_id: int):
+async def get_comment_with_author(db: AsyncSession, comment_id: int):
     """
-    The get_comment function takes in a comment_id and returns the Comment object with that id.
-        Args:
-            db (Session): The database session to use for querying.
-            comment_id (int): The id of the Comment to retrieve from the database.
+    The get_comment_with_author function returns the comment with the given id joined with the names of its author,
+    as a row (see COMMENT_WITH_AUTHOR).
 
-    :param db: Session: Pass the database session to the function
-    :param comment_id: int: Filter the query to return only a single comment
-    :return: The comment object with the given id
+    :param db: AsyncSession: Pass the database session to the function
+    :param comment_id: int: Id of the comment
+    :return: The row or None
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id).first()
-    return comment
+    sql = select(*COMMENT_WITH_AUTHOR).join(User, Comment.user_id == User.id).filter(Comment.id == comment_id)
+    return (await db.execute(sql)).first()
 
 
-async def get_user_by_comment_id(db: Session, user_id: int):
+async def get_comment(db: AsyncSession, comment_id: int):
     """
-    The get_user_by_comment_id function takes in a database session and a user_id,
-    and returns the User object associated with that id. If no such user exists, it returns None.
+    The get_comment function takes in a comment_id and returns the Comment object with that id.
+        Args:
+            db (AsyncSession): The database session to use for querying.
+            comment_id (int): The id of the Comment to retrieve from the database.
 
-    :param db: Session: Pass the database session to the function
-    :param user_id: int: Filter the user by id
-    :return: The user associated with the comment
+    :param db: AsyncSession: Pass the database session to the function
+    :param comment_id: int: Filter the query to return only a single comment
+    :return: The comment object with the given id
     :doc-author: Trelent
     """
-    user = db.query(User).filter_by(id=user_id).first()
-    return user
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id))
+    return comment
 
 
-async def edit_comments(comment_id: int, body: CommentModel, db: Session, current_user: User):
+async def edit_comments(comment_id: int, body: CommentModel, db: AsyncSession, current_user: User):
     """
     The edit_comments function takes in a comment_id, body, db and current_user.
     It then queries the database for a comment with the given id and user id. If it finds one,
@@ -90,33 +115,34 @@ async def edit_comments(comment_id: int, body: CommentModel, db: Session, curren
 
     :param comment_id: int: Identify the comment to be deleted
     :param body: CommentModel: Pass the data from the request body to the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Check if the user is authorized to edit the comment
     :return: The comment that was edited
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id, user_id=current_user.id).first()
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id, user_id=current_user.id))
     if comment:
         comment.comment_text = body.comment_text
         comment.updated_at = datetime.now()
-        db.commit()
+        await db.commit()
     return comment
 
 
-async def delete_comments(comment_id: int, db: Session):
+async def delete_comments(comment_id: int, db: AsyncSession):
     """
     The delete_comments function deletes a comment from the database.
         Args:
             comment_id (int): The id of the comment to be deleted.
             current_user (User): The user who is deleting the comment.
-            db (Session): A session object for interacting with our database.
+            db (AsyncSession): A session object for interacting with our database.
 
     :param comment_id: int: Identify the comment that is to be deleted
-    :param db: Session: Pass in the database session
-    :return: A none type
+    :param db: AsyncSession: Pass in the database session
+    :return: A none type, the comment counter of the post is decremented in the same transaction
     :doc-author: Trelent
     """
-    comment = db.query(Comment).filter_by(id=comment_id).first()
+    comment = await db.scalar(select(Comment).filter_by(id=comment_id))
     if comment:
-        db.delete(comment)
-        db.commit()
\ No newline at end of file
+        await update_comment_count(comment.post_id, -1, db)
+        await db.delete(comment)
+        await db.commit()
\ No newline at end of file
@@ -1,15 +1,19 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import extract
 
 from src.database.models import Post, User, Tag
-from src.schemas import PostBase, PostModel, PostCreate
+from src.schemas import PostBase, PostModel, PostCreate, CdnStatus
 from src.repository import tags as repository_tags
+from src.repository import search_index
+from src.services import media_storage, renditions
 
 
-async def create_post(body: PostCreate, file_path: str, db: Session, user: User) -> Post:
+async def create_post(body: PostCreate, file_path: str, db: AsyncSession, user: User,
+                      cdn_status: CdnStatus | None = None) -> Post:
     """
     Add new post
 
@@ -18,72 +22,160 @@ async def create_post(body: PostCreate, file_path: str, db: Session, user: User)
     :param file_path: Path to file
     :type file_path: str
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :param user: User.
     :type user: User
+    :param cdn_status: State of the upload of the file to the CDN
+    :type cdn_status: CdnStatus | None
     :return: Added post
     :rtype: Post
     """
 
-    tags_list = repository_tags.get_tags_list(body.tags, user, db)
+    tags_list = await repository_tags.get_tags_list(body.tags, user, db)
 
-    post = Post(photo_url=file_path, description=body.description, user_id=user.id, tags=tags_list)
+    post = Post(photo_url=file_path, description=body.description, user_id=user.id, tags=tags_list,
+                cdn_status=cdn_status.value if cdn_status else None)
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.flush()
+    await search_index.index_post(post, db)
+    repository_tags.count_tag_usage([tag.tag for tag in tags_list], [], db)
+    await db.commit()
+    await db.refresh(post)
 
     return post
 
 
-async def get_post(post_id: int, db: Session) -> Post:
+async def get_post(post_id: int, db: AsyncSession) -> Post:
     """
     Get post by ID
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Return post by ID
     :rtype: Post
     """
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
     return post
 
 
-async def get_user_posts(user_id: int, db: Session) -> List[Post]:
+async def get_user_posts(user_id: int, db: AsyncSession) -> List[Post]:
     """
     Get all user's posts
 
     :param user_id: User's ID
     :type user_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Get all user's posts
     :rtype: List[Post]
     """
 
-    posts = db.query(Post).filter(Post.user_id == user_id).all()
+    posts = (await db.scalars(select(Post).filter(Post.user_id == user_id))).all()
     return posts
 
 
-async def remove_post(post_id: int, db: Session):
+async def remove_post(post_id: int, db: AsyncSession):
     """
-    Remove post by ID
+    Remove post by ID. The file of the post is deleted too, unless another post shares it.
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
     if post:
-        db.delete(post)
-        db.commit()
+        await search_index.remove_post_index(post.id, db)
+        repository_tags.count_tag_usage([], [tag.tag for tag in post.tags], db)
+        await db.delete(post)
+        await db.commit()
+        if not await count_posts_with_photo(post.photo_url, db):
+            await delete_unreferenced_file(post.photo_url, db)
     return post
 
 
-async def update_post(post_id: int, body: PostCreate, db: Session, user: User) -> Post | None:
+async def delete_unreferenced_file(photo_url: str, db: AsyncSession) -> None:
+    """
+    Delete a file no post references anymore, with its renditions. The file is moved aside and the references are
+    counted again: a post with the same content committed meanwhile (its upload published the file before)
+    gets the file back. An upload whose post commits after this count publishes the file again itself
+    (see media_storage.finish_upload).
+
+    :param photo_url: Path to file
+    :type photo_url: str
+    :param db: Database session
+    :type db: AsyncSession
+    """
+    trash_path = await media_storage.trash_file(photo_url)
+    if trash_path is None:
+        return
+    # ends the read transaction, so the count sees the posts committed meanwhile
+    await db.commit()
+    if await count_posts_with_photo(photo_url, db):
+        await media_storage.restore_file(trash_path, photo_url)
+        return
+    await media_storage.delete_file(trash_path)
+    for rendition in renditions.rendition_urls(photo_url):
+        await media_storage.delete_file(rendition['url'])
+
+
+async def count_posts_with_photo(photo_url: str, db: AsyncSession) -> int:
+    """
+    Count posts referencing the file. Identical uploads share one file, which may only be deleted
+    when no post references it anymore.
+
+    :param photo_url: Path to file
+    :type photo_url: str
+    :param db: Database session
+    :type db: AsyncSession
+    :return: Number of posts
+    :rtype: int
+    """
+    return await db.scalar(select(func.count(Post.id)).filter(Post.photo_url == photo_url))
+
+
+async def render_post_renditions(photo_url: str, db: AsyncSession) -> bool:
+    """
+    Render the renditions of a file (in the rendition process pool) and mark the posts using it as having
+    renditions. A file shared with a post whose renditions are ready is not rendered again.
+
+    :param photo_url: Path to file
+    :type photo_url: str
+    :param db: Database session
+    :type db: AsyncSession
+    :return: True if the renditions are ready
+    :rtype: bool
+    """
+    ready = await db.scalar(select(Post.id).filter(and_(Post.photo_url == photo_url, Post.renditions_ready)).limit(1))
+    # ends the transaction, so the connection goes back to the pool while the renditions are rendered
+    await db.commit()
+    if ready is None and not await renditions.generate_renditions(photo_url):
+        return False
+    await db.execute(update(Post).filter(Post.photo_url == photo_url).values(renditions_ready=True))
+    await db.commit()
+    return True
+
+
+async def set_cdn_status(photo_url: str, cdn_status: CdnStatus, db: AsyncSession) -> None:
+    """
+    Set the state of the upload to the CDN of the posts using a file
+
+    :param photo_url: Path to file
+    :type photo_url: str
+    :param cdn_status: State of the upload
+    :type cdn_status: CdnStatus
+    :param db: Database session
+    :type db: AsyncSession
+    :return: None
+    """
+    await db.execute(update(Post).filter(Post.photo_url == photo_url).values(cdn_status=cdn_status.value))
+    await db.commit()
+
+
+async def update_post(post_id: int, body: PostCreate, db: AsyncSession, user: User) -> Post | None:
     """
     Update description and tags
 
@@ -92,41 +184,44 @@ async def update_post(post_id: int, body: PostCreate, db: Session, user: User) -
     :param body: Data for update post
     :type body: PostCreate
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :param user: User.
     :type user: User
     :return: Updated post
     :rtype: Post | None
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
 
     if post:
-        tags_list = repository_tags.get_tags_list(body.tags, user, db)
+        tags_list = await repository_tags.get_tags_list(body.tags, user, db)
 
+        repository_tags.count_tag_usage([tag.tag for tag in tags_list], [tag.tag for tag in post.tags], db)
         post.description = body.description
         post.tags = tags_list
-        db.commit()
-        db.refresh(post)
+        post.updated_at = datetime.now()
+        await search_index.index_post(post, db)
+        await db.commit()
+        await db.refresh(post)
     return post
 
 
-async def change_post_mark(post_id: int, db: Session) -> Post | None:
+async def change_post_mark(post_id: int, db: AsyncSession) -> Post | None:
     """
     Change soft-delete mark for post
 
     :param post_id: Post's ID
     :type post_id: int
     :param db: Database session
-    :type db: Session
+    :type db: AsyncSession
     :return: Post
     :rtype: Post | None
     """
 
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.scalar(select(Post).filter(Post.id == post_id))
 
     if post:
         post.marked = not post.marked
-        db.commit()
-        db.refresh(post)
+        await db.commit()
+        await db.refresh(post)
     return post
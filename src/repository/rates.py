@@ -1,67 +1,135 @@
 from datetime import datetime
 from typing import List
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, update, case, cast, func, or_, Float
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, RatePost, UserRole, Post
 from src.schemas import RateResponse
+from src.services.pagination import paginate
 
+RATES_ORDER = (RatePost.created_at, RatePost.id)
 
-async def set_rate_for_image(image_id: int, user_rate: int, current_user: User, db: Session) -> RatePost:
+
+def rating_values(rating_sum, rating_count) -> dict:
+    """
+    The rating_values function builds the values of the rating aggregate columns of a post
+    from the (SQL expressions of the) sum and the number of its rates.
+
+    :param rating_sum: Sum of the rates
+    :param rating_count: Number of the rates
+    :return: Values for an UPDATE of the posts table
+    """
+    rating = case((rating_count > 0, cast(rating_sum, Float) / rating_count), else_=0)
+    return {'rating_sum': rating_sum, 'rating_count': rating_count, 'rating': rating}
+
+
+async def update_rating(post_id: int, delta_sum: int, delta_count: int, db: AsyncSession) -> None:
+    """
+    The update_rating function changes the rating aggregates of a post by the given deltas. The new values are
+    computed by the database from the current ones, so concurrent rates of the same post don't overwrite each other.
+    The caller commits the change together with the rate itself.
+
+    :param post_id: int: Post's ID
+    :param delta_sum: int: Change of the sum of the rates, a number or an SQL expression
+    :param delta_count: int: Change of the number of the rates
+    :param db: AsyncSession: Access the database
+    :return: None
+    """
+    values = rating_values(Post.rating_sum + delta_sum, Post.rating_count + delta_count)
+    await db.execute(update(Post).filter(Post.id == post_id).values(**values))
+
+
+async def recompute_ratings(db: AsyncSession) -> int:
+    """
+    The recompute_ratings function recomputes the rating aggregates of all posts from the rates table,
+    repairing posts whose aggregates drifted (e.g. rates written bypassing this module).
+
+    :param db: AsyncSession: Access the database
+    :return: Number of repaired posts
+    """
+    rating_sum = select(func.coalesce(func.sum(RatePost.rate), 0)).filter(RatePost.photo_id == Post.id) \
+        .scalar_subquery()
+    rating_count = select(func.count(RatePost.id)).filter(RatePost.photo_id == Post.id).scalar_subquery()
+    sql = update(Post).filter(or_(Post.rating_sum != rating_sum, Post.rating_count != rating_count)) \
+        .values(**rating_values(rating_sum, rating_count)).execution_options(synchronize_session=False)
+    result = await db.execute(sql)
+    await db.commit()
+    return result.rowcount
+
+
+async def set_rate_for_image(image_id: int, user_rate: int, current_user: User, db: AsyncSession) -> RatePost:
     """
     The set_rate_for_image function takes in an image_id, a user_rate, the current user and a database session. It
     then queries the Post table for any posts that match the given image id and are not posted by the current user.
     If there is such a post it will query for any rates on that post by this particular user. If there is no rate
     yet, it will create one with this users rating of said photo. Otherwise it updates their previous rating to
-    reflect their new one.
+    reflect their new one. The rating aggregates of the post are updated in the same transaction.
+    The previous rate is locked and the change of the sum computed from it by the database, so concurrent
+    rates of the same user neither lose an update nor fail on the unique (photo_id, user_id) index.
 
     :param image_id: int: Identify the image that we want to rate
     :param user_rate: int: Set the rate of the image
     :param current_user: User: Get the id of the user who is currently logged in
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A ratepost object
     """
-    post = db.query(Post).filter(and_(Post.id == image_id, Post.user_id != current_user.id)).first()
-    rate = None
-    if post:
-        rate = db.query(RatePost).filter(and_(RatePost.photo_id == image_id,
-                                              RatePost.user_id == current_user.id)).first()
-        if rate is None:
-            rate = RatePost(photo_id=image_id, user_id=current_user.id, rate=user_rate)
-            db.add(rate)
-        else:
-            rate.rate = user_rate
-            rate.updated_at = datetime.now()
-        db.commit()
-        db.refresh(rate)
+    post = await db.scalar(select(Post).filter(and_(Post.id == image_id, Post.user_id != current_user.id)))
+    if post is None:
+        return None
+    previous = select(RatePost).filter(and_(RatePost.photo_id == image_id, RatePost.user_id == current_user.id)) \
+        .with_for_update().execution_options(populate_existing=True)
+    rate = await db.scalar(previous)
+    created = False
+    if rate is None:
+        rate = RatePost(photo_id=image_id, user_id=current_user.id, rate=user_rate)
+        try:
+            async with db.begin_nested():
+                db.add(rate)
+            created = True
+        except IntegrityError:
+            # the first rate of a concurrent request of the same user was committed meanwhile, this one replaces it
+            rate = await db.scalar(previous)
+    if created:
+        await update_rating(image_id, user_rate, 1, db)
+    else:
+        old_rate = select(RatePost.rate).filter(RatePost.id == rate.id).scalar_subquery()
+        await update_rating(image_id, user_rate - old_rate, 0, db)
+        rate.rate = user_rate
+        rate.updated_at = datetime.now()
+    await db.commit()
+    await db.refresh(rate)
     return rate
 
 
-async def remove_rate_for_image(rate_id: int, current_user: User, db: Session) -> None:
+async def remove_rate_for_image(rate_id: int, current_user: User, db: AsyncSession) -> None:
     """
-    The remove_rate_for_image function removes a rate for an image.
+    The remove_rate_for_image function removes a rate for an image and takes it out of the rating aggregates
+    of the image.
         Args:
             rate_id (int): The id of the rate to be removed.
             current_user (User): The user who is making the request.
-            db (Session): A database session object used to query and update data in the database.
+            db (AsyncSession): A database session object used to query and update data in the database.
 
     :param rate_id: int: Identify the rate that is to be removed
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: None
     """
     if current_user.user_role == UserRole.User.name:
-        rate = db.query(RatePost).filter(and_(RatePost.id == rate_id, RatePost.user_id == current_user.id)).first()
+        rate = await db.scalar(select(RatePost).filter(and_(RatePost.id == rate_id,
+                                                            RatePost.user_id == current_user.id)))
     else:
-        rate = db.query(RatePost).filter(RatePost.id == rate_id).first()
+        rate = await db.scalar(select(RatePost).filter(RatePost.id == rate_id))
     if rate:
-        db.delete(rate)
-        db.commit()
+        await update_rating(rate.photo_id, -rate.rate, -1, db)
+        await db.delete(rate)
+        await db.commit()
     return rate
 
 
 async def get_rate_for_image(image_id: int, skip: int, limit: int, current_user: User,
-                             db: Session) -> List[RateResponse]:
+                             db: AsyncSession, cursor: str | None = None) -> List[RateResponse]:
     """
     The get_rate_for_image function returns a list of rates for the image with the given id.
         If current_user is an admin, all rates are returned. Otherwise, only those created by current_user are returned.
@@ -70,21 +138,24 @@ async def get_rate_for_image(image_id: int, skip: int, limit: int, current_user:
     :param skip: int: Skip the first n rows in a result set before beginning to return rows
     :param limit: int: Limit the number of results returned
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: str: Continue after the page with this cursor instead of skipping
     :return: The list of rates for the image with the given id
     """
     if current_user.user_role == UserRole.User.name:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            and_(Post.id == image_id, Post.user_id == current_user.id)).offset(skip).limit(limit).all()
+        sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
+                     RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
+            and_(Post.id == image_id, Post.user_id == current_user.id))
     else:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            RatePost.photo_id == image_id).offset(skip).limit(limit).all()
+        sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
+                     RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
+            RatePost.photo_id == image_id)
+    rates = (await db.execute(paginate(sql, RATES_ORDER, skip, limit, cursor))).all()
     return rates
 
 
-async def get_rate_for_user(skip: int, limit: int, current_user: User, db: Session) -> List[RateResponse]:
+async def get_rate_for_user(skip: int, limit: int, current_user: User, db: AsyncSession,
+                            cursor: str | None = None) -> List[RateResponse]:
     """
     The get_rate_for_user function returns a list of rate objects for the current user. Args: skip (int): The number
     of items to skip before starting to collect the result set. limit (int): The numbers of items to return after
@@ -96,17 +167,19 @@ async def get_rate_for_user(skip: int, limit: int, current_user: User, db: Sessi
     :param skip: int: Skip the first n records in the query
     :param limit: int: Limit the number of results returned
     :param current_user: User: Get the current user from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: str: Continue after the page with this cursor instead of skipping
     :return: A list of rate responses
     """
-    rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                     RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-                     RatePost.user_id == current_user.id).offset(skip).limit(limit).all()
+    sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
+                 RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
+                 RatePost.user_id == current_user.id)
+    rates = (await db.execute(paginate(sql, RATES_ORDER, skip, limit, cursor))).all()
     return rates
 
 
 async def get_rate_from_user(user_id: int, skip: int, limit: int, current_user: User,
-                             db: Session) -> List[RateResponse]:
+                             db: AsyncSession, cursor: str | None = None) -> List[RateResponse]:
     """
     The get_rate_from_user function takes in a user_id, skip, limit, current_user and db. It returns a list of
     RateResponse objects. If the current user is not an admin or moderator then it will query the database for all
@@ -116,12 +189,14 @@ async def get_rate_from_user(user_id: int, skip: int, limit: int, current_user:
     :param skip: int: Skip the first n records
     :param limit: int: Limit the number of results returned
     :param current_user: User: Check if the user is an admin or not
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: str: Continue after the page with this cursor instead of skipping
     :return: The rate of a user
     """
     rates = []
     if current_user.user_role != UserRole.User.name:
-        rates = db.query(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
-                         RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
-            RatePost.user_id == user_id).offset(skip).limit(limit).all()
+        sql = select(RatePost.id, RatePost.rate, RatePost.user_id, User.username, RatePost.photo_id, Post.photo_url,
+                     RatePost.created_at, RatePost.updated_at).select_from(Post).join(RatePost).join(User).filter(
+            RatePost.user_id == user_id)
+        rates = (await db.execute(paginate(sql, RATES_ORDER, skip, limit, cursor))).all()
     return rates
@@ -1,102 +1,144 @@
-from typing import List
+from typing import List, Tuple
 
-from sqlalchemy import or_, func, text, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select, literal
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Post, Tag, post_tag, RatePost, User
+from src.database.models import Post, Tag, post_tag, User
 from src.services.cloudynary import get_url
 from src.schemas import SearchResponse, SortUserType, SortType
+from src.repository import tags as repository_tags
+from src.repository import search_index
+from src.services.pagination import paginate
+from src.services.renditions import rendition_urls
 
+SEARCH_POST_COLUMNS = (Post.id, Post.photo_url, Post.description, Post.user_id, Post.created_at, Post.updated_at,
+                       Post.renditions_ready, Post.comment_count, Post.rating_count.label('rate_count'))
+POST_SORT_KEYS = {SortType.date.name: ('created_at', 'id'), SortType.rate.name: ('rate', 'id'),
+                  SortType.relevance.name: ('rank', 'id')}
+USER_SORT_KEYS = {SortUserType.date.name: (User.created_at, User.id), SortUserType.email.name: (User.email, User.id),
+                  SortUserType.name.name: (User.first_name, User.last_name, User.id),
+                  SortUserType.username.name: (User.username, User.id),
+                  SortUserType.relevance.name: ('rank', User.id)}
 
-async def get_search_posts(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: Session)\
-        -> List[SearchResponse]:
+
+def get_post_sort_keys(sort: str) -> Tuple[str, ...]:
+    """
+    The get_post_sort_keys function returns the names of the columns the found posts are ordered by
+    (and their page cursors are made of) for the given sort.
+
+    :param sort: str: Sort the posts by date, rate or relevance
+    :return: Names of the sort key columns
+    """
+    return POST_SORT_KEYS.get(sort, POST_SORT_KEYS[SortType.date.name])
+
+
+def get_user_sort_keys(sort: str) -> Tuple:
+    """
+    The get_user_sort_keys function returns the columns the found users are ordered by
+    (and their page cursors are made of) for the given sort.
+
+    :param sort: str: Sort the users by date, name, username, email or relevance
+    :return: The sort key columns (or 'rank', the rank of the match)
+    """
+    return USER_SORT_KEYS.get(sort, USER_SORT_KEYS[SortUserType.username.name])
+
+
+async def get_search_posts(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: AsyncSession,
+                           cursor: str | None = None) -> List[SearchResponse]:
     """
     The get_search_posts function is used to search for posts by a given string.
     The function takes in the following parameters:
         - search_str: The string that will be searched for in the database.
-        - sort: The type of sorting that will be applied to the results (either 'rate' or 'date').
+        - sort: The type of sorting that will be applied to the results ('rate', 'date' or 'relevance').
         - sort_type: A number indicating whether we want ascending or descending order (-/+ 1).
                      If no value is provided, it defaults to ascending order.
                      This parameter only applies if sort == 'rate'. Otherwise, it's ignored.
 
+    Posts are matched through the search backend selected by the search_backend setting (see
+    src/repository/search_index.py): every word of the search string must start a word of the description or of a tag.
+    With the database backend, databases without full-text support fall back to ILIKE.
+
     :param search_str: str: Search for posts that contain the string in their description or tags
-    :param sort: str: Sort the posts by date or rate
+    :param sort: str: Sort the posts by date, rate or relevance
     :param sort_type: int: Sort the posts in ascending or descending order
     :param skip: int: Skip a number of posts, the limit: int parameter is used to limit the number of
     :param limit: int: Limit the number of posts returned by the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param cursor: str: Continue after the page with this cursor instead of skipping
     :return: A list of posts in which the search string is present in the description or
     :doc-author: Trelent
     """
-    search_list = []
-    search_list.append(Post.description.ilike(f'%{search_str}%'))
-    search_list.append(Tag.tag.ilike(f'%{search_str}%'))
-    sql = db.query(Post, User.username, func.coalesce(func.avg(RatePost.rate), 0).label('rate')) \
-        .select_from(Post).join(User).join(RatePost, isouter=True).join(post_tag, isouter=True).join(Tag, isouter=True)\
-        .filter(or_(*search_list)) \
-        .group_by(Post, User.username)
-    if sort == SortType.rate.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc('rate'))
-        else:
-            sql = sql.order_by('rate')
-    if sort == SortType.date.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(Post.created_at))
-        else:
-            sql = sql.order_by(Post.created_at)
-    posts = sql.offset(skip).limit(limit).all()
+    rate = Post.rating.label('rate')
+    sql = select(*SEARCH_POST_COLUMNS, User.username, rate).select_from(Post).join(User)
+    rank = literal(0)
+    search_tokens = search_index.tokenize(search_str)
+    matches = search_index.match_posts(sql, search_tokens, db) if search_tokens else None
+    if matches is not None:
+        sql, rank = matches
+    elif search_str:
+        tagged = select(post_tag.c.post).join(Tag, Tag.id == post_tag.c.tag).filter(Tag.tag.ilike(f'%{search_str}%'))
+        search_list = []
+        search_list.append(Post.description.ilike(f'%{search_str}%'))
+        search_list.append(Post.id.in_(tagged))
+        sql = sql.filter(or_(*search_list))
+    rank = rank.label('rank')
+    if sort == SortType.relevance.name:
+        sql = sql.add_columns(rank)
+    sort_columns = {'created_at': Post.created_at, 'id': Post.id, 'rate': rate, 'rank': rank}
+    keys = [sort_columns[name] for name in get_post_sort_keys(sort)]
+    sql = paginate(sql, keys, skip, limit, cursor, descending=sort_type == -1)
+    posts = (await db.execute(sql)).all()
+    tags = await repository_tags.get_tags_for_posts([post.id for post in posts], db)
     result = []
     for post in posts:
-        item = {x.name: getattr(post[0], x.name) for x in post[0].__table__.columns}
-        item['username'] = post[1]
-        item['rate'] = post[2]
+        item = dict(post._mapping)
         # item['photo_url'] = get_url(item['photo_url'])
-        tags = db.query(Tag).join(post_tag).join(Post).filter(Post.id == item['id']).order_by(Tag.tag).all()
-        item['tags'] = [{'id': tag.id, 'tag': tag.tag} for tag in tags]
+        item['tags'] = tags.get(post.id, [])
+        item['renditions'] = rendition_urls(post.photo_url) if post.renditions_ready else []
         result.append(item)
     return result
 
 
-async def get_search_users(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: Session):
+async def get_search_users(search_str: str, sort: str, sort_type: int, skip: int, limit: int, db: AsyncSession,
+                           cursor: str | None = None):
     """
     The get_search_users function searches for users in the database based on a search string.
     The function takes in a search string, sort type, sort direction (ascending or descending), skip value, limit value and db session.
     It returns all users that match the search criteria.
 
+    Users are matched through the trigram index of the database (see search_index.match_users), so the search
+    doesn't scan the users table; strings shorter than three characters and databases without trigram support
+    fall back to ILIKE. With the relevance sort the most similar users come first when sort_type is -1.
+
     :param search_str: str: Search for users by username, first name, last name or email
     :param sort: str: Determine the sort type
     :param sort_type: int: Determine whether the sort is ascending or descending
     :param skip: int: Skip the first n number of results
     :param limit: int: Limit the number of users returned
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
+    :param cursor: str: Continue after the page with this cursor instead of skipping
     :return: A list of users that match the search string
     """
-    list_reg = []
-    list_reg.append(User.username.ilike(f"%{search_str}%"))
-    list_reg.append(User.first_name.ilike(f"%{search_str}%"))
-    list_reg.append(User.last_name.ilike(f"%{search_str}%"))
-    list_reg.append(User.email.ilike(f"%{search_str}%"))
-    sql = db.query(User).filter(or_(*list_reg))
-    if sort == SortUserType.username.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(SortUserType.username.name))
-        else:
-            sql = sql.order_by(SortUserType.username.name)
-    if sort == SortUserType.date.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.created_at))
-        else:
-            sql = sql.order_by(User.created_at)
-    if sort == SortUserType.email.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.email))
-        else:
-            sql = sql.order_by(User.email)
-    if sort == SortUserType.name.name:
-        if sort_type == -1:
-            sql = sql.order_by(desc(User.first_name), desc(User.last_name))
-        else:
-            sql = sql.order_by(User.first_name, User.last_name)
-    users = sql.offset(skip).limit(limit).all()
+    sql = select(User)
+    rank = literal(0)
+    matches = search_index.match_users(sql, search_str, db)
+    if matches is not None:
+        sql, rank = matches
+    else:
+        list_reg = []
+        list_reg.append(User.username.ilike(f"%{search_str}%"))
+        list_reg.append(User.first_name.ilike(f"%{search_str}%"))
+        list_reg.append(User.last_name.ilike(f"%{search_str}%"))
+        list_reg.append(User.email.ilike(f"%{search_str}%"))
+        sql = sql.filter(or_(*list_reg))
+    rank = rank.label('rank')
+    keys = [rank if key == 'rank' else key for key in get_user_sort_keys(sort)]
+    sql = paginate(sql, keys, skip, limit, cursor, descending=sort_type == -1)
+    if sort != SortUserType.relevance.name:
+        return (await db.scalars(sql)).all()
+    users = []
+    for user, user_rank in await db.execute(sql.add_columns(rank)):
+        # the cursor of the next page is made of the rank of the last user
+        user.rank = user_rank
+        users.append(user)
     return users
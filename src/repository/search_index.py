@@ -0,0 +1,348 @@
+import json
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import text, Integer, Float, select, case, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import TextClause, ColumnElement
+from sqlalchemy.sql.selectable import Select
+
+from src.conf.config import settings
+from src.database.after_commit import after_commit
+from src.database.models import Post, Tag, post_tag, User, USERS_SEARCH_DOCUMENT
+from src.services.inverted_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+FULL_TEXT_DIALECTS = ('postgresql', 'sqlite')
+# posts committed by other processes while the memory index is loaded are indexed again by the next catch up
+WATERMARK_OVERLAP = timedelta(seconds=60)
+CATCH_UP_CHUNK = 1000
+
+PG_UPSERT = text(
+    "INSERT INTO posts_search (post_id, document) "
+    "VALUES (:post_id, setweight(to_tsvector('simple', :description), 'A') || "
+    "setweight(to_tsvector('simple', :tags), 'B')) "
+    "ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document"
+)
+PG_DELETE = text("DELETE FROM posts_search WHERE post_id = :post_id")
+PG_REBUILD = [
+    text("DELETE FROM posts_search"),
+    text("INSERT INTO posts_search (post_id, document) "
+         "SELECT posts.id, setweight(to_tsvector('simple', coalesce(posts.description, '')), 'A') || "
+         "setweight(to_tsvector('simple', coalesce(string_agg(tags.tag, ' '), '')), 'B') "
+         "FROM posts LEFT JOIN post_tag ON post_tag.post = posts.id LEFT JOIN tags ON tags.id = post_tag.tag "
+         "GROUP BY posts.id"),
+]
+PG_MATCH = text(
+    "SELECT post_id, ts_rank(document, query) AS rank "
+    "FROM posts_search, to_tsquery('simple', :query) AS query WHERE document @@ query"
+)
+
+SQLITE_INSERT = text("INSERT INTO posts_search (rowid, description, tags) VALUES (:post_id, :description, :tags)")
+SQLITE_DELETE = text("DELETE FROM posts_search WHERE rowid = :post_id")
+SQLITE_REBUILD = [
+    text("DELETE FROM posts_search"),
+    text("INSERT INTO posts_search (rowid, description, tags) "
+         "SELECT posts.id, coalesce(posts.description, ''), coalesce(group_concat(tags.tag, ' '), '') "
+         "FROM posts LEFT JOIN post_tag ON post_tag.post = posts.id LEFT JOIN tags ON tags.id = post_tag.tag "
+         "GROUP BY posts.id"),
+]
+SQLITE_MATCH = text(
+    "SELECT rowid AS post_id, -rank AS rank FROM posts_search WHERE posts_search MATCH :query"
+)
+
+# trigrams can't match shorter strings, the user search falls back to ILIKE for them
+TRIGRAM_LENGTH = 3
+PG_USER_MATCH = text(
+    "SELECT id AS user_id, greatest(similarity(username, :search), similarity(first_name, :search), "
+    "similarity(last_name, :search), similarity(email, :search)) AS rank "
+    f"FROM users WHERE {USERS_SEARCH_DOCUMENT} LIKE :pattern"
+)
+SQLITE_USER_MATCH = text(
+    "SELECT rowid AS user_id, -rank AS rank FROM users_search WHERE users_search MATCH :query"
+)
+
+# matches of the memory backend
+PG_IDS = text(
+    "SELECT post_id, rank FROM unnest(CAST(:post_ids AS INTEGER[]), CAST(:ranks AS INTEGER[])) "
+    "AS matches (post_id, rank)"
+)
+SQLITE_IDS = text(
+    "SELECT json_extract(value, '$[0]') AS post_id, json_extract(value, '$[1]') AS rank FROM json_each(:matches)"
+)
+
+
+def get_dialect(db: AsyncSession) -> str | None:
+    """
+    The get_dialect function returns the name of the database dialect the session is bound to
+    (e.g. 'postgresql' or 'sqlite'), or None if it can't be determined.
+
+    :param db: AsyncSession: Database session
+    :return: Name of the dialect
+    """
+    name = getattr(getattr(db.get_bind(), 'dialect', None), 'name', None)
+    return name if isinstance(name, str) else None
+
+
+def tokenize(search_str: str) -> List[str]:
+    """
+    The tokenize function splits a search string into lowercase word tokens. Everything that is not a word
+    character is dropped, so the tokens are safe to embed into tsquery and FTS5 query syntax.
+
+    :param search_str: str: Search string from the user
+    :return: A list of tokens
+    """
+    return re.findall(r'\w+', search_str.lower())
+
+
+def rebuild_statements(dialect: str | None) -> List[TextClause]:
+    """
+    The rebuild_statements function returns the statements that rebuild the whole full-text index
+    from the posts and tags tables for the given dialect (an empty list if it has no full-text support).
+
+    :param dialect: str: Name of the database dialect
+    :return: A list of SQL statements
+    """
+    return {'postgresql': PG_REBUILD, 'sqlite': SQLITE_REBUILD}.get(dialect, [])
+
+
+class DatabaseSearchBackend:
+    """
+    Search backend keeping the index in the database itself: a tsvector table on PostgreSQL, an FTS5 table on SQLite.
+    Index writes share the transaction of the post, so both are stored atomically.
+    """
+
+    async def startup(self, db: AsyncSession) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+    async def index_post(self, post: Post, db: AsyncSession) -> None:
+        dialect = get_dialect(db)
+        if dialect not in FULL_TEXT_DIALECTS:
+            return
+        params = {'post_id': post.id, 'description': post.description or '',
+                  'tags': ' '.join(tag.tag for tag in post.tags)}
+        if dialect == 'postgresql':
+            await db.execute(PG_UPSERT, params)
+        elif dialect == 'sqlite':
+            await db.execute(SQLITE_DELETE, params)
+            await db.execute(SQLITE_INSERT, params)
+
+    async def remove_post(self, post_id: int, db: AsyncSession) -> None:
+        dialect = get_dialect(db)
+        if dialect == 'postgresql':
+            await db.execute(PG_DELETE, {'post_id': post_id})
+        elif dialect == 'sqlite':
+            await db.execute(SQLITE_DELETE, {'post_id': post_id})
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        for statement in rebuild_statements(get_dialect(db)):
+            await db.execute(statement)
+        await db.commit()
+
+    def match(self, sql: Select, tokens: List[str], db: AsyncSession) -> Tuple[Select, ColumnElement] | None:
+        dialect = get_dialect(db)
+        if dialect == 'postgresql':
+            matches = PG_MATCH.bindparams(query=' & '.join(f'{token}:*' for token in tokens))
+        elif dialect == 'sqlite':
+            matches = SQLITE_MATCH.bindparams(query=' '.join(f'"{token}"*' for token in tokens))
+        else:
+            return None
+        matches = matches.columns(post_id=Integer, rank=Float).subquery('matches')
+        return sql.join(matches, matches.c.post_id == Post.id), matches.c.rank
+
+
+class MemorySearchBackend:
+    """
+    Search backend keeping an inverted index of post descriptions and tag names in the process memory,
+    for databases without (good) full-text search. Changes made through src/repository/posts.py are applied
+    to the index when their transaction commits. Every worker process holds its own index: it is loaded from
+    the snapshot file and caught up with the posts changed since (or rebuilt from the database) on startup,
+    and written back to the snapshot on shutdown.
+    """
+
+    def __init__(self, snapshot_path: str = ''):
+        self.index = InvertedIndex()
+        self.snapshot_path = snapshot_path
+
+    async def startup(self, db: AsyncSession) -> None:
+        loaded = False
+        if self.snapshot_path:
+            try:
+                loaded = self.index.load(self.snapshot_path)
+            except Exception:
+                logger.exception('Search index snapshot %s is unreadable, rebuilding the index', self.snapshot_path)
+        if loaded and self.index.watermark is not None:
+            await self.catch_up(db)
+        else:
+            await self.rebuild(db)
+
+    def shutdown(self) -> None:
+        if self.snapshot_path:
+            self.index.save(self.snapshot_path)
+
+    async def index_post(self, post: Post, db: AsyncSession) -> None:
+        terms = tokenize(' '.join([post.description or '', *(tag.tag for tag in post.tags)]))
+        after_commit(db, lambda: self.index.add(post.id, terms))
+
+    async def remove_post(self, post_id: int, db: AsyncSession) -> None:
+        after_commit(db, lambda: self.index.remove(post_id))
+
+    async def documents(self, db: AsyncSession, post_ids: List[int] | None = None) -> List[Tuple[int, List[str]]]:
+        tags_sql = select(post_tag.c.post, Tag.tag).join(Tag, Tag.id == post_tag.c.tag)
+        posts_sql = select(Post.id, Post.description)
+        if post_ids is not None:
+            tags_sql = tags_sql.filter(post_tag.c.post.in_(post_ids))
+            posts_sql = posts_sql.filter(Post.id.in_(post_ids))
+        tags = defaultdict(list)
+        for post_id, tag in await db.execute(tags_sql):
+            tags[post_id].append(tag)
+        return [(post_id, tokenize(' '.join([description or '', *tags[post_id]])))
+                for post_id, description in await db.execute(posts_sql)]
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        watermark = datetime.now() - WATERMARK_OVERLAP
+        documents = await self.documents(db)
+        self.index.clear()
+        for post_id, terms in documents:
+            self.index.add(post_id, terms)
+        self.index.watermark = watermark.isoformat()
+
+    async def catch_up(self, db: AsyncSession) -> None:
+        """
+        The catch_up function brings a loaded snapshot up to date with the database: posts deleted since are
+        dropped, posts created or updated after its watermark (e.g. by another worker process, or after
+        the last snapshot of a crashed one) are indexed again.
+
+        :param db: AsyncSession: Database session
+        :return: None
+        """
+        watermark = datetime.now() - WATERMARK_OVERLAP
+        existing = set(await db.scalars(select(Post.id)))
+        for post_id in set(self.index.documents) - existing:
+            self.index.remove(post_id)
+        changed = set(await db.scalars(select(Post.id).filter(
+            Post.updated_at >= datetime.fromisoformat(self.index.watermark))))
+        changed = sorted(changed | (existing - set(self.index.documents)))
+        for start in range(0, len(changed), CATCH_UP_CHUNK):
+            for post_id, terms in await self.documents(db, changed[start:start + CATCH_UP_CHUNK]):
+                self.index.add(post_id, terms)
+        self.index.watermark = watermark.isoformat()
+
+    def match(self, sql: Select, tokens: List[str], db: AsyncSession) -> Tuple[Select, ColumnElement]:
+        ranks = self.index.search(tokens)
+        dialect = get_dialect(db)
+        # the matches are passed as one or two array parameters and joined as a table: tens of thousands of
+        # bind parameters (or a CASE with one branch per post) would make the query slow, or exceed the limits
+        if dialect == 'postgresql':
+            matches = PG_IDS.bindparams(post_ids=list(ranks), ranks=list(ranks.values()))
+        elif dialect == 'sqlite':
+            matches = SQLITE_IDS.bindparams(matches=json.dumps(list(ranks.items())))
+        else:
+            rank = case(ranks, value=Post.id, else_=0) if ranks else literal(0)
+            return sql.filter(Post.id.in_(list(ranks))), rank
+        matches = matches.columns(post_id=Integer, rank=Integer).subquery('matches')
+        return sql.join(matches, matches.c.post_id == Post.id), matches.c.rank
+
+
+SEARCH_BACKENDS = {'database': DatabaseSearchBackend, 'memory': MemorySearchBackend}
+
+
+def get_search_backend(name: str) -> DatabaseSearchBackend | MemorySearchBackend:
+    """
+    The get_search_backend function creates the search backend selected by the search_backend setting.
+
+    :param name: str: 'database' or 'memory'
+    :return: The search backend
+    """
+    if name == 'memory':
+        return MemorySearchBackend(settings.search_snapshot_path)
+    if name in SEARCH_BACKENDS:
+        return SEARCH_BACKENDS[name]()
+    raise ValueError(f'Unknown search backend: {name}')
+
+
+search_backend = get_search_backend(settings.search_backend)
+
+
+async def index_post(post: Post, db: AsyncSession) -> None:
+    """
+    The index_post function writes the description and tag names of a post into the search index.
+    It must be called after the post is flushed (so it has an id) and before the transaction is committed,
+    so the post and its index entry are stored atomically.
+
+    :param post: Post: Post to index
+    :param db: AsyncSession: Database session
+    :return: None
+    """
+    await search_backend.index_post(post, db)
+
+
+async def remove_post_index(post_id: int, db: AsyncSession) -> None:
+    """
+    The remove_post_index function removes a post from the search index.
+
+    :param post_id: int: Post's ID
+    :param db: AsyncSession: Database session
+    :return: None
+    """
+    await search_backend.remove_post(post_id, db)
+
+
+async def rebuild_index(db: AsyncSession) -> None:
+    """
+    The rebuild_index function re-creates the search index for all posts, e.g. for posts that were
+    written bypassing src/repository/posts.py.
+
+    :param db: AsyncSession: Database session
+    :return: None
+    """
+    await search_backend.rebuild(db)
+
+
+def match_posts(sql: Select, tokens: List[str], db: AsyncSession) -> Tuple[Select, ColumnElement] | None:
+    """
+    The match_posts function restricts a select over posts to the posts containing every token (as a word prefix)
+    in their description or tags, and returns it with the rank expression of the match (higher is more relevant).
+    It returns None when the search backend can't match in this database, so the caller can fall back to ILIKE.
+
+    :param sql: Select: Select over the posts table
+    :param tokens: List[str]: Tokens produced by tokenize
+    :param db: AsyncSession: Database session
+    :return: The filtered select and the rank expression, or None
+    """
+    return search_backend.match(sql, tokens, db)
+
+
+def match_users(sql: Select, search_str: str, db: AsyncSession) -> Tuple[Select, ColumnElement] | None:
+    """
+    The match_users function restricts a select over users to the users whose username, first name, last name
+    or email contains the search string (case-insensitive), through the trigram index of the database,
+    and returns it with the rank of the match: the pg_trgm similarity on Postgres, bm25 on SQLite (higher is better).
+    It returns None when the string is too short for trigrams or the database has no trigram index,
+    so the caller can fall back to ILIKE.
+
+    :param sql: Select: Select over the users table
+    :param search_str: str: Search string from the user
+    :param db: AsyncSession: Database session
+    :return: The filtered select and the rank expression, or None
+    """
+    if len(search_str) < TRIGRAM_LENGTH:
+        return None
+    dialect = get_dialect(db)
+    if dialect == 'postgresql':
+        pattern = re.sub(r'([\\%_])', r'\\\1', search_str.lower())
+        matches = PG_USER_MATCH.bindparams(search=search_str, pattern=f'%{pattern}%')
+    elif dialect == 'sqlite':
+        # one FTS5 phrase: the trigram tokenizer matches it as a substring of a column
+        matches = SQLITE_USER_MATCH.bindparams(query='"' + search_str.replace('"', '""') + '"')
+    else:
+        return None
+    matches = matches.columns(user_id=Integer, rank=Float).subquery('matches')
+    return sql.join(matches, matches.c.user_id == User.id), matches.c.rank
@@ -1,33 +1,113 @@
+from collections import defaultdict
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import extract
 
-from src.database.models import Post, User, Tag
+from src.database.after_commit import after_commit
+from src.database.models import Post, User, Tag, post_tag
 from src.schemas import TagBase, TagModel
+from src.services.tag_index import tag_index
 
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
 
-def get_tag_by_name(tag_name: str, db: Session) -> Tag | None:
-    tag = db.query(Tag).filter(Tag.tag == tag_name).first()
+
+async def get_tag_by_name(tag_name: str, db: AsyncSession) -> Tag | None:
+    tag = await db.scalar(select(Tag).filter(Tag.tag == tag_name))
     return tag
 
 
-def create_tag(tag_name: str, user, db: Session):
+async def create_tag(tag_name: str, user, db: AsyncSession):
     tag = Tag(tag=tag_name, user_id=user.id)
     db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    await db.commit()
+    await db.refresh(tag)
+    tag_index.add(tag.tag)
     return tag
 
 
-def get_tags_list(tags: list, user, db: Session) -> List[Tag]:
-    tags_list = []
-    if len(tags) > 0:
-        for tag_name in tags:
-            tag = get_tag_by_name(tag_name, db)
-            if not tag:
-                tag = create_tag(tag_name, user, db)
-            tags_list.append(tag)
+async def get_tags_by_names(tag_names: List[str], db: AsyncSession) -> dict[str, Tag]:
+    tags = (await db.scalars(select(Tag).filter(Tag.tag.in_(tag_names)))).all()
+    return {tag.tag: tag for tag in tags}
+
+
+async def insert_missing_tags(tag_names: List[str], user, db: AsyncSession) -> None:
+    # a tag inserted meanwhile by a concurrent transaction is skipped instead of failing on the unique constraint
+    rows = [{'tag': tag_name, 'user_id': user.id, 'created_at': datetime.now(), 'updated_at': datetime.now()}
+            for tag_name in tag_names]
+    after_commit(db, lambda: [tag_index.add(tag_name) for tag_name in tag_names])
+    dialect = db.get_bind().dialect.name
+    if dialect in UPSERT_INSERTS:
+        await db.execute(UPSERT_INSERTS[dialect](Tag).values(rows).on_conflict_do_nothing(index_elements=[Tag.tag]))
+        return
+    for row in rows:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(Tag).values(row))
+        except IntegrityError:
+            pass
+
+
+async def get_tags_list(tags: list, user, db: AsyncSession) -> List[Tag]:
+    tag_names = list(dict.fromkeys(tags or []))
+    if not tag_names:
+        return []
+    tags_by_name = await get_tags_by_names(tag_names, db)
+    missing = [tag_name for tag_name in tag_names if tag_name not in tags_by_name]
+    if missing:
+        await insert_missing_tags(missing, user, db)
+        tags_by_name.update(await get_tags_by_names(missing, db))
+    return [tags_by_name[tag_name] for tag_name in tag_names]
+
+
+async def get_tags_for_posts(post_ids: List[int], db: AsyncSession) -> dict[int, List[dict]]:
+    tags = defaultdict(list)
+    if post_ids:
+        rows = await db.execute(select(post_tag.c.post, Tag.id, Tag.tag).join(Tag, Tag.id == post_tag.c.tag)
+                                .filter(post_tag.c.post.in_(post_ids)).order_by(Tag.tag))
+        for post_id, tag_id, tag_name in rows:
+            tags[post_id].append({'id': tag_id, 'tag': tag_name})
+    return tags
+
+
+def count_tag_usage(added: List[str], removed: List[str], db: AsyncSession) -> None:
+    """
+    The count_tag_usage function updates the usage counts of the tag suggestions once the transaction
+    giving tags to a post (or taking them from it) is committed.
+
+    :param added: List[str]: Names of the tags the post got
+    :param removed: List[str]: Names of the tags the post lost
+    :param db: AsyncSession: Database session
+    :return: None
+    """
+    changes = [(name, 1) for name in set(added) - set(removed)] + [(name, -1) for name in set(removed) - set(added)]
+    if changes:
+        after_commit(db, lambda: [tag_index.update(name, delta) for name, delta in changes])
+
+
+async def load_tag_index(db: AsyncSession) -> None:
+    """
+    The load_tag_index function fills the tag suggestions with every tag and the number of its posts.
+    Every process keeps its own index: tags used by another process are suggested after its next restart.
+
+    :param db: AsyncSession: Database session
+    :return: None
+    """
+    rows = await db.execute(select(Tag.tag, func.count(post_tag.c.post))
+                            .outerjoin(post_tag, post_tag.c.tag == Tag.id).group_by(Tag.id, Tag.tag))
+    tag_index.load((name, count) for name, count in rows)
+
+
+def suggest_tags(prefix: str, limit: int) -> List[dict]:
+    """
+    The suggest_tags function returns the most used tags starting with the prefix, from memory.
 
-    return tags_list
+    :param prefix: str: Start of the tag name
+    :param limit: int: Maximal number of tags
+    :return: A list of tags with their usage count
+    """
+    return [{'tag': name, 'count': count} for name, count in tag_index.suggest(prefix, limit)]
@@ -1,84 +1,114 @@
+from datetime import datetime
 from secrets import compare_digest
 
 from fastapi import APIRouter, HTTPException, Depends, status, Security
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.connect import get_db
 from src.repository import users as repository_users
 from src.schemas import UserCreate, TokenModel
 from src.services.auth import auth_service
+from src.services.rate_limiter import RateLimit, form_username
+from src.services.revocation import revocation_list
 from src.services.roles import RoleChecker
 from src.services.messages_templates import ALREADY_EXISTS, SUCCESS_CREATE_USER, INVALID_PASSWORD, INVALID_EMAIL, \
-    INVALID_TOKEN
+    INVALID_TOKEN, NOT_VALIDATE_CREDENTIALS, USER_NOT_ACTIVE
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup(body: UserCreate, db: Session = Depends(get_db)):
+async def signup(body: UserCreate, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes an email and password as input, hashes the password, and stores it in the database.
         If a user with that email already exists, it returns an error message.
     
     :param body: UserCreate: Create a new user
-    :param db: Session: Create a connection to the database
+    :param db: AsyncSession: Create a connection to the database
     :return: A dictionary, so you need to use the same in your test
     """
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail=ALREADY_EXISTS)
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash_async(body.password)
     new_user = await repository_users.create_user(body, db)
     return {"user": new_user, "detail": SUCCESS_CREATE_USER}
 
 
-@router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@router.post("/login", response_model=TokenModel,
+             dependencies=[Depends(RateLimit("login", settings.rate_limit_login, form_username))])
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
     
     :param body: OAuth2PasswordRequestForm: Validate the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the access_token, refresh_token and token type
     """
     user = await repository_users.get_user_by_email(body.username, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_EMAIL)
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password_async(body.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_PASSWORD)
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=USER_NOT_ACTIVE)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_claims(user))
+    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, "uid": user.id})
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     The refresh_token function is used to refresh the access token.
         The function will check if the user has a valid refresh token, and if so, it will create new tokens for them.
         If not, it will raise an HTTPException with status code 401 (UNAUTHORIZED) and detail message INVALID_TOKEN.
     
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A token_type of 'bearer'
     """
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
     user = await repository_users.get_user_by_email(email, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=USER_NOT_ACTIVE)
     if compare_digest(user.refresh_token, token):
         await repository_users.update_token(user, None, db)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_TOKEN)
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_claims(user))
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, "uid": user.id})
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(auth_service.oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """
+    The logout function revokes the access token of the request and forgets the refresh token of the user,
+        so neither of them can be used anymore.
+
+    :param token: str: The access token
+    :param db: AsyncSession: Get the database session
+    :return: None
+    """
+    payload = await auth_service.decode_access_token(token)
+    if 'jti' in payload:
+        await revocation_list.revoke(payload['jti'], datetime.utcfromtimestamp(payload['exp']), db,
+                                     payload.get('uid'))
+    user = await repository_users.get_user_by_email(payload['sub'], db)
+    if user is not None:
+        await repository_users.update_token(user, None, db)
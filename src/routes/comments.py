@@ -1,21 +1,32 @@
 from typing import List
 
-from fastapi import Path, Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import Path, Depends, HTTPException, status, APIRouter, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User, UserRole
 from src.schemas import CommentModel, CommentBase, CommentResponse
 import src.repository.comments as comment_repository
 from src.services.auth import auth_service
+from src.services.pagination import set_next_cursor
 from src.services.roles import RoleChecker
 
 router = APIRouter(prefix="/{post_id}/comments", tags=["comments"])
 
 
+def comment_response(row) -> CommentResponse:
+    # row of comment_repository.COMMENT_WITH_AUTHOR
+    return CommentResponse(comment=CommentBase(id=row.id, comment_text=row.comment_text, created_at=row.created_at,
+                                               updated_at=row.updated_at, user_id=row.user_id),
+                           user_first_name=row.first_name,
+                           user_last_name=row.last_name,
+                           username=row.username,
+                           user_avatar=None)
+
+
 @router.post("/add_comment", status_code=status.HTTP_201_CREATED, response_model=CommentBase)
 async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
-                       db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The add_comments function creates a new comment for the post with the given id.
     The function takes in a CommentModel object, which is validated by Pydantic and then passed to the create_comment method of our repository.
@@ -23,7 +34,7 @@ async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
 
     :param body: CommentModel: Get the data from the request body
     :param post_id: int: Get the post id from the path
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user that is currently logged in
     :return: A commentmodel object, which is a pydantic model
     :doc-author: Trelent
@@ -35,65 +46,49 @@ async def add_comments(body: CommentModel, post_id: int = Path(ge=1),
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[CommentResponse])
-async def get_comments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), post_id: int = Path(ge=1)):
+async def get_comments(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None,
+                       db: AsyncSession = Depends(get_db), post_id: int = Path(ge=1)):
     """
     The get_comments function returns a list of comments for the specified post.
         The function takes in three parameters: skip, limit, and post_id.
         Skip is used to specify how many comments to skip before returning results (defaults to 0).
         Limit is used to specify how many results should be returned (defaults to 100).
+        If a page is full, the cursor of the next page is returned in the X-Next-Cursor header.
 
-
+    :param response: Response: Set the X-Next-Cursor header
     :param skip: int: Skip the first n comments
     :param limit: int: Limit the number of comments returned
-    :param db: Session: Get the database session
+    :param cursor: str: Cursor from the X-Next-Cursor header of the previous page, used instead of skip
+    :param db: AsyncSession: Get the database session
     :param post_id: int: Get the comments for a specific post
     :return: A list of commentresponse objects
     :doc-author: Trelent
     """
-    comment_user = []
-    comments = await comment_repository.get_comments(skip, limit, db, post_id)
-    if comments:
-        for comment_model in comments:
-            user_model = await comment_repository.get_user_by_comment_id(db, comment_model.user_id)
-            response = CommentResponse(comment=comment_model,
-                                       user_first_name=user_model.first_name,
-                                       user_last_name=user_model.last_name,
-                                       username=user_model.username,
-                                       user_avatar=None
-                                       )
-            comment_user.append(response)
-    return comment_user
+    rows = await comment_repository.get_comments_with_authors(skip, limit, db, post_id, cursor)
+    set_next_cursor(response, rows, comment_repository.COMMENTS_ORDER, limit)
+    return [comment_response(row) for row in rows]
 
 
 @router.get("/{comment_id}", status_code=status.HTTP_200_OK, response_model=CommentResponse)
-async def get_comment(db: Session = Depends(get_db), comment_id: int = Path(ge=1)):
+async def get_comment(db: AsyncSession = Depends(get_db), comment_id: int = Path(ge=1)):
     """
     The get_comment function returns a CommentResponse object containing the comment, user_first_name,
     user_last_name and username of the comment with id = comment_id. If no such comment exists in the database,
     a 404 Not Found error is raised.
 
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param comment_id: int: Get the comment id from the path
     :return: A commentresponse object
     :doc-author: Trelent
     """
-    comment_model = await comment_repository.get_comment(db, comment_id)
-    if comment_model is None:
+    row = await comment_repository.get_comment_with_author(db, comment_id)
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    user_model = await comment_repository.get_user_by_comment_id(db, comment_model.user_id)
-
-    comment_response = CommentResponse(comment=comment_model,
-                                       user_first_name=user_model.first_name,
-                                       user_last_name=user_model.last_name,
-                                       username=user_model.username,
-                                       user_avata=None
-                                       )
-
-    return comment_response
+    return comment_response(row)
 
 
 @router.patch("/{comment_id}/edit_comment", status_code=status.HTTP_200_OK, response_model=CommentBase)
-async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                        current_user: User = Depends(auth_service.get_current_user)):
 
     """
@@ -103,7 +98,7 @@ async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Ses
 
     :param body: CommentModel: Specify the data that will be sent in the request body
     :param comment_id: int: Get the id of the comment to be deleted
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the user who is currently logged in
     :return: The edited comment
     :doc-author: Trelent
@@ -117,14 +112,14 @@ async def edit_comment(body: CommentModel, comment_id: int = Path(ge=1), db: Ses
 
 @router.delete("/{comment_id}", status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(RoleChecker([UserRole.Admin.name, UserRole.Moderator.name]))])
-async def delete_contact(comment_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def delete_contact(comment_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
 
     """
     The delete_contact function deletes a contact from the database.
 
     :param comment_id: int: Get the comment id from the url path
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user that is currently logged in
     :return: A 204 status code
     :doc-author: Trelent
@@ -0,0 +1,26 @@
+from typing import List
+
+from fastapi import APIRouter, status, Depends, Query
+
+from src.database.models import UserRole
+from src.schemas import TagSuggestion
+from src.repository.tags import suggest_tags
+from src.services.roles import RoleChecker
+from src.services.tag_index import MAX_SUGGESTIONS
+
+router = APIRouter(prefix='/tags', tags=['tags'])
+
+
+@router.get('/suggest', response_model=List[TagSuggestion], status_code=status.HTTP_200_OK,
+            dependencies=[Depends(RoleChecker([role.name for role in UserRole]))])
+async def suggest(prefix: str = Query(min_length=1, max_length=25), limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    """
+    The suggest function suggests existing tags while the user types one: the most used tags starting
+    with the prefix (case-insensitive), with the number of posts having them. It is served from memory
+    and the claims of the access token, without any query.
+
+    :param prefix: str: Start of the tag name
+    :param limit: int: Maximal number of tags returned
+    :return: A list of tags, the most used first
+    """
+    return suggest_tags(prefix, limit)
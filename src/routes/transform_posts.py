@@ -1,24 +1,34 @@
+import base64
 from typing import List
-from fastapi import HTTPException, status, APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import HTTPException, status, APIRouter, Depends, Response, Request, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import src.repository.transform_posts as rep_transform
+from src.conf.config import settings
 from src.database.connect import get_db
 from src.database.models import User
 from src.schemas_transform_posts import TransformImageModel, URLTransformImageResponse, SaveTransformImageModel, \
-    TransformImageResponse
+    TransformImageResponse, QrCodeFormat
 from src.services.auth import auth_service
-from src.services.messages_templates import NOT_FOUND
+from src.services.messages_templates import NOT_FOUND, UNSUPPORTED_TRANSFORMATION, INVALID_IMAGE
+from src.services.pagination import set_next_cursor
+from src.services.rate_limiter import RateLimit
 from src.services.transform_posts import create_list_transformation
-from src.services.cloudynary import get_transformed_url, get_qrcode
+from src.services import qrcodes, transform_engine
 
-router = APIRouter(prefix='/image/transform', tags=['transform image'])
+router = APIRouter(prefix='/image/transform', tags=['transform image'],
+                   dependencies=[Depends(RateLimit('transform', settings.rate_limit_transform))])
+
+# a transformed image never changes its url, so neither does its QR code; the route is authenticated,
+# so shared caches must not serve it to other clients
+QRCODE_CACHE_CONTROL = 'private, max-age=86400'
 
 
 @router.get('/user', response_model=List[TransformImageResponse], status_code=status.HTTP_200_OK)
-async def get_list_of_transformed_for_user(skip: int = 0, limit: int = 20,
+async def get_list_of_transformed_for_user(response: Response, skip: int = 0, limit: int = 20,
+                                           cursor: str | None = None,
                                            current_user: User = Depends(auth_service.get_current_user),
-                                           db: Session = Depends(get_db)):
+                                           db: AsyncSession = Depends(get_db)):
     """
     The get_list_of_transformed_for_user function returns a list of transformed images for the current user.
         The function takes in three parameters: skip, limit, and current_user.
@@ -26,33 +36,39 @@ async def get_list_of_transformed_for_user(skip: int = 0, limit: int = 20,
         Limit is an integer that represents how many items to return after skipping (defaults to 20).
         Current_user is a User object representing the currently logged-in user.
 
+    :param response: Response: Set the X-Next-Cursor header
     :param skip: int: Skip a number of items in the database
     :param limit: int: Limit the number of images returned
+    :param cursor: str: Cursor from the X-Next-Cursor header of the previous page, used instead of skip
     :param current_user: User: Get the current user from the database
-    :param db: Session: Pass in the database session to the function
+    :param db: AsyncSession: Pass in the database session to the function
     :return: A list of all transformed images for the current user
     :doc-author: Trelent
     """
-    return await rep_transform.get_all_transform_images_for_user(skip, limit, current_user, db)
+    images = await rep_transform.get_all_transform_images_for_user(skip, limit, current_user, db, cursor)
+    set_next_cursor(response, images, rep_transform.TRANSFORMS_ORDER, limit)
+    return images
 
 
 @router.post('/{base_image_id}', response_model=URLTransformImageResponse, status_code=status.HTTP_200_OK)
 async def transformation_for_image(base_image_id: int, body: TransformImageModel,
                                    current_user: User = Depends(
                                        auth_service.get_current_user),
-                                   db: Session = Depends(get_db)):
+                                   db: AsyncSession = Depends(get_db)):
     """
     The transformation_for_image function takes in a base_image_id, body, current_user and db. The function then
     calls the get_image_for transform method from the repos/transformations.py file to retrieve an image url for
     transformation. If no image is found with that id, it raises a 404 error message saying &quot;Image not
     found&quot;. Otherwise, it configures cloudinary using my api key and secret key (which I have hidden). It then
     creates a list of transformations based on what was passed into the body of this request (the user's desired
-    transformations). Finally, it builds an url for that
+    transformations). Finally, it builds an url for that transformation with the transform engine selected by
+    the transform_engine setting: Cloudinary, or Pillow rendering it into the local media store. Repeated
+    transformations are served from the transform cache.
 
     :param base_image_id: int: Get the image from the database
     :param body: TransformImageModel: Get the transformation parameters from the request body
     :param current_user: User: Get the current user from the database
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :return: A url of the transformed image
     """
     image_url = await rep_transform.get_image_for_transform(base_image_id, current_user, db)
@@ -60,14 +76,19 @@ async def transformation_for_image(base_image_id: int, body: TransformImageModel
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
     transform_list = create_list_transformation(body)
-    url = get_transformed_url(image_url, transform_list)
+    try:
+        url = await transform_engine.transform(image_url, transform_list)
+    except transform_engine.UnsupportedTransformation as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'{UNSUPPORTED_TRANSFORMATION}: {e}')
+    except transform_engine.InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'{INVALID_IMAGE}: {e}')
     return {'url': url}
 
 
 @router.post('/save/{base_image_id}', response_model=TransformImageResponse, status_code=status.HTTP_201_CREATED)
 async def save_transform_image(base_image_id: int, body: SaveTransformImageModel,
                                current_user: User = Depends(auth_service.get_current_user),
-                               db: Session = Depends(get_db)):
+                               db: AsyncSession = Depends(get_db)):
     """
     The save_transform_image function is used to save a transformed image.
         The function takes in the base_image_id, body, current user and database as parameters.
@@ -77,41 +98,58 @@ async def save_transform_image(base_image_id: int, body: SaveTransformImageModel
     :param base_image_id: int: Specify the id of the image that is being transformed
     :param body: SaveTransformImageModel: Pass the url of the image to be saved
     :param current_user: User: Get the current user
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: The image with the specified id
     """
-    img = await rep_transform.set_transform_image(base_image_id, body.url, current_user, db)
+    # files of the local transform engine are evicted from the transform cache, the saved ones are kept apart
+    url = await transform_engine.save_transformation(body.url)
+    if url is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+    img = await rep_transform.set_transform_image(base_image_id, url, current_user, db)
     if img is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
     return img
 
 
-@router.get('/qrcode/{transform_image_id}', status_code=status.HTTP_200_OK)
-async def get_qrcode_for_transform_image(transform_image_id: int,
+@router.get('/qrcode/{transform_image_id}', status_code=status.HTTP_200_OK,
+            responses={200: {'content': {'image/png': {}, 'image/svg+xml': {}, 'application/json': {}}}})
+async def get_qrcode_for_transform_image(transform_image_id: int, request: Request,
+                                         qr_format: QrCodeFormat = Query(QrCodeFormat.png, alias='format'),
                                          current_user: User = Depends(auth_service.get_current_user),
-                                         db: Session = Depends(get_db)):
+                                         db: AsyncSession = Depends(get_db)):
     """
     The get_qrcode_for_transform_image function is used to generate a QR code for the transform image.
-    The function takes in an integer representing the id of the transform image and returns a string containing
-    the base64 encoded QR code.
+    The function takes in an integer representing the id of the transform image and returns the QR code of its url
+    as a PNG or SVG image, or with format=json as a string containing the base64 encoded PNG.
+    QR codes are rendered once and cached (see src/services/qrcodes.py). Images are sent with an ETag,
+    so a client revalidating with If-None-Match gets 304 Not Modified.
 
     :param transform_image_id: int: Get the image_url from the database
+    :param request: Request: Read the If-None-Match header
+    :param qr_format: QrCodeFormat: png, svg or json
     :param current_user: User: Get the current user
-    :param db: Session: Access the database
-    :return: A base64 encoded qr code
+    :param db: AsyncSession: Access the database
+    :return: The QR code
     """
     image_url = await rep_transform.get_transform_image(transform_image_id, current_user, db)
     if image_url is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
-    qr_code = get_qrcode(image_url.photo_url)
-    return qr_code
+    if qr_format == QrCodeFormat.json:
+        qr_code = await qrcodes.get_qrcode(image_url.photo_url, QrCodeFormat.png.value)
+        return base64.b64encode(qr_code.content).decode('ascii')
+    qr_code = await qrcodes.get_qrcode(image_url.photo_url, qr_format.value)
+    headers = {'ETag': qr_code.etag, 'Cache-Control': QRCODE_CACHE_CONTROL}
+    if request.headers.get('if-none-match') == qr_code.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=qr_code.content, media_type=qr_code.media_type, headers=headers)
 
 
 @router.get('/{transform_image_id}', response_model=TransformImageResponse, status_code=status.HTTP_200_OK)
 async def get_transformed_image(transform_image_id: int, current_user: User = Depends(auth_service.get_current_user),
-                                db: Session = Depends(get_db)):
+                                db: AsyncSession = Depends(get_db)):
     """
     The get_transformed_image function returns a transformed image by its id. The function takes in the
     transform_image_id as an integer and uses it to query the database for a transformed image. If no such image is
@@ -119,7 +157,7 @@ async def get_transformed_image(transform_image_id: int, current_user: User = De
 
     :param transform_image_id: int: Get the image from the database
     :param current_user: User: Get the current user from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A transform image object
     """
     img = await rep_transform.get_transform_image(transform_image_id, current_user, db)
@@ -131,7 +169,7 @@ async def get_transformed_image(transform_image_id: int, current_user: User = De
 
 @router.delete('/{transform_image_id}', status_code=status.HTTP_204_NO_CONTENT)
 async def remove_transformed_image(transform_image_id: int, current_user: User = Depends(auth_service.get_current_user),
-                                   db: Session = Depends(get_db)):
+                                   db: AsyncSession = Depends(get_db)):
     """
     The remove_transformed_image function is used to remove a transformed image from the database.
         The function takes in an integer representing the id of the transform_image object that will be removed,
@@ -139,7 +177,7 @@ async def remove_transformed_image(transform_image_id: int, current_user: User =
 
     :param transform_image_id: int: Identify the image that is to be removed
     :param current_user: User: Get the user that is currently logged in
-    :param db: Session: Pass the database session to the repository
+    :param db: AsyncSession: Pass the database session to the repository
     :return: An image object
     """
     img = await rep_transform.remove_transform_image(transform_image_id, current_user, db)
@@ -149,9 +187,10 @@ async def remove_transformed_image(transform_image_id: int, current_user: User =
 
 
 @router.get('/all/{base_image_id}', response_model=List[TransformImageResponse], status_code=status.HTTP_200_OK)
-async def get_list_of_transformed_for_image(base_image_id: int, skip: int = 0, limit: int = 20,
+async def get_list_of_transformed_for_image(base_image_id: int, response: Response, skip: int = 0, limit: int = 20,
+                                            cursor: str | None = None,
                                             current_user: User = Depends(auth_service.get_current_user),
-                                            db: Session = Depends(get_db)):
+                                            db: AsyncSession = Depends(get_db)):
     """
     The get_list_of_transformed_for_image function returns a list of transformed images for the given base image. The
     function takes in an integer representing the id of the base image, and two optional parameters: skip and limit.
@@ -159,10 +198,14 @@ async def get_list_of_transformed_for_image(base_image_id: int, skip: int = 0, l
     should be returned at most.
 
     :param base_image_id: int: Get the base image id from the database
+    :param response: Response: Set the X-Next-Cursor header
     :param skip: int: Skip the first n images in the list
     :param limit: int: Limit the number of results returned
+    :param cursor: str: Cursor from the X-Next-Cursor header of the previous page, used instead of skip
     :param current_user: User: Get the current user from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of transformed images for a given base image
     """
-    return await rep_transform.get_all_transform_images(base_image_id, skip, limit, current_user, db)
+    images = await rep_transform.get_all_transform_images(base_image_id, skip, limit, current_user, db, cursor)
+    set_next_cursor(response, images, rep_transform.TRANSFORMS_ORDER, limit)
+    return images
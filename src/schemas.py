@@ -64,6 +64,10 @@ class TagModel(TagBase):
         orm_mode = True
 
 
+class TagSuggestion(TagBase):
+    count: int
+
+
 class TokenModel(BaseModel):
     access_token: str
     refresh_token: str
@@ -81,12 +85,28 @@ class PostCreate(BaseModel):
     tags: Optional[List[str]]
 
 
+class CdnStatus(str, Enum):
+    pending = 'pending'
+    uploaded = 'uploaded'
+    failed = 'failed'
+
+
+class RenditionModel(BaseModel):
+    size: int
+    format: str
+    url: str
+
+
 class PostModel(PostBase):
     id: int
     created_at: datetime
     updated_at: datetime
     user_id: int
     tags: Optional[List[TagModel]]
+    renditions: List[RenditionModel] = []
+    cdn_status: Optional[CdnStatus]
+    comment_count: int = 0
+    rate_count: int = 0
 
     class Config:
         orm_mode = True
@@ -139,6 +159,7 @@ class RateResponse(RateDB, BaseModel):
 class SortType(str, Enum):
     rate = 'rate'
     date = 'date'
+    relevance = 'relevance'
 
 
 class SortUserType(str, Enum):
@@ -146,6 +167,7 @@ class SortUserType(str, Enum):
     name = 'name'
     username = 'username'
     email = 'email'
+    relevance = 'relevance'
 
 
 class SearchModel(BaseModel):
@@ -174,4 +196,7 @@ class SearchResponse(PostBase, BaseModel):
     created_at: datetime
     updated_at: datetime
     rate: int
+    comment_count: int = 0
+    rate_count: int = 0
     tags: Optional[List[TagType]]
+    renditions: List[RenditionModel] = []
@@ -2,7 +2,10 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, confloat, conint
+
+# larger transformations would take a transform worker hundreds of MB per image
+MAX_TRANSFORM_SIZE = 4096
 
 
 class TransformImageResponse(BaseModel):
@@ -39,13 +42,13 @@ class GravityImage(str, Enum):
     south_east = 'south_east'
 
 
-class PercentImage(float):
-    percent: float = Field(ge=0, le=1)
+# a size up to 1.0 is a fraction of the size of the original
+PercentImage = confloat(gt=0, le=1)
 
 
 class TransformCropModel(BaseModel):
-    width: int | PercentImage
-    height: int | PercentImage
+    width: conint(gt=0, le=MAX_TRANSFORM_SIZE) | PercentImage
+    height: conint(gt=0, le=MAX_TRANSFORM_SIZE) | PercentImage
     crop: Optional[TypeResizeImage]
     gravity: Optional[GravityImage]
     background: Optional[str]
@@ -144,5 +147,11 @@ class URLTransformImageResponse(BaseModel):
     url: str = ''
 
 
+class QrCodeFormat(str, Enum):
+    png = 'png'
+    svg = 'svg'
+    json = 'json'
+
+
 class SaveTransformImageModel(BaseModel):
     url: str
@@ -1,15 +1,21 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import uuid4
 
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
+from src.database.models import User
 from src.repository import users as repository_users
-from src.services.messages_templates import NOT_VALIDATE_CREDENTIALS, INVALID_SCOPE
+from src.services.messages_templates import NOT_VALIDATE_CREDENTIALS, INVALID_SCOPE, TOKEN_REVOKED, \
+    USER_NOT_ACTIVE
+from src.services.password_pool import password_pool
+from src.services.revocation import revocation_list
+from src.services.user_cache import user_cache
 
 
 class Auth:
@@ -24,6 +30,13 @@ class Auth:
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
+    # bcrypt blocks for 100-300 ms, so request handlers verify and hash passwords in the password pool
+    async def verify_password_async(self, plain_password, hashed_password):
+        return await password_pool.run(self.verify_password, plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password: str):
+        return await password_pool.run(self.get_password_hash, password)
+
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         to_encode = data.copy()
@@ -32,7 +45,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
+            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid4().hex})
         encoded_access_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
@@ -45,7 +58,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
+            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token", "jti": uuid4().hex})
         encoded_refresh_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
@@ -55,6 +68,8 @@ class Auth:
             payload = jwt.decode(
                 refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
+                if revocation_list.is_revoked(payload):
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=TOKEN_REVOKED)
                 email = payload['sub']
                 return email
             raise HTTPException(
@@ -63,7 +78,18 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail=NOT_VALIDATE_CREDENTIALS)
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def access_token_claims(self, user: User) -> dict:
+        """
+        The access_token_claims function returns the claims of a new access token of the user. Besides the subject
+        they carry the id, the role, the status and the token_version of the user, so authorization needs no lookup.
+
+        :param user: User: The authenticated user
+        :return: The claims to pass to create_access_token
+        """
+        return {"sub": user.email, "uid": user.id, "role": user.user_role, "active": bool(user.is_active),
+                "ver": user.token_version or 0}
+
+    async def decode_access_token(self, token: str) -> dict:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=NOT_VALIDATE_CREDENTIALS,
@@ -73,18 +99,50 @@ class Auth:
             # Decode JWT
             payload = jwt.decode(token, self.SECRET_KEY,
                                  algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        except JWTError:
+            raise credentials_exception
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
             raise credentials_exception
+        # checked in memory, see RevocationList
+        if revocation_list.is_revoked(payload):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=TOKEN_REVOKED)
+        return payload
 
-        user = await repository_users.get_user_by_email(email, db)
+    async def get_token_claims(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> dict:
+        """
+        The get_token_claims function returns the claims of the access token used for authorization (see RoleChecker).
+        They are trusted without querying the database unless they are stale: the token carries no claims
+        (issued before they were added) or its version is older than the known token_version of the user, i.e. the role
+        or the status of the user changed since. Then the claims are read from the users table.
+        A change of the role or the status also revokes the tokens of the user issued before, so the other worker
+        processes (and this one after a restart) reject them within the sync interval of the revocation list.
+
+        :param token: str: The access token
+        :param db: AsyncSession: Database session, only used for stale claims
+        :return: The claims: sub, uid, role, active and ver
+        """
+        payload = await self.decode_access_token(token)
+        if 'ver' in payload and not user_cache.is_stale(payload['uid'], payload['ver']):
+            return payload
+        user = await repository_users.get_user_by_email(payload['sub'], db)
         if user is None:
-            raise credentials_exception
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
+        user_cache.set_version(user.id, user.token_version)
+        return {**payload, **self.access_token_claims(user)}
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        email = (await self.decode_access_token(token))["sub"]
+
+        # the user cache spares the users table lookup on most requests
+        user = await user_cache.get(email, db)
+        if user is None:
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
+            user_cache.set(email, user)
+        # banned users are rejected even if they hold a token issued before the ban that isn't revoked yet
+        if not user.is_active:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=USER_NOT_ACTIVE)
         return user
 
 
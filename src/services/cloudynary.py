@@ -1,14 +1,18 @@
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
-import base64
-import io
-import qrcode
-import qrcode.image.base
-import qrcode.image.svg
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set, Tuple
+
 import json
 
 from src.conf.config import settings
+from src.services import media_storage
 
 cloudinary.config(
         cloud_name=settings.cloudinary_name,
@@ -18,13 +22,151 @@ cloudinary.config(
     )
 
 
-def upload_image(image_url: str):
-    try:
-        image_info = cloudinary.api.resource("789.jpg")
-    except cloudinary.exceptions.NotFound:
-        with open(image_url, "rb") as f:
-            file = f.read()
-        cloudinary.uploader.upload(file, public_id=image_url.split('.')[0], overwrite=True)
+class CloudinaryUploadBackend:
+    """
+    Upload backend pushing originals to Cloudinary.
+    """
+
+    def upload(self, image_url: str, public_id: str) -> None:
+        # the path is passed instead of the content, so the SDK streams the file
+        cloudinary.uploader.upload(image_url, public_id=public_id, overwrite=True)
+
+
+class MemoryUploadBackend:
+    """
+    Upload backend only recording the uploads, for tests and offline benchmarks.
+    """
+
+    def __init__(self):
+        self.uploads: Dict[str, str] = {}
+
+    def upload(self, image_url: str, public_id: str) -> None:
+        self.uploads[public_id] = image_url
+
+
+UPLOAD_BACKENDS = {'cloudinary': CloudinaryUploadBackend, 'memory': MemoryUploadBackend}
+
+
+def get_upload_backend(name: str) -> CloudinaryUploadBackend | MemoryUploadBackend:
+    """
+    The get_upload_backend function creates the upload backend selected by the upload_backend setting.
+
+    :param name: str: 'cloudinary' or 'memory'
+    :return: The upload backend
+    """
+    if name in UPLOAD_BACKENDS:
+        return UPLOAD_BACKENDS[name]()
+    raise ValueError(f'Unknown upload backend: {name}')
+
+
+class UploadRegistry:
+    """
+    Registry of the originals already uploaded, as (public_id, SHA-256 of the content) pairs. It is kept in an SQLite
+    file shared by the worker processes and survives restarts; every process caches the pairs it has seen in memory.
+    An original whose content changed under the same public_id is not registered and is uploaded again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.known: Set[Tuple[str, str]] = set()
+        self.created = False
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self.created:
+            connection.execute('CREATE TABLE IF NOT EXISTS uploaded '
+                               '(public_id TEXT PRIMARY KEY, sha256 TEXT NOT NULL, uploaded_at REAL NOT NULL)')
+            self.created = True
+        return connection
+
+    def contains(self, public_id: str, sha256: str) -> bool:
+        if (public_id, sha256) in self.known:
+            return True
+        with self.connect() as connection:
+            row = connection.execute('SELECT sha256 FROM uploaded WHERE public_id = ?', (public_id,)).fetchone()
+        connection.close()
+        if row is not None and row[0] == sha256:
+            self.known.add((public_id, sha256))
+            return True
+        return False
+
+    def add(self, public_id: str, sha256: str) -> None:
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO uploaded (public_id, sha256, uploaded_at) VALUES (?, ?, ?)',
+                               (public_id, sha256, time.time()))
+        connection.close()
+        self.known.add((public_id, sha256))
+
+
+upload_backend = get_upload_backend(settings.upload_backend)
+upload_registry = UploadRegistry(settings.upload_registry_path)
+_pool: ThreadPoolExecutor | None = None
+_uploading: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.upload_workers, thread_name_prefix='upload')
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def get_public_id(image_url: str) -> str:
+    return image_url.split('.')[0]
+
+
+def content_hash(image_url: str) -> str:
+    """
+    The content_hash function returns the SHA-256 hash of an original. Content-addressed files of the media store
+    carry it in their name, other files are read.
+
+    :param image_url: str: Path of the original
+    :return: The hash
+    """
+    if media_storage.is_blob_path(image_url):
+        return os.path.splitext(os.path.basename(image_url))[0]
+    digest = hashlib.sha256()
+    with open(image_url, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _upload(image_url: str, public_id: str, sha256: str) -> None:
+    if not upload_registry.contains(public_id, sha256):
+        upload_backend.upload(image_url, public_id)
+        upload_registry.add(public_id, sha256)
+
+
+async def upload_image(image_url: str) -> None:
+    """
+    The upload_image function uploads an original to the upload backend unless the upload registry already has it,
+    so every original is pushed at most once. Registry lookups and uploads run in a bounded thread pool
+    (upload_workers), so the event loop is never blocked; concurrent calls for the same original share one upload.
+
+    :param image_url: str: Path of the original
+    :return: None
+    """
+    public_id = get_public_id(image_url)
+    if media_storage.is_blob_path(image_url):
+        sha256 = content_hash(image_url)
+        if (public_id, sha256) in upload_registry.known:
+            return
+    else:
+        sha256 = await asyncio.get_running_loop().run_in_executor(get_pool(), content_hash, image_url)
+    key = (public_id, sha256)
+    if key not in _uploading:
+        loop = asyncio.get_running_loop()
+        _uploading[key] = loop.run_in_executor(get_pool(), _upload, image_url, public_id, sha256)
+        _uploading[key].add_done_callback(lambda _: _uploading.pop(key, None))
+    await asyncio.shield(_uploading[key])
 
 
 def get_url(image_url: str):
@@ -39,31 +181,15 @@ def get_url(image_url: str):
     return cloudinary.CloudinaryImage(image_url).build_url()
 
 
-def get_transformed_url(image_url: str, transform_list: list[dict]):
+async def get_transformed_url(image_url: str, transform_list: list[dict]):
     """
     The get_transformed_url function takes in an image_url and a list of transformations,
-    and returns the url for the transformed image.
+    and returns the url for the transformed image. The original is uploaded first, unless it already was.
 
 
     :param image_url: str: Specify the image to be transformed
     :param transform_list: list[dict]: Specify the transformations that will be applied to the image
     :return: A url string with the transformations applied
     """
-    upload_image(image_url)
+    await upload_image(image_url)
     return cloudinary.CloudinaryImage(image_url).build_url(transformation=transform_list)
-
-
-def get_qrcode(photo_url: str):
-    """
-    The get_qrcode function takes a photo_url as an argument and returns the QR code for that URL.
-    The function uses the qrcode library to create a QR code object from the photo_url, then saves it to a buffer.
-    The buffer is encoded in base64 and returned as a string.
-
-    :param photo_url: str: Tell the function what type of data to expect
-    :return: A base64 encoded string of a qr code image
-    """
-    qr = qrcode.make(photo_url)
-    buf = io.BytesIO()
-    qr.save(buf)
-    qr_code = base64.b64encode(buf.getvalue()).decode('ascii')
-    return qr_code
@@ -0,0 +1,184 @@
+import gzip
+import json
+import os
+import tempfile
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+SNAPSHOT_VERSION = 2
+
+
+def intersect(first: array, second: array) -> array:
+    """
+    The intersect function intersects two sorted posting lists. It walks the shorter list and
+    binary-searches the longer one from the last match, so a rare term against a common one costs
+    O(len(short) * log(len(long))) instead of touching every posting.
+
+    :param first: array: Sorted post ids
+    :param second: array: Sorted post ids
+    :return: Sorted post ids present in both lists
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    result = array('q')
+    position = 0
+    for post_id in first:
+        position = bisect_left(second, post_id, position)
+        if position == len(second):
+            break
+        if second[position] == post_id:
+            result.append(post_id)
+    return result
+
+
+def union(lists: List[array]) -> array:
+    """
+    The union function merges several sorted posting lists into one sorted list without duplicates.
+
+    :param lists: List[array]: Sorted post ids
+    :return: Sorted post ids present in any of the lists
+    """
+    if len(lists) == 1:
+        return lists[0]
+    return array('q', sorted(set().union(*lists)))
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index: every term maps to a posting list, a sorted ``array('q')`` of post ids
+    (8 bytes per posting). A forward index (post id -> terms) makes updates and removals incremental
+    and is all that a snapshot needs to store.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.terms: List[str] = []
+        self.documents: Dict[int, Tuple[str, ...]] = {}
+        # the posts of the database changed before this time (ISO format) are in the index, see MemorySearchBackend
+        self.watermark: str | None = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, post_id: int, terms: Iterable[str]) -> None:
+        """
+        The add function indexes (or re-indexes) a post under the given terms.
+
+        :param post_id: int: Post's ID
+        :param terms: Iterable[str]: Terms of the post
+        :return: None
+        """
+        self.remove(post_id)
+        terms = tuple(sorted(set(terms)))
+        self.documents[post_id] = terms
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                self.postings[term] = array('q', [post_id])
+                insort(self.terms, term)
+            else:
+                posting.insert(bisect_left(posting, post_id), post_id)
+
+    def remove(self, post_id: int) -> None:
+        """
+        The remove function drops a post from the index. Terms left without posts are forgotten.
+
+        :param post_id: int: Post's ID
+        :return: None
+        """
+        for term in self.documents.pop(post_id, ()):
+            posting = self.postings[term]
+            del posting[bisect_left(posting, post_id)]
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def clear(self) -> None:
+        self.postings.clear()
+        self.terms.clear()
+        self.documents.clear()
+        self.watermark = None
+
+    def expand(self, prefix: str) -> List[str]:
+        """
+        The expand function returns all indexed terms starting with the prefix, using the sorted term list.
+
+        :param prefix: str: Term prefix
+        :return: A list of terms
+        """
+        terms = []
+        for position in range(bisect_left(self.terms, prefix), len(self.terms)):
+            if not self.terms[position].startswith(prefix):
+                break
+            terms.append(self.terms[position])
+        return terms
+
+    def search(self, tokens: List[str]) -> Dict[int, int]:
+        """
+        The search function finds the posts containing every token as a term prefix. Posting lists of
+        each token are intersected from the shortest one up, so selective words prune the work early.
+        The rank of a post is the number of tokens matching one of its terms exactly plus one per token.
+
+        :param tokens: List[str]: Query tokens
+        :return: A dict of post id -> rank
+        """
+        matched = []
+        for token in set(tokens):
+            terms = self.expand(token)
+            if not terms:
+                return {}
+            matched.append((token, union([self.postings[term] for term in terms])))
+        matched.sort(key=lambda item: len(item[1]))
+        result = matched[0][1]
+        for _, posting in matched[1:]:
+            result = intersect(result, posting)
+            if not result:
+                return {}
+        ranks = {}
+        for post_id in result:
+            terms = self.documents[post_id]
+            ranks[post_id] = sum(1 + (terms[min(bisect_left(terms, token), len(terms) - 1)] == token)
+                                 for token, _ in matched)
+        return ranks
+
+    def save(self, path: str) -> None:
+        """
+        The save function writes a snapshot of the index (the forward index and the watermark) to
+        a gzip-compressed JSON file. It is written to a temporary file of its own and renamed, so a crash never
+        leaves a truncated snapshot and processes saving at the same time don't write into each other's file.
+
+        :param path: str: Snapshot file
+        :return: None
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f'{os.path.basename(path)}.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump({'version': SNAPSHOT_VERSION, 'watermark': self.watermark,
+                           'documents': self.documents}, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> bool:
+        """
+        The load function replaces the index content with a snapshot written by save.
+        A corrupt snapshot raises an error and leaves the index unchanged.
+
+        :param path: str: Snapshot file
+        :return: True if the snapshot was loaded, False if it is missing or has another version
+        """
+        if not os.path.exists(path):
+            return False
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            return False
+        documents = [(int(post_id), terms) for post_id, terms in snapshot['documents'].items()]
+        self.clear()
+        for post_id, terms in documents:
+            self.add(post_id, terms)
+        self.watermark = snapshot['watermark']
+        return True
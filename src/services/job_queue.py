@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import time
+from typing import List, NamedTuple
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+
+
+class JobQueue:
+    """
+    Durable job queue kept in a local SQLite file, shared by the worker processes of the application.
+    A claimed job is leased to its worker for lease seconds: if the worker dies before finishing it, the job is
+    claimed again once the lease expires. Failed jobs are retried with exponential backoff up to max_attempts times.
+
+    Job states: queued -> running -> done, or back to queued for a retry, or failed after the last attempt.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5, backoff: float = 2, lease: float = 300):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.created = False
+
+    def connect(self) -> sqlite3.Connection:
+        # autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE where needed
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self.created:
+            connection.execute('CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, '
+                               'payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+                               'run_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at)')
+            self.created = True
+        return connection
+
+    def enqueue(self, kind: str, payload: dict) -> int:
+        """
+        The enqueue function adds a job to the queue.
+
+        :param kind: str: Type of the job, selects its handler
+        :param payload: dict: JSON serializable arguments of the job
+        :return: Id of the job
+        """
+        now = time.time()
+        connection = self.connect()
+        try:
+            cursor = connection.execute('INSERT INTO jobs (kind, payload, status, run_at, created_at) '
+                                        "VALUES (?, ?, 'queued', ?, ?)", (kind, json.dumps(payload), now, now))
+            return cursor.lastrowid
+        finally:
+            connection.close()
+
+    def claim(self, limit: int) -> List[Job]:
+        """
+        The claim function takes up to limit due jobs (queued ones and running ones whose lease expired)
+        and leases them to the caller.
+
+        :param limit: int: Maximal number of jobs
+        :return: The claimed jobs
+        """
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            rows = connection.execute("SELECT id, kind, payload, attempts FROM jobs "
+                                      "WHERE status IN ('queued', 'running') AND run_at <= ? ORDER BY run_at LIMIT ?",
+                                      (now, limit)).fetchall()
+            connection.executemany("UPDATE jobs SET status = 'running', attempts = attempts + 1, run_at = ? "
+                                   "WHERE id = ?", [(now + self.lease, row[0]) for row in rows])
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+        return [Job(job_id, kind, json.loads(payload), attempts + 1) for job_id, kind, payload, attempts in rows]
+
+    def complete(self, job: Job) -> None:
+        connection = self.connect()
+        try:
+            connection.execute("UPDATE jobs SET status = 'done', last_error = NULL WHERE id = ?", (job.id,))
+        finally:
+            connection.close()
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        The fail function records a failed attempt of a job and schedules its retry.
+
+        :param job: Job: The claimed job
+        :param error: str: Description of the error
+        :return: True if the job is retried, False if it failed for good
+        """
+        retry = job.attempts < self.max_attempts
+        connection = self.connect()
+        try:
+            connection.execute('UPDATE jobs SET status = ?, run_at = ?, last_error = ? WHERE id = ?',
+                               ('queued' if retry else 'failed', time.time() + self.backoff ** job.attempts,
+                                error, job.id))
+        finally:
+            connection.close()
+        return retry
+
+    def status(self, job_id: int) -> str | None:
+        connection = self.connect()
+        try:
+            row = connection.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def purge(self, older_than: float) -> int:
+        """
+        The purge function deletes the finished jobs (done or failed for good) created more than older_than
+        seconds ago. The outcome of the uploads stays recorded in the cdn_status of the posts.
+
+        :param older_than: float: Age in seconds
+        :return: Number of deleted jobs
+        """
+        connection = self.connect()
+        try:
+            cursor = connection.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+                                        (time.time() - older_than,))
+            return cursor.rowcount
+        finally:
+            connection.close()
@@ -0,0 +1,177 @@
+import os
+import pathlib
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from src.services.uploads import remove_file, save_upload
+
+MEDIA_ROOT = 'media'
+INCOMING_DIR = '.incoming'
+BLOB_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+# extensions spelled in several ways, so the same content is stored once whichever the upload used
+SUFFIX_ALIASES = {'.jpeg': '.jpg', '.jpe': '.jpg', '.tif': '.tiff'}
+
+
+def blob_path(sha256: str, suffix: str = '') -> str:
+    """
+    The blob_path function returns the content-addressed path of a file: the hash of its content sharded
+    into two directory levels, e.g. media/ab/cd/abcd...ef.jpg, so no directory grows too large.
+
+    :param sha256: str: SHA-256 hash of the content
+    :param suffix: str: Extension of the file
+    :return: Path of the file
+    """
+    suffix = suffix.lower()
+    return f'{MEDIA_ROOT}/{sha256[:2]}/{sha256[2:4]}/{sha256}{SUFFIX_ALIASES.get(suffix, suffix)}'
+
+
+def is_blob_path(path: str) -> bool:
+    prefix = f'{MEDIA_ROOT}/'
+    return path.startswith(prefix) and BLOB_PATTERN.match(path[len(prefix):]) is not None
+
+
+def in_media_root(path: str) -> bool:
+    return path.startswith(f'{MEDIA_ROOT}/') and '..' not in pathlib.PurePosixPath(path).parts
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """
+    The replacing function yields a temporary path of its own next to path and renames it to path once the block
+    has written it, so readers never see a partial file and concurrent writers of the same path don't write into
+    each other's file (the last rename wins). The temporary file is deleted if the block fails.
+
+    :param path: str: Path of the file to write
+    :return: The temporary path to write to
+    """
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    # kept until the post referencing the file is committed, see finish_upload
+    incoming_path: str
+
+
+def _publish(incoming_path: str, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # the same content uploaded again replaces the blob with identical bytes, so a concurrent reader never
+    # sees a partial file; the incoming file is kept (as a hard link) to publish it again if needed
+    with replacing(path) as tmp_path:
+        try:
+            os.link(incoming_path, tmp_path)
+        except OSError:
+            shutil.copyfile(incoming_path, tmp_path)
+
+
+async def store_upload(upload: UploadFile) -> StoredUpload:
+    """
+    The store_upload function streams an upload into the media store under its content-addressed path.
+    Identical uploads end up in the same file, which is shared by all posts referencing it.
+    Once the post referencing the file is committed (or failed), the caller passes the result to finish_upload.
+
+    :param upload: UploadFile: The uploaded file
+    :return: Path, size and hash of the stored file
+    """
+    incoming_dir = os.path.join(MEDIA_ROOT, INCOMING_DIR)
+    await run_in_threadpool(os.makedirs, incoming_dir, exist_ok=True)
+    incoming_path = os.path.join(incoming_dir, f'{uuid.uuid4()}.part')
+    saved = await save_upload(upload, incoming_path)
+    path = blob_path(saved.sha256, pathlib.Path(upload.filename or '').suffix)
+    await run_in_threadpool(_publish, incoming_path, path)
+    return StoredUpload(path, saved.size, saved.sha256, incoming_path)
+
+
+def _finish(stored: StoredUpload) -> None:
+    if not os.path.exists(stored.path):
+        _publish(stored.incoming_path, stored.path)
+    remove_file(stored.incoming_path)
+
+
+async def finish_upload(stored: StoredUpload) -> None:
+    """
+    The finish_upload function is called once the post referencing an upload is committed. A remove_post of
+    another post with the same content may have deleted the shared file between store_upload and that commit
+    (it didn't count the new post yet): the file is then published again from the incoming copy, which is dropped.
+
+    :param stored: StoredUpload: Result of store_upload
+    :return: None
+    """
+    await run_in_threadpool(_finish, stored)
+
+
+def _trash(path: str, trash_path: str) -> bool:
+    try:
+        os.replace(path, trash_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+async def trash_file(path: str) -> str | None:
+    """
+    The trash_file function moves a file of the media store aside, before it is deleted for good with delete_file
+    or put back with restore_file. Paths outside of the media root are ignored.
+
+    :param path: str: Path of the file
+    :return: The path of the moved file, or None if the file doesn't exist or is outside of the media root
+    """
+    if not in_media_root(path):
+        return None
+    incoming_dir = os.path.join(MEDIA_ROOT, INCOMING_DIR)
+    await run_in_threadpool(os.makedirs, incoming_dir, exist_ok=True)
+    trash_path = os.path.join(incoming_dir, f'{uuid.uuid4()}.trash')
+    return trash_path if await run_in_threadpool(_trash, path, trash_path) else None
+
+
+async def restore_file(trash_path: str, path: str) -> None:
+    await run_in_threadpool(os.replace, trash_path, path)
+
+
+async def delete_file(path: str) -> None:
+    """
+    The delete_file function deletes a file of the media store. Paths outside of the media root are ignored.
+
+    :param path: str: Path of the file (the photo_url of a post)
+    :return: None
+    """
+    if in_media_root(path):
+        await run_in_threadpool(remove_file, path)
+
+
+def blob_hash(path: str) -> str:
+    return pathlib.PurePosixPath(path).name[:64]
+
+
+def iter_files() -> Iterator[str]:
+    """
+    The iter_files function lists the paths of all files in the media store.
+
+    :return: An iterator of paths
+    """
+    for directory, _, files in os.walk(MEDIA_ROOT):
+        for name in files:
+            yield pathlib.Path(directory, name).as_posix()
+
+
+def iter_blobs() -> Iterator[str]:
+    """
+    The iter_blobs function lists the paths of all content-addressed files in the media store.
+
+    :return: An iterator of paths
+    """
+    return (path for path in iter_files() if is_blob_path(path))
@@ -19,3 +19,11 @@ WELCOME_MESSAGE = "Welcome to FastAPI!"
 TO_MANY_REQUESTS = 'No more than 10 requests per minute'
 PERMISSION_ERROR = "Permission Error (You are not authorized to perform this operation)"
 FORBIDDEN_ACCESS = "Operation not permitted"
+INVALID_CURSOR = 'Invalid pagination cursor'
+FILE_TOO_LARGE = 'File is too large'
+SERVER_BUSY = 'Server is busy, try again later'
+UNSUPPORTED_TRANSFORMATION = 'Transformation is not supported'
+INVALID_IMAGE = 'Image can not be transformed'
+TOKEN_REVOKED = 'Token has been revoked'
+USER_NOT_ACTIVE = 'User is banned'
+TOO_MANY_REQUESTS = 'Too many requests, try again later'
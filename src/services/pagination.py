@@ -0,0 +1,150 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import BigInteger, desc, tuple_
+from sqlalchemy.sql.selectable import Select
+
+from src.services.messages_templates import INVALID_CURSOR
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+NUMBER_TYPES = (int, float, Decimal)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} can not be a cursor value')
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and set(value) == {'dt'}:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def _key_value(value: Any, key) -> Any:
+    # cursors come from the client: a value is bound to its sort key column only if it has the type of the column,
+    # otherwise the database would reject the query
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        # computed ranks
+        python_type = float
+    if value is None:
+        return value
+    if python_type is datetime:
+        # naive and aware datetimes don't compare
+        if not isinstance(value, datetime) or (value.tzinfo is not None) != bool(getattr(key.type, 'timezone', False)):
+            raise ValueError(f'{value!r} is not a value of {key}')
+        return value
+    if python_type not in NUMBER_TYPES:
+        if not isinstance(value, python_type):
+            raise ValueError(f'{value!r} is not a value of {key}')
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{value!r} is not a number')
+    if python_type is int:
+        limit = 2 ** 63 if isinstance(key.type, BigInteger) else 2 ** 31
+        if not float(value).is_integer() or not -limit <= value < limit:
+            raise ValueError(f'{value!r} is not a value of {key}')
+        return int(value)
+    return Decimal(str(value)) if python_type is Decimal else float(value)
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    The encode_cursor function packs the sort key of the last row of a page into an opaque url-safe string.
+
+    :param values: Sequence: Values of the sort key columns
+    :return: The cursor
+    """
+    data = json.dumps(list(values), default=_encode_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> List:
+    """
+    The decode_cursor function unpacks a cursor made by encode_cursor. A cursor that isn't one, or whose values
+    don't match the types of the sort key columns, is rejected with 400.
+
+    :param cursor: str: The cursor from the client
+    :param keys: Sequence: Columns of the sort key
+    :return: Values of the sort key columns
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('wrong number of values')
+        values = [_key_value(_decode_value(value), key) for value, key in zip(values, keys)]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+    return values
+
+
+def paginate(sql: Select, keys: Sequence, skip: int, limit: int, cursor: str | None = None,
+             descending: bool = False) -> Select:
+    """
+    The paginate function orders a select by the sort key and cuts one page out of it.
+    Without a cursor the page starts after skip rows (offset pagination). With a cursor the page starts right
+    after the row the cursor was made from (keyset pagination), so deep pages cost the same as the first one.
+    The last key must be unique (usually the primary key), so the order is total.
+
+    :param sql: Select: Query of the listing
+    :param keys: Sequence: Columns of the sort key
+    :param skip: int: Number of rows to skip, ignored if a cursor is given
+    :param limit: int: Maximal number of rows in the page
+    :param cursor: str: Cursor made by next_cursor from the previous page
+    :param descending: bool: Sort in descending order
+    :return: The select of the page
+    """
+    sql = sql.order_by(*(desc(key) if descending else key for key in keys))
+    if cursor is None:
+        return sql.offset(skip).limit(limit)
+    values = decode_cursor(cursor, keys)
+    row = tuple_(*keys)
+    condition = row < tuple(values) if descending else row > tuple(values)
+    return sql.filter(condition).limit(limit)
+
+
+def _key_name(key) -> str:
+    return key if isinstance(key, str) else key.key
+
+
+def next_cursor(items: Sequence, keys: Sequence, limit: int) -> str | None:
+    """
+    The next_cursor function builds the cursor of the page following the given one from the sort key of its last row.
+    A page shorter than the limit is the last one, so there is no next cursor.
+
+    :param items: Sequence: Rows, ORM objects or dicts of the page
+    :param keys: Sequence: Columns (or their names) of the sort key passed to paginate
+    :param limit: int: The limit passed to paginate
+    :return: The cursor or None
+    """
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, dict):
+        return encode_cursor([last[_key_name(key)] for key in keys])
+    return encode_cursor([getattr(last, _key_name(key)) for key in keys])
+
+
+def set_next_cursor(response: Response, items: Sequence, keys: Sequence, limit: int) -> None:
+    """
+    The set_next_cursor function passes the cursor of the next page to the client in the X-Next-Cursor header.
+
+    :param response: Response: Response of the route
+    :param items: Sequence: The page returned by the repository
+    :param keys: Sequence: Columns (or their names) of the sort key of the listing
+    :param limit: int: Maximal number of rows in the page
+    :return: None
+    """
+    cursor = next_cursor(items, keys, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.services.messages_templates import SERVER_BUSY
+
+T = TypeVar('T')
+
+
+class PasswordPool:
+    """
+    Bounded thread pool for password hashing and verification. bcrypt takes 100-300 ms of CPU per call and releases
+    the GIL, so running it in threads keeps the event loop free for the other requests.
+    At most workers calls run at once and at most max_queue more wait for a thread; beyond that the request is
+    rejected with 503, so a login storm degrades into quick refusals instead of an ever-growing queue.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor: ThreadPoolExecutor | None = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+        return self.executor
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _run(self, func: Callable[..., T], submitted: float, *args) -> T:
+        started = time.perf_counter()
+        with self.lock:
+            self.running += 1
+            self.wait_time += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.run_time += time.perf_counter() - started
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """
+        The run function calls func in the pool and waits for its result.
+
+        :param func: Callable: Hashing or verification function
+        :param args: Arguments of the function
+        :return: The result of the function
+        """
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=SERVER_BUSY,
+                                headers={'Retry-After': '1'})
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), self._run, func, time.perf_counter(), *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {'pending': self.pending, 'running': self.running, 'queued': self.pending - self.running,
+                'max_pending': self.max_pending, 'completed': self.completed, 'rejected': self.rejected,
+                'avg_wait': self.wait_time / self.completed if self.completed else 0.0,
+                'avg_run': self.run_time / self.completed if self.completed else 0.0}
+
+
+password_pool = PasswordPool(settings.password_workers, settings.password_queue_limit)
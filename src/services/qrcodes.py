@@ -0,0 +1,79 @@
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+import qrcode
+import qrcode.image.svg
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services import media_storage
+
+QRCODES_DIR = 'qrcodes'
+MEDIA_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+class QrCode(NamedTuple):
+    content: bytes
+    media_type: str
+    etag: str
+
+
+_cache: OrderedDict[Tuple[str, str], QrCode] = OrderedDict()
+
+
+def render_qrcode(data: str, image_format: str) -> bytes:
+    """
+    The render_qrcode function renders the QR code of a string as a PNG or SVG image.
+
+    :param data: str: The encoded string, e.g. the url of an image
+    :param image_format: str: 'png' or 'svg'
+    :return: The image
+    """
+    if image_format == 'svg':
+        return qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).to_string()
+    buf = io.BytesIO()
+    qrcode.make(data).save(buf)
+    return buf.getvalue()
+
+
+def qrcode_path(digest: str, image_format: str) -> str:
+    return f'{media_storage.MEDIA_ROOT}/{QRCODES_DIR}/{digest[:2]}/{digest}.{image_format}'
+
+
+def _load(data: str, image_format: str, path: str) -> bytes:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    content = render_qrcode(data, image_format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with media_storage.replacing(path) as tmp_path, open(tmp_path, 'wb') as f:
+        f.write(content)
+    return content
+
+
+async def get_qrcode(data: str, image_format: str = 'png') -> QrCode:
+    """
+    The get_qrcode function returns the QR code of a string. Every QR code is rendered once: it is kept in the media
+    store and the most recently used ones (qrcode_cache_items) also in memory. The ETag is derived from the string
+    and the format, as the image only depends on them.
+
+    :param data: str: The encoded string, e.g. the url of an image
+    :param image_format: str: 'png' or 'svg'
+    :return: Content, media type and ETag of the image
+    """
+    key = (data, image_format)
+    qr_code = _cache.get(key)
+    if qr_code is None:
+        digest = hashlib.sha256(f'{image_format}:{data}'.encode()).hexdigest()
+        content = await run_in_threadpool(_load, data, image_format, qrcode_path(digest, image_format))
+        qr_code = QrCode(content, MEDIA_TYPES[image_format], f'"{digest[:32]}"')
+        _cache[key] = qr_code
+        while len(_cache) > settings.qrcode_cache_items:
+            _cache.popitem(last=False)
+    _cache.move_to_end(key)
+    return qr_code
@@ -0,0 +1,223 @@
+import math
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Tuple
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.messages_templates import TOO_MANY_REQUESTS
+
+# window index, requests in the previous window, requests in the current window
+Counter = Tuple[int, int, int]
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """
+    The parse_rate function parses a rate setting like '10/60': at most 10 requests every 60 seconds.
+
+    :param rate: str: times/seconds
+    :return: times and seconds
+    """
+    times, seconds = rate.split('/')
+    return int(times), float(seconds)
+
+
+def slide(counter: Counter | None, now: float, times: int, seconds: float) -> Tuple[bool, float, Counter]:
+    """
+    The slide function counts a request in a sliding window counter. The requests of the last seconds are estimated
+    from two fixed windows, the requests of the previous one weighted by the part of it still inside the sliding
+    window, so a counter takes three integers whatever the rate. Counters of idle keys expire lazily: two windows
+    later they count nothing.
+
+    :param counter: Counter: The counter of the key, None for a new key
+    :param now: float: Current time
+    :param times: int: Maximal number of requests in the sliding window
+    :param seconds: float: Length of the window
+    :return: Whether the request is allowed, seconds to wait if not, and the updated counter
+    """
+    window = int(now // seconds)
+    previous = current = 0
+    if counter is not None:
+        if counter[0] == window:
+            previous, current = counter[1], counter[2]
+        elif counter[0] == window - 1:
+            previous = counter[2]
+    elapsed = now / seconds - window
+    if previous * (1 - elapsed) + current >= times:
+        if current >= times:
+            # the current window becomes the previous one, whose weight then has to fall below times / current
+            retry_after = (1 - elapsed + 1 - times / current) * seconds
+        else:
+            retry_after = (1 - (times - current) / previous - elapsed) * seconds
+        return False, retry_after, (window, previous, current)
+    return True, 0.0, (window, previous, current + 1)
+
+
+class MemoryRateLimitBackend:
+    """
+    Counters kept in the memory of the worker process. At most max_keys of them are kept, the least recently used
+    ones are dropped first, which only forgets the requests of idle clients.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.counters: OrderedDict[str, Counter] = OrderedDict()
+
+    async def hit(self, key: str, times: int, seconds: float) -> Tuple[bool, float]:
+        allowed, retry_after, counter = slide(self.counters.get(key), time.time(), times, seconds)
+        self.counters[key] = counter
+        self.counters.move_to_end(key)
+        while len(self.counters) > self.max_keys:
+            self.counters.popitem(last=False)
+        return allowed, retry_after
+
+    def clear(self) -> None:
+        self.counters.clear()
+
+
+class SqliteRateLimitBackend:
+    """
+    Counters kept in a local SQLite file shared by the worker processes of the application, so the limits hold
+    for the whole host and not per process. Expired counters are deleted every purge_every requests.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, purge_every: int = 1000):
+        self.path = path
+        self.purge_every = purge_every
+        self.hits = 0
+        self.created = False
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self.created:
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, window INTEGER NOT NULL, '
+                               'previous INTEGER NOT NULL, current INTEGER NOT NULL, expires_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)')
+            self.created = True
+        return connection
+
+    def _hit(self, key: str, times: int, seconds: float) -> Tuple[bool, float]:
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT window, previous, current FROM rate_limits WHERE key = ?',
+                                     (key,)).fetchone()
+            allowed, retry_after, counter = slide(row, now, times, seconds)
+            connection.execute('INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)',
+                               (key, *counter, (counter[0] + 2) * seconds))
+            self.hits += 1
+            if self.hits % self.purge_every == 0:
+                connection.execute('DELETE FROM rate_limits WHERE expires_at < ?', (now,))
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+        return allowed, retry_after
+
+    async def hit(self, key: str, times: int, seconds: float) -> Tuple[bool, float]:
+        return await run_in_threadpool(self._hit, key, times, seconds)
+
+    def clear(self) -> None:
+        connection = self.connect()
+        try:
+            connection.execute('DELETE FROM rate_limits')
+        finally:
+            connection.close()
+
+
+RATE_LIMIT_BACKENDS = {'memory': MemoryRateLimitBackend, 'sqlite': SqliteRateLimitBackend}
+
+
+def get_rate_limit_backend(name: str) -> MemoryRateLimitBackend | SqliteRateLimitBackend:
+    """
+    The get_rate_limit_backend function creates the rate limit backend selected by the rate_limit_backend setting.
+
+    :param name: str: 'memory' or 'sqlite'
+    :return: The rate limit backend
+    """
+    if name == 'memory':
+        return MemoryRateLimitBackend(settings.rate_limit_max_keys)
+    if name == 'sqlite':
+        return SqliteRateLimitBackend(settings.rate_limit_path)
+    raise ValueError(f'Unknown rate limit backend: {name}')
+
+
+rate_limit_backend = get_rate_limit_backend(settings.rate_limit_backend)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The client_ip function identifies the client of a request by its IP. Behind a reverse proxy (e.g. the Heroku
+    router) the peer of every request is the proxy: when the peer is a trusted proxy (the forwarded_allow_ips
+    setting), the client is the last address of X-Forwarded-For that isn't a trusted proxy itself. Proxies append
+    the address they got the request from, the addresses before them are sent by the client and can't be trusted.
+
+    :param request: Request: The request
+    :return: IP of the client
+    """
+    host = request.client.host if request.client else 'unknown'
+    trusted = {address.strip() for address in settings.forwarded_allow_ips.split(',')}
+    if '*' not in trusted and host not in trusted:
+        return host
+    forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')]
+    forwarded = [address for address in forwarded if address]
+    while len(forwarded) > 1 and '*' not in trusted and forwarded[-1] in trusted:
+        forwarded.pop()
+    return forwarded[-1] if forwarded else host
+
+
+async def token_subject(request: Request) -> str | None:
+    """
+    The token_subject function identifies the user of a request by the subject of its access token, without any
+    query. Requests without a valid token are only limited by IP; the route rejects them anyway.
+
+    :param request: Request: The request
+    :return: Email of the user or None
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM]).get('sub')
+    except JWTError:
+        return None
+
+
+async def form_username(request: Request) -> str | None:
+    # the login form is already parsed by FastAPI, request.form() returns it
+    username = (await request.form()).get('username')
+    return username.lower() if isinstance(username, str) else None
+
+
+class RateLimit:
+    """
+    Dependency limiting a route to times requests every seconds for every client IP and for every user
+    (identified by identify), with a sliding window. Rejected requests get 429 with a Retry-After header.
+    """
+
+    def __init__(self, name: str, rate: str,
+                 identify: Callable[[Request], Awaitable[str | None]] | None = token_subject):
+        self.name = name
+        self.times, self.seconds = parse_rate(rate)
+        self.identify = identify
+
+    async def __call__(self, request: Request):
+        keys = [f'{self.name}:ip:{client_ip(request)}']
+        if self.identify is not None:
+            user = await self.identify(request)
+            if user is not None:
+                keys.append(f'{self.name}:user:{user}')
+        for key in keys:
+            allowed, retry_after = await rate_limit_backend.hit(key, self.times, self.seconds)
+            if not allowed:
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=TOO_MANY_REQUESTS,
+                                    headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from PIL import Image, ImageOps
+
+from src.conf.config import settings
+from src.services import media_storage
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = (128, 512, 1024)
+RENDITION_FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+                     'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})}
+
+# media/ab/cd/<hash>_512.webp, relative to the media root
+RENDITION_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})_\d+\.\w+$')
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def rendition_path(photo_url: str, size: int, ext: str) -> str:
+    """
+    The rendition_path function returns the path of a rendition, stored beside the original:
+    media/ab/cd/<hash>.jpg -> media/ab/cd/<hash>_512.webp
+
+    :param photo_url: str: Path of the original
+    :param size: int: Maximal width and height of the rendition
+    :param ext: str: Format of the rendition ('webp' or 'jpg')
+    :return: Path of the rendition
+    """
+    return f'{os.path.splitext(photo_url)[0]}_{size}.{ext}'
+
+
+def rendition_source(path: str) -> str | None:
+    """
+    The rendition_source function tells whether a file of the media store is a rendition of a content-addressed
+    original (see media_storage.blob_path) and of which one.
+
+    :param path: str: Path of the file
+    :return: The hash of the original, or None if the file is not a rendition
+    """
+    prefix = f'{media_storage.MEDIA_ROOT}/'
+    match = RENDITION_PATTERN.match(path[len(prefix):]) if path.startswith(prefix) else None
+    return match.group(1) if match else None
+
+
+def rendition_urls(photo_url: str) -> List[dict]:
+    """
+    The rendition_urls function lists all renditions of an original as dicts with size, format and url.
+
+    :param photo_url: str: Path of the original
+    :return: A list of renditions
+    """
+    return [{'size': size, 'format': ext, 'url': rendition_path(photo_url, size, ext)}
+            for size in RENDITION_SIZES for ext in RENDITION_FORMATS]
+
+
+def render_renditions(photo_url: str) -> List[str]:
+    """
+    The render_renditions function renders all renditions of an original: the image is scaled down (never up)
+    to fit each size and saved in each format. It runs in a worker process of the rendition pool.
+    Every file is written under a temporary name and renamed, so a half-written rendition is never served.
+
+    :param photo_url: str: Path of the original
+    :return: Paths of the renditions
+    """
+    paths = []
+    with Image.open(photo_url) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    for size in RENDITION_SIZES:
+        scaled = image.copy()
+        scaled.thumbnail((size, size), Image.LANCZOS)
+        for ext, (image_format, options) in RENDITION_FORMATS.items():
+            path = rendition_path(photo_url, size, ext)
+            frame = scaled if image_format == 'WEBP' or scaled.mode == 'RGB' else scaled.convert('RGB')
+            with media_storage.replacing(path) as tmp_path:
+                frame.save(tmp_path, image_format, **options)
+            paths.append(path)
+    return paths
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.rendition_workers)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_renditions(photo_url: str) -> bool:
+    """
+    The generate_renditions function renders the renditions of an original in the rendition process pool,
+    so neither the event loop nor the request that uploaded the original waits for Pillow.
+
+    :param photo_url: str: Path of the original
+    :return: True if the renditions were rendered, False if the original can't be read as an image
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_pool(), render_renditions, photo_url)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning('Renditions of %s were not rendered: %s', photo_url, e)
+        return False
+    return True
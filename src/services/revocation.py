@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.database.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# revoking a user covers the tokens issued until then, the longest lived of them are the refresh tokens
+USER_REVOCATION_LIFETIME = timedelta(days=7)
+# rows committed by other processes while the previous sync ran are picked up by the next one
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def user_key(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def whole_seconds(value: datetime) -> datetime:
+    # the iat claim of the tokens has whole seconds
+    return value.replace(microsecond=0)
+
+
+class BloomFilter:
+    """
+    Bloom filter of strings. Membership tests have no false negatives and false positives at about error_rate
+    while it holds at most capacity items; at 0.1% it takes less than 2 bytes per item.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # double hashing: the k positions are derived from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked tokens, kept in the revoked_tokens table and mirrored in memory so checking a token costs no query.
+    An entry is either the jti of one token or user:<id>, which revokes every token of the user issued until then.
+
+    The Bloom filter answers the common case (not revoked) without looking at the entries, its rare positives are
+    confirmed against the exact entries. Every process syncs the rows revoked by the others every sync_interval
+    seconds and drops the expired ones (from the table too) every compact_interval seconds.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, session_factory: async_sessionmaker = SessionLocal,
+                 sync_interval: float = 5, compact_interval: float = 3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self.compact_interval = compact_interval
+        self.bloom = BloomFilter(capacity, error_rate)
+        # key -> (revoked_at, expires_at) as UTC timestamps
+        self.entries: Dict[str, Tuple[float, float]] = {}
+        self.synced_at: datetime | None = None
+        self.compacted_at = time.monotonic()
+        self.task: asyncio.Task | None = None
+
+    def add(self, revoked: RevokedToken) -> None:
+        if revoked.jti not in self.entries:
+            self.bloom.add(revoked.jti)
+        self.entries[revoked.jti] = (timestamp(whole_seconds(revoked.revoked_at)), timestamp(revoked.expires_at))
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+        The is_revoked function tells whether a decoded token is revoked, by its jti or by its user.
+
+        :param payload: dict: Claims of the token
+        :return: True if the token is revoked
+        """
+        jti = payload.get('jti')
+        if jti is not None and jti in self.bloom and jti in self.entries:
+            return True
+        user_id = payload.get('uid')
+        if user_id is None:
+            return False
+        key = user_key(user_id)
+        if key not in self.bloom:
+            return False
+        entry = self.entries.get(key)
+        # a token issued in the second of the revocation was issued after it, e.g. at the login following an unban
+        return entry is not None and payload.get('iat', 0) < entry[0]
+
+    async def revoke(self, jti: str, expires_at: datetime, db: AsyncSession, user_id: int | None = None) -> None:
+        """
+        The revoke function revokes one token until it expires.
+
+        :param jti: str: Id of the token
+        :param expires_at: datetime: Expiration of the token (UTC)
+        :param db: AsyncSession: Database session
+        :param user_id: int: Owner of the token
+        """
+        revoked = RevokedToken(jti=jti, user_id=user_id, revoked_at=datetime.utcnow(), expires_at=expires_at)
+        await db.merge(revoked)
+        await db.commit()
+        self.add(revoked)
+
+    async def revoke_user(self, user_id: int, db: AsyncSession) -> RevokedToken:
+        """
+        The revoke_user function adds the revocation of every token of a user issued until now to the session,
+        so it is committed with the change that caused it (e.g. a ban). Once committed, the caller passes it to add.
+
+        :param user_id: int: Id of the user
+        :param db: AsyncSession: Database session
+        :return: The revocation
+        """
+        now = whole_seconds(datetime.utcnow())
+        revoked = RevokedToken(jti=user_key(user_id), user_id=user_id, revoked_at=now,
+                               expires_at=now + USER_REVOCATION_LIFETIME)
+        await db.merge(revoked)
+        return revoked
+
+    async def sync(self, db: AsyncSession) -> int:
+        """
+        The sync function loads the unexpired revocations made since the previous sync, by any process.
+        The first sync loads all of them.
+
+        :param db: AsyncSession: Database session
+        :return: Number of loaded revocations
+        """
+        now = datetime.utcnow()
+        query = select(RevokedToken).filter(RevokedToken.expires_at > now)
+        if self.synced_at is not None:
+            query = query.filter(RevokedToken.revoked_at >= self.synced_at - SYNC_OVERLAP)
+        rows = (await db.scalars(query)).all()
+        for revoked in rows:
+            self.add(revoked)
+        self.synced_at = now
+        return len(rows)
+
+    async def compact(self, db: AsyncSession) -> int:
+        """
+        The compact function deletes the expired revocations, from the table and from memory,
+        and rebuilds the Bloom filter from the remaining ones.
+
+        :param db: AsyncSession: Database session
+        :return: Number of revocations dropped from memory
+        """
+        await db.execute(delete(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()))
+        await db.commit()
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]
+        for key in expired:
+            del self.entries[key]
+        self.bloom = BloomFilter(max(self.capacity, 2 * len(self.entries)), self.error_rate)
+        for key in self.entries:
+            self.bloom.add(key)
+        self.compacted_at = time.monotonic()
+        return len(expired)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.synced_at = None
+
+    async def startup(self) -> None:
+        async with self.session_factory() as db:
+            await self.sync(db)
+        self.task = asyncio.create_task(self.run())
+
+    async def shutdown(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                async with self.session_factory() as db:
+                    await self.sync(db)
+                    if time.monotonic() - self.compacted_at >= self.compact_interval:
+                        await self.compact(db)
+            except Exception:
+                logger.exception('Revocation list sync failed')
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self.entries), 'bloom_bytes': len(self.bloom.bits), 'bloom_hashes': self.bloom.hashes}
+
+
+revocation_list = RevocationList(settings.revocation_capacity, settings.revocation_error_rate,
+                                 sync_interval=settings.revocation_sync_interval,
+                                 compact_interval=settings.revocation_compact_interval)
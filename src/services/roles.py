@@ -1,7 +1,7 @@
 from typing import List
 from fastapi import Depends, HTTPException
 
-from src.database.models import User, UserRole
+from src.database.models import UserRole
 from src.services.auth import auth_service
 from src.services.messages_templates import FORBIDDEN_ACCESS
 
@@ -10,8 +10,7 @@ class RoleChecker:
     def __init__(self, allowed_roles: List[UserRole]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: User = Depends(auth_service.get_current_user)):
-        print(user.user_role)
-        print(self.allowed_roles)
-        if user.user_role not in self.allowed_roles:
+    # authorization only reads the claims of the access token, see auth_service.get_token_claims
+    def __call__(self, claims: dict = Depends(auth_service.get_token_claims)):
+        if not claims['active'] or claims['role'] not in self.allowed_roles:
             raise HTTPException(status_code=403, detail=FORBIDDEN_ACCESS)
@@ -0,0 +1,95 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+# results of prefixes shorter than this are cached, their ranges of the sorted array are the largest ones
+CACHED_PREFIX_LENGTH = 3
+MAX_SUGGESTIONS = 50
+PREFIX_END = '\U0010ffff'
+
+
+class TagIndex:
+    """
+    In-memory index of the tag names for prefix suggestions: a sorted array of (lowercase name, name) pairs,
+    so the tags starting with a prefix are one contiguous range found by binary search, and the usage count
+    (number of posts) of every tag, which ranks the suggestions. The top MAX_SUGGESTIONS of the short prefixes
+    are cached, a tag change only drops the cached prefixes of its own name.
+    """
+
+    def __init__(self):
+        self.names: List[Tuple[str, str]] = []
+        self.counts: Dict[str, int] = {}
+        self.cache: Dict[str, List[Tuple[str, int]]] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _invalidate(self, key: str) -> None:
+        for length in range(min(len(key), CACHED_PREFIX_LENGTH - 1) + 1):
+            self.cache.pop(key[:length], None)
+
+    def add(self, name: str, count: int = 0) -> None:
+        """
+        The add function adds a tag to the index. Adding a known tag changes nothing.
+
+        :param name: str: Name of the tag
+        :param count: int: Number of posts with the tag
+        :return: None
+        """
+        if name in self.counts:
+            return
+        self.counts[name] = count
+        insort(self.names, (name.lower(), name))
+        self._invalidate(name.lower())
+
+    def update(self, name: str, delta: int) -> None:
+        """
+        The update function changes the usage count of a tag, adding the tag if it's unknown.
+
+        :param name: str: Name of the tag
+        :param delta: int: Number of posts that got (or lost, if negative) the tag
+        :return: None
+        """
+        if name not in self.counts:
+            self.add(name, max(delta, 0))
+            return
+        self.counts[name] = max(self.counts[name] + delta, 0)
+        self._invalidate(name.lower())
+
+    def load(self, counts: Iterable[Tuple[str, int]]) -> None:
+        self.counts = dict(counts)
+        self.names = sorted((name.lower(), name) for name in self.counts)
+        self.cache.clear()
+
+    def clear(self) -> None:
+        self.names.clear()
+        self.counts.clear()
+        self.cache.clear()
+
+    def _top(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        start = bisect_left(self.names, (prefix,))
+        end = bisect_left(self.names, (prefix + PREFIX_END,), start)
+        top = heapq.nsmallest(limit, (name for _, name in self.names[start:end]),
+                              key=lambda name: (-self.counts[name], name.lower()))
+        return [(name, self.counts[name]) for name in top]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        The suggest function returns the most used tags starting with the prefix (case-insensitive),
+        the most used first, ties by name.
+
+        :param prefix: str: Start of the tag name
+        :param limit: int: Maximal number of tags, at most MAX_SUGGESTIONS
+        :return: A list of (name, usage count)
+        """
+        prefix = prefix.lower()
+        limit = min(limit, MAX_SUGGESTIONS)
+        if len(prefix) >= CACHED_PREFIX_LENGTH:
+            return self._top(prefix, limit)
+        top = self.cache.get(prefix)
+        if top is None:
+            top = self.cache[prefix] = self._top(prefix, MAX_SUGGESTIONS)
+        return top[:limit]
+
+
+tag_index = TagIndex()
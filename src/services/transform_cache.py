@@ -0,0 +1,116 @@
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+
+class TransformCache:
+    """
+    Two-tier cache of rendered transformations, keyed by the engine, the image (its content-addressed path)
+    and the transformation signature:
+        - the memory tier maps keys to urls of the last memory_items transformations of this process;
+        - the disk tier keeps the files rendered by the local engine under root, with a total size of at most
+          max_bytes. The least recently used files are deleted first; their modification time records the last use,
+          so the order survives restarts and is shared by the worker processes.
+    The functions touch the filesystem, so they are called in the thread pool; the lock guards both tiers.
+    """
+
+    def __init__(self, root: str, max_bytes: int, memory_items: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory: OrderedDict[Tuple, str] = OrderedDict()
+        self.files: OrderedDict[str, int] | None = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def get(self, key: Tuple) -> str | None:
+        """
+        The get function looks a transformation up in the memory tier.
+
+        :param key: Tuple: Engine, image and signature of the transformation
+        :return: Url of the transformation or None
+        """
+        with self.lock:
+            url = self.memory.get(key)
+            if url is None or (url.startswith(f'{self.root}/') and not os.path.exists(url)):
+                # the file was evicted by another worker process
+                self.memory.pop(key, None)
+                self.misses += 1
+                return None
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return url
+
+    def put(self, key: Tuple, url: str) -> None:
+        with self.lock:
+            self.memory[key] = url
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def files_index(self) -> OrderedDict[str, int]:
+        with self.lock:
+            if self.files is None:
+                self.files = self._scan()
+                self.size = sum(self.files.values())
+            return self.files
+
+    def _scan(self) -> OrderedDict[str, int]:
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = pathlib.Path(directory, name)
+                if path.suffix != '.tmp':
+                    stat = path.stat()
+                    found.append((stat.st_mtime, path.as_posix(), stat.st_size))
+        return OrderedDict((path, size) for _, path, size in sorted(found))
+
+    def use_file(self, path: str) -> bool:
+        """
+        The use_file function looks a rendered file up in the disk tier and marks it as recently used.
+
+        :param path: str: Path of the file
+        :return: True if the file exists
+        """
+        with self.lock:
+            files = self.files_index()
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                if path in files:
+                    self.size -= files.pop(path)
+                return False
+            if path not in files:
+                # rendered by another worker process
+                files[path] = os.path.getsize(path)
+                self.size += files[path]
+            files.move_to_end(path)
+            return True
+
+    def add_file(self, path: str) -> None:
+        """
+        The add_file function adds a newly rendered file to the disk tier and deletes the least recently used files
+        while the tier is larger than max_bytes. The new file itself is kept even if it is larger.
+
+        :param path: str: Path of the file
+        :return: None
+        """
+        with self.lock:
+            files = self.files_index()
+            self.size -= files.pop(path, 0)
+            files[path] = os.path.getsize(path)
+            self.size += files[path]
+            while self.size > self.max_bytes and len(files) > 1:
+                evicted, size = files.popitem(last=False)
+                self.size -= size
+                pathlib.Path(evicted).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            self.files = None
+            self.size = 0
@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services import media_storage
+from src.services.cloudynary import get_transformed_url
+from src.services.transform_cache import TransformCache
+from src.services.transform_posts import transformation_signature
+
+TRANSFORMS_DIR = 'transforms'
+# saved transformations (see save_transformation) are kept out of the transform cache, which evicts its files
+SAVED_TRANSFORMS_DIR = 'saved_transforms'
+SAVE_FORMATS = {'.jpg': ('JPEG', {'quality': 90}), '.jpeg': ('JPEG', {'quality': 90}), '.png': ('PNG', {}),
+                '.webp': ('WEBP', {'quality': 90}), '.gif': ('GIF', {})}
+# the point of the image kept by crop, fill and pad, as fractions of the free space (x, y);
+# the smart gravities (auto, face) need content detection and fall back to the center
+GRAVITY = {'center': (0.5, 0.5), 'north': (0.5, 0), 'south': (0.5, 1), 'west': (0, 0.5), 'east': (1, 0.5),
+           'north_west': (0, 0), 'north_east': (1, 0), 'south_west': (0, 1), 'south_east': (1, 1)}
+DEFAULT_BACKGROUND = 'white'
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class UnsupportedTransformation(ValueError):
+    pass
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def transform_path(image_url: str, transform_list: List[dict]) -> str:
+    """
+    The transform_path function returns the path a local transformation of an image is stored at.
+    It is derived from the image and the signature of the transformations, so equal requests yield the same file.
+
+    :param image_url: str: Path of the original
+    :param transform_list: List[dict]: Transformations made by create_list_transformation
+    :return: Path of the transformed image
+    """
+    key = json.dumps([image_url, transformation_signature(transform_list)], separators=(',', ':'))
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    suffix = pathlib.Path(image_url).suffix.lower()
+    if suffix not in SAVE_FORMATS:
+        suffix = '.png'
+    return f'{media_storage.MEDIA_ROOT}/{TRANSFORMS_DIR}/{digest[:2]}/{digest}{suffix}'
+
+
+def _size(value: int | float | None, full: int) -> int | None:
+    # Cloudinary reads values up to 1.0 as a fraction of the original size
+    if value is None:
+        return None
+    if isinstance(value, float) and value <= 1:
+        return max(1, round(full * value))
+    return max(1, int(value))
+
+
+def _color(value: str | None) -> Tuple[int, ...]:
+    if not value:
+        value = DEFAULT_BACKGROUND
+    elif value.startswith('rgb:'):
+        value = f'#{value[4:]}'
+    try:
+        return ImageColor.getrgb(value)
+    except ValueError:
+        raise UnsupportedTransformation(f'background:{value}')
+
+
+def _place(free_x: int, free_y: int, gravity: str | None) -> Tuple[int, int]:
+    fx, fy = GRAVITY.get(gravity or 'center', GRAVITY['center'])
+    return round(free_x * fx), round(free_y * fy)
+
+
+def _resize(image: Image.Image, params: dict) -> Image.Image:
+    width, height = _size(params.get('width'), image.width), _size(params.get('height'), image.height)
+    if width is None and height is None:
+        return image
+    if width is None:
+        width = max(1, round(image.width * height / image.height))
+    elif height is None:
+        height = max(1, round(image.height * width / image.width))
+    crop, gravity = params.get('crop') or 'scale', params.get('gravity')
+    if crop == 'scale':
+        return image.resize((width, height), Image.LANCZOS)
+    if crop == 'crop':
+        width, height = min(width, image.width), min(height, image.height)
+        x, y = _place(image.width - width, image.height - height, gravity)
+        return image.crop((x, y, x + width, y + height))
+    if crop in ('fill', 'thumb'):
+        return ImageOps.fit(image, (width, height), Image.LANCZOS, centering=GRAVITY.get(gravity, GRAVITY['center']))
+    scale = min(width / image.width, height / image.height)
+    fitted = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    if crop == 'fit':
+        return fitted
+    if crop in ('pad', 'fill_pad'):
+        canvas = Image.new(fitted.mode, (width, height), _color(params.get('background')))
+        canvas.paste(fitted, _place(width - fitted.width, height - fitted.height, gravity))
+        return canvas
+    raise UnsupportedTransformation(f'crop:{crop}')
+
+
+def _rotate(image: Image.Image, angle: int) -> Image.Image:
+    # Cloudinary rotates clockwise, Pillow counterclockwise
+    angle %= 360
+    if angle % 90 == 0:
+        transposes = {90: Image.Transpose.ROTATE_270, 180: Image.Transpose.ROTATE_180,
+                      270: Image.Transpose.ROTATE_90}
+        return image.transpose(transposes[angle]) if angle else image
+    return image.convert('RGBA').rotate(-angle, Image.BICUBIC, expand=True)
+
+
+def _round_corners(image: Image.Image, radius: int | str) -> Image.Image:
+    image = image.convert('RGBA')
+    width, height = image.size
+    mask = Image.new('L', image.size, 255)
+    draw = ImageDraw.Draw(mask)
+    if radius == 'max':
+        mask.paste(0, (0, 0, width, height))
+        draw.ellipse((0, 0, width - 1, height - 1), fill=255)
+    else:
+        radii = [int(r) for r in str(radius).split(':')]
+        # a:b:c:d are the left top, right top, right bottom and left bottom corners
+        left_top, right_top, right_bottom, left_bottom = (radii * 4)[:4] if len(radii) == 1 else radii
+        corners = ((left_top, 0, 0), (right_top, 1, 0), (right_bottom, 1, 1), (left_bottom, 0, 1))
+        for r, right, bottom in corners:
+            r = min(r, width // 2, height // 2)
+            if r <= 0:
+                continue
+            x = width - r if right else 0
+            y = height - r if bottom else 0
+            mask.paste(0, (x, y, x + r, y + r))
+            cx = width - 2 * r if right else 0
+            cy = height - 2 * r if bottom else 0
+            draw.ellipse((cx, cy, cx + 2 * r - 1, cy + 2 * r - 1), fill=255)
+    image.putalpha(ImageChops.multiply(image.getchannel('A'), mask))
+    return image
+
+
+def _effect(image: Image.Image, params: dict) -> Image.Image:
+    name, _, value = params['effect'].partition(':')
+    value = int(value) if value.lstrip('-').isdigit() else 0
+    alpha = image.getchannel('A') if image.mode == 'RGBA' else None
+    if name == 'grayscale':
+        result = ImageOps.grayscale(image.convert('RGB')).convert('RGB')
+    elif name == 'negate':
+        result = ImageOps.invert(image.convert('RGB'))
+    elif name == 'blackwhite':
+        threshold = round(255 * (value or 50) / 100)
+        result = ImageOps.grayscale(image.convert('RGB')).point(lambda p: 255 if p > threshold else 0).convert('RGB')
+    elif name == 'contrast':
+        result = ImageEnhance.Contrast(image.convert('RGB')).enhance(1 + value / 100)
+    elif name == 'brightness':
+        result = ImageEnhance.Brightness(image.convert('RGB')).enhance(1 + value / 100)
+    elif name == 'blur':
+        result, alpha = image.filter(ImageFilter.GaussianBlur((value or 100) / 20)), None
+    elif name == 'blur_region':
+        x, y = params.get('x', 0), params.get('y', 0)
+        box = (x, y, x + params.get('width', image.width), y + params.get('height', image.height))
+        result, alpha = image.copy(), None
+        result.paste(image.crop(box).filter(ImageFilter.GaussianBlur((value or 100) / 20)), box[:2])
+    else:
+        raise UnsupportedTransformation(params['effect'])
+    if alpha is not None:
+        result = result.convert('RGBA')
+        result.putalpha(alpha)
+    return result
+
+
+def apply_transformations(image: Image.Image, transform_list: List[dict]) -> Image.Image:
+    """
+    The apply_transformations function interprets the transformations made by create_list_transformation
+    (the Cloudinary transformation parameters) with Pillow, in the order they are listed:
+    resize and crop (with gravity and background), rotation, rounded corners and the grayscale, negate, blackwhite,
+    contrast, brightness, blur and blur_region effects.
+
+    :param image: Image.Image: The original image
+    :param transform_list: List[dict]: Transformations made by create_list_transformation
+    :return: The transformed image
+    """
+    for item in transform_list:
+        if 'effect' in item:
+            image = _effect(image, item)
+        elif 'angle' in item:
+            image = _rotate(image, item['angle'])
+        elif 'radius' in item:
+            image = _round_corners(image, item['radius'])
+        elif {'width', 'height', 'crop'} & set(item):
+            image = _resize(image, item)
+        else:
+            raise UnsupportedTransformation(json.dumps(item))
+    return image
+
+
+def render_transformation(image_url: str, transform_list: List[dict], path: str) -> str:
+    """
+    The render_transformation function transforms an image and writes the result to the given path.
+    It runs in a worker process of the transform pool. The file is written under a temporary name and renamed,
+    so a half-written file is never served.
+
+    :param image_url: str: Path of the original
+    :param transform_list: List[dict]: Transformations made by create_list_transformation
+    :param path: str: Path of the transformed image
+    :return: Path of the transformed image
+    """
+    with Image.open(image_url) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    image = apply_transformations(image, transform_list)
+    image_format, options = SAVE_FORMATS[pathlib.Path(path).suffix]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no transparency: transparent corners become the default background, as on Cloudinary
+        background = Image.new('RGB', image.size, _color(None))
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with media_storage.replacing(path) as tmp_path:
+        image.save(tmp_path, image_format, **options)
+    return path
+
+
+def _pin(path: str, saved_path: str) -> bool:
+    if os.path.exists(saved_path):
+        return True
+    os.makedirs(os.path.dirname(saved_path), exist_ok=True)
+    try:
+        with media_storage.replacing(saved_path) as tmp_path:
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+    except FileNotFoundError:
+        # evicted from the transform cache
+        return False
+    return True
+
+
+async def save_transformation(url: str) -> str | None:
+    """
+    The save_transformation function returns the url to store for a transformation saved by a user. Files rendered
+    by the local engine are evicted from the transform cache, so they are linked (or copied) out of it first;
+    other urls (e.g. Cloudinary ones) are returned as they are.
+
+    :param url: str: Url of the transformation, as returned by transform
+    :return: The url to store, or None if the file is no longer in the transform cache
+    """
+    prefix = f'{transform_cache.root}/'
+    if not url.startswith(prefix):
+        return url
+    if '..' in pathlib.PurePosixPath(url).parts:
+        return None
+    saved_path = f'{media_storage.MEDIA_ROOT}/{SAVED_TRANSFORMS_DIR}/{url[len(prefix):]}'
+    return saved_path if await run_in_threadpool(_pin, url, saved_path) else None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.transform_workers)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class CloudinaryTransformEngine:
+    """
+    Transform engine building the url of the transformation on Cloudinary, which renders it on the first request.
+    The original is uploaded to Cloudinary first if it wasn't yet (see upload_image).
+    """
+    name = 'cloudinary'
+
+    async def transform(self, image_url: str, transform_list: List[dict]) -> str:
+        return await get_transformed_url(image_url, transform_list)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class LocalTransformEngine:
+    """
+    Transform engine rendering transformations with Pillow in a process pool (transform_workers) and storing
+    them in the media store, without a round-trip to Cloudinary. Transformations Pillow can't reproduce
+    (the art effects, cartoonify, oil_paint, blur_faces) raise UnsupportedTransformation, originals Pillow can't
+    decode or too large to render raise InvalidImage.
+    Rendered files are kept in the disk tier of the transform cache and rendered again only once evicted.
+    """
+    name = 'local'
+
+    async def transform(self, image_url: str, transform_list: List[dict]) -> str:
+        path = transform_path(image_url, transform_list)
+        if await run_in_threadpool(transform_cache.use_file, path):
+            return path
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(get_pool(), render_transformation, image_url, transform_list, path)
+        except (OSError, MemoryError, Image.DecompressionBombError) as e:
+            raise InvalidImage(str(e)) from e
+        await run_in_threadpool(transform_cache.add_file, path)
+        return path
+
+    def shutdown(self) -> None:
+        shutdown_pool()
+
+
+TRANSFORM_ENGINES = {'cloudinary': CloudinaryTransformEngine, 'local': LocalTransformEngine}
+
+
+def get_transform_engine(name: str) -> CloudinaryTransformEngine | LocalTransformEngine:
+    """
+    The get_transform_engine function creates the transform engine selected by the transform_engine setting.
+
+    :param name: str: 'cloudinary' or 'local'
+    :return: The transform engine
+    """
+    if name in TRANSFORM_ENGINES:
+        return TRANSFORM_ENGINES[name]()
+    raise ValueError(f'Unknown transform engine: {name}')
+
+
+transform_engine = get_transform_engine(settings.transform_engine)
+transform_cache = TransformCache(f'{media_storage.MEDIA_ROOT}/{TRANSFORMS_DIR}', settings.transform_cache_max_bytes,
+                                 settings.transform_cache_memory_items)
+
+
+async def transform(image_url: str, transform_list: List[dict]) -> str:
+    """
+    The transform function returns the url of a transformation of an image made by the selected transform engine.
+    Transformations requested before are answered from the memory tier of the transform cache,
+    without calling the engine.
+
+    :param image_url: str: Path of the original
+    :param transform_list: List[dict]: Transformations made by create_list_transformation
+    :return: Url of the transformed image
+    """
+    key = (transform_engine.name, image_url, transformation_signature(transform_list))
+    url = await run_in_threadpool(transform_cache.get, key)
+    if url is None:
+        url = await transform_engine.transform(image_url, transform_list)
+        await run_in_threadpool(transform_cache.put, key, url)
+    return url
@@ -1,7 +1,43 @@
+import json
 from typing import List
 
 from src.schemas_transform_posts import TransformImageModel
 
+# values Cloudinary assumes for missing parameters: they are dropped, so equal transformations look the same
+TRANSFORMATION_DEFAULTS = {'crop': 'scale', 'gravity': 'center'}
+NO_OP_TRANSFORMATIONS = ({'angle': 0}, {'radius': 0}, {'radius': '0:0:0:0'})
+
+
+def canonical_transformation(transform_list: List[dict]) -> List[dict]:
+    """
+    The canonical_transformation function normalizes a list of transformations: parameters that are not set or
+    have their default value are dropped, the keys of every transformation are sorted and transformations that
+    change nothing (rotation by a multiple of 360 degrees, zero radius) are left out.
+
+    :param transform_list: List[dict]: The transformations
+    :return: The normalized transformations
+    """
+    result = []
+    for item in transform_list:
+        item = {key: value for key, value in sorted(item.items())
+                if value is not None and TRANSFORMATION_DEFAULTS.get(key) != value}
+        if 'angle' in item:
+            item['angle'] %= 360
+        if item and item not in NO_OP_TRANSFORMATIONS:
+            result.append(item)
+    return result
+
+
+def transformation_signature(transform_list: List[dict]) -> str:
+    """
+    The transformation_signature function returns a string identifying a list of transformations:
+    equal transformations have equal signatures, whatever the order their parameters were given in.
+
+    :param transform_list: List[dict]: The transformations
+    :return: The signature
+    """
+    return json.dumps(canonical_transformation(transform_list), sort_keys=True, separators=(',', ':'))
+
 
 def create_list_transformation(body: TransformImageModel) -> List[dict]:
     """
@@ -11,7 +47,7 @@ def create_list_transformation(body: TransformImageModel) -> List[dict]:
     If so, it creates a dictionary with key-value pairs representing parameters for that particular transformation.
 
     :param body: TransformImageModel: Create a list of dictionaries that are used to transform the image
-    :return: A list of dictionaries that can be used to create a transformation
+    :return: A list of dictionaries that can be used to create a transformation, normalized by canonical_transformation
     """
     transform_list = []
 
@@ -62,4 +98,4 @@ def create_list_transformation(body: TransformImageModel) -> List[dict]:
                     else:
                         transform_item[key] = t_dict[key]
             transform_list.append(transform_item)
-    return transform_list
+    return canonical_transformation(transform_list)
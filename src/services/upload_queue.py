@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.database.connect import SessionLocal
+from src.repository import posts as posts_repository
+from src.schemas import CdnStatus
+from src.services import cloudynary
+from src.services.job_queue import Job, JobQueue
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_JOB = 'cdn_upload'
+
+
+class UploadWorker:
+    """
+    Background worker uploading the originals of new posts to the CDN (see cloudynary.upload_image), so they are
+    already remote when the first transformation is requested. Jobs come from the durable job queue, so uploads
+    survive restarts; at most concurrency of them run at once. The outcome is recorded in the cdn_status of the posts
+    using the original: uploaded, or failed once the queue gives up retrying. Every purge_interval seconds
+    the finished jobs older than retention seconds are deleted from the queue.
+    """
+
+    def __init__(self, queue: JobQueue, session_factory: async_sessionmaker = SessionLocal, concurrency: int = 4,
+                 poll_interval: float = 5, retention: float = 7 * 24 * 3600, purge_interval: float = 3600):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.purged_at: float | None = None
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def notify(self) -> None:
+        self.wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.purge()
+                if await self.run_once():
+                    continue
+            except Exception:
+                logger.exception('Upload queue failed')
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """
+        The run_once function claims the due jobs (at most concurrency of them) and processes them concurrently.
+
+        :return: Number of processed jobs
+        """
+        jobs = await run_in_threadpool(self.queue.claim, self.concurrency)
+        await asyncio.gather(*(self.process(job) for job in jobs))
+        return len(jobs)
+
+    async def purge(self) -> int:
+        """
+        The purge function deletes the old finished jobs from the queue, at most once every purge_interval seconds.
+
+        :return: Number of deleted jobs
+        """
+        now = time.monotonic()
+        if self.purged_at is not None and now - self.purged_at < self.purge_interval:
+            return 0
+        self.purged_at = now
+        return await run_in_threadpool(self.queue.purge, self.retention)
+
+    async def process(self, job: Job) -> None:
+        photo_url = job.payload['photo_url']
+        try:
+            await cloudynary.upload_image(photo_url)
+        except Exception as e:
+            # errors of the backend (network, quota, ...) are retried by the queue
+            retry = await run_in_threadpool(self.queue.fail, job, repr(e))
+            logger.warning('Upload of %s failed (attempt %s): %r', photo_url, job.attempts, e)
+            if not retry:
+                await self.set_status(photo_url, CdnStatus.failed)
+            return
+        await run_in_threadpool(self.queue.complete, job)
+        await self.set_status(photo_url, CdnStatus.uploaded)
+
+    async def set_status(self, photo_url: str, cdn_status: CdnStatus) -> None:
+        async with self.session_factory() as db:
+            await posts_repository.set_cdn_status(photo_url, cdn_status, db)
+
+
+job_queue = JobQueue(settings.job_queue_path, settings.upload_max_attempts)
+upload_worker = UploadWorker(job_queue, concurrency=settings.upload_workers, retention=settings.job_retention,
+                             purge_interval=settings.job_purge_interval)
+
+
+async def enqueue_upload(photo_url: str) -> int:
+    """
+    The enqueue_upload function queues the upload of an original to the CDN and wakes the upload worker up.
+
+    :param photo_url: str: Path of the original
+    :return: Id of the job
+    """
+    job_id = await run_in_threadpool(job_queue.enqueue, UPLOAD_JOB, {'photo_url': photo_url})
+    upload_worker.notify()
+    return job_id
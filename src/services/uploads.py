@@ -0,0 +1,62 @@
+import hashlib
+import os
+from typing import NamedTuple
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.services.messages_templates import FILE_TOO_LARGE
+
+CHUNK_SIZE = 64 * 1024
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+def _write_chunk(f, digest, chunk: bytes) -> None:
+    # hashlib releases the GIL for large buffers, so hashing and writing both stay off the event loop
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def remove_file(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(upload: UploadFile, file_path: str, max_size: int | None = None,
+                      chunk_size: int = CHUNK_SIZE) -> SavedUpload:
+    """
+    The save_upload function streams an uploaded file to disk in chunks of chunk_size bytes, so the memory used
+    per upload doesn't depend on the size of the file. Blocking file operations run in the thread pool.
+    The SHA-256 hash of the content is computed in the same pass. If the file grows over max_size
+    (the max_upload_size setting by default), the partial file is deleted and 413 is raised.
+
+    :param upload: UploadFile: The uploaded file
+    :param file_path: str: Where to save the file
+    :param max_size: int: Maximal size of the file in bytes
+    :param chunk_size: int: Size of the chunks
+    :return: Path, size and hash of the saved file
+    """
+    max_size = settings.max_upload_size if max_size is None else max_size
+    digest = hashlib.sha256()
+    size = 0
+    f = await run_in_threadpool(open, file_path, 'wb')
+    try:
+        while chunk := await upload.read(chunk_size):
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=FILE_TOO_LARGE)
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(remove_file, file_path)
+        raise
+    await run_in_threadpool(f.close)
+    return SavedUpload(file_path, size, digest.hexdigest())
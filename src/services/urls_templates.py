@@ -1,3 +1,6 @@
 URL_TO_HEALTHCHECKER = "/api/healthchecker"
 URL_SIGNUP = "/api/auth/signup"
 URL_LOGIN = "/api/auth/login"
+URL_LOGOUT = "/api/auth/logout"
+URL_TAGS_SUGGEST = "/api/tags/suggest"
+URL_RATES = "/api/rate/"
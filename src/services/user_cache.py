@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import settings
+from src.database.models import User
+
+USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+class UserCache:
+    """
+    Short-lived cache of the authenticated users, keyed by the subject (email) of their tokens, so get_current_user
+    doesn't query the users table on every request. It holds at most max_size users, the least recently used ones
+    are dropped first. Entries expire after ttl seconds and are invalidated explicitly when a user changes;
+    as every worker process has its own cache, changes made by another process are seen after at most ttl seconds.
+
+    It also keeps the last known token_version of at most max_size users: the role claims of an access token are
+    trusted as long as its version isn't older than the known one (see Auth.get_token_claims).
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()
+        self.versions: OrderedDict[int, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, email: str, db: AsyncSession) -> User | None:
+        """
+        The get function returns the cached user attached to the given session, without querying the database,
+        so changes made to it are committed like those of a loaded user.
+
+        :param email: str: Subject of the token
+        :param db: AsyncSession: Session of the request
+        :return: The user or None if it's not cached
+        """
+        entry = self.entries.get(email)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(email, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(email)
+        self.hits += 1
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    def set(self, email: str, user: User) -> None:
+        if self.max_size <= 0:
+            return
+        self.set_version(user.id, user.token_version)
+        self.entries[email] = (time.monotonic() + self.ttl, {key: getattr(user, key) for key in USER_COLUMNS})
+        self.entries.move_to_end(email)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, *emails: str) -> None:
+        for email in emails:
+            self.entries.pop(email, None)
+
+    def set_version(self, user_id: int, version: int) -> None:
+        if self.max_size <= 0:
+            return
+        self.versions[user_id] = version
+        self.versions.move_to_end(user_id)
+        while len(self.versions) > self.max_size:
+            self.versions.popitem(last=False)
+
+    def is_stale(self, user_id: int, version: int) -> bool:
+        return version < self.versions.get(user_id, 0)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.versions.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+user_cache = UserCache(settings.user_cache_ttl, settings.user_cache_size)
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+
+from src.database.models import Post, User
+from src.repository import comments as comment_repository
+from src.repository import rates as rates_repository
+from src.repository.search import get_search_posts
+from src.schemas import CommentModel, PostModel
+
+
+@pytest.fixture(scope='module')
+def users(session):
+    author = User(username='counted', email='counted@example.com', password='testtest', user_role='User')
+    reader = User(username='reader', email='reader@example.com', password='testtest', user_role='User')
+    session.add_all([author, reader])
+    session.commit()
+    return author, reader
+
+
+@pytest.fixture(scope='module')
+def post(session, users):
+    post = Post(photo_url='media/counted.jpg', description='counted post', user_id=users[0].id)
+    session.add(post)
+    session.commit()
+    return post
+
+
+async def counters(post_id, db):
+    post = await db.scalar(select(Post).filter(Post.id == post_id).execution_options(populate_existing=True))
+    return post.comment_count, post.rate_count
+
+
+@pytest.mark.asyncio
+async def test_counters_maintained(post, users, async_session):
+    author, reader = users
+    first = await comment_repository.create_comment(CommentModel(comment_text='first'), post.id, async_session, reader)
+    await comment_repository.create_comment(CommentModel(comment_text='second'), post.id, async_session, author)
+    rate = await rates_repository.set_rate_for_image(post.id, 5, reader, async_session)
+    # changing a rate doesn't count it twice
+    await rates_repository.set_rate_for_image(post.id, 3, reader, async_session)
+    assert await counters(post.id, async_session) == (2, 1)
+
+    await comment_repository.delete_comments(first.id, async_session)
+    await rates_repository.remove_rate_for_image(rate.id, reader, async_session)
+    assert await counters(post.id, async_session) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_counters_in_responses(post, users, async_session, index_posts):
+    index_posts()
+    await comment_repository.create_comment(CommentModel(comment_text='third'), post.id, async_session, users[1])
+    comment_count, rate_count = await counters(post.id, async_session)
+
+    model = PostModel.from_orm(await async_session.scalar(select(Post).filter(Post.id == post.id)))
+    assert (model.comment_count, model.rate_count) == (comment_count, rate_count)
+    found = await get_search_posts('counted', 'date', 1, 0, 10, async_session)
+    assert [(item['comment_count'], item['rate_count']) for item in found] == [(comment_count, rate_count)]
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.database.models import Comment, Post, User
+from src.services.messages_templates import INVALID_CURSOR
+from src.services.pagination import encode_cursor
+
+
+@pytest.fixture(scope='module')
+def post(session):
+    authors = [User(username=f'author{i}', email=f'author{i}@example.com', password='testtest',
+                    first_name=f'First{i}', last_name=f'Last{i}') for i in range(3)]
+    session.add_all(authors)
+    session.flush()
+    post = Post(photo_url='media/comments.jpg', description='commented', user_id=authors[0].id)
+    session.add(post)
+    session.flush()
+    session.add_all([Comment(comment_text=f'comment {i}', post_id=post.id, user_id=authors[i % 3].id)
+                     for i in range(30)])
+    session.commit()
+    return post
+
+
+def test_get_comments_one_query(client, post, statements):
+    response = client.get(f'/api/{post.id}/comments/', params={'limit': 20})
+
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == 20
+    assert [item['comment']['comment_text'] for item in data[:4]] == [f'comment {i}' for i in range(4)]
+    assert [(item['username'], item['user_first_name'], item['user_last_name']) for item in data[:3]] == \
+           [(f'author{i}', f'First{i}', f'Last{i}') for i in range(3)]
+    assert len(statements) == 1
+
+    response = client.get(f'/api/{post.id}/comments/', params={'cursor': response.headers['X-Next-Cursor']})
+    assert [item['comment']['comment_text'] for item in response.json()] == [f'comment {i}' for i in range(20, 30)]
+
+
+def test_get_comment(client, post, statements):
+    comment_id = client.get(f'/api/{post.id}/comments/').json()[4]['comment']['id']
+    statements.clear()
+
+    response = client.get(f'/api/{post.id}/comments/{comment_id}')
+    assert response.status_code == 200, response.text
+    assert response.json()['username'] == 'author1'
+    assert len(statements) == 1
+    assert client.get(f'/api/{post.id}/comments/999999').status_code == 404
+
+
+@pytest.mark.parametrize('values', [['2023-01-01', 1], [datetime(2023, 1, 1), 'abc'], [datetime(2023, 1, 1), 1.5],
+                                    [datetime(2023, 1, 1), 2 ** 40], [datetime(2023, 1, 1, tzinfo=timezone.utc), 1],
+                                    [datetime(2023, 1, 1), True], [datetime(2023, 1, 1)]])
+def test_get_comments_cursor_of_wrong_types(client, post, values):
+    response = client.get(f'/api/{post.id}/comments/', params={'cursor': encode_cursor(values)})
+
+    assert response.status_code == 400, response.text
+    assert response.json()['detail'] == INVALID_CURSOR
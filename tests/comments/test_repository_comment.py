@@ -2,15 +2,13 @@ from datetime import datetime
 
 import unittest
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Comment, User
 from src.schemas import CommentModel
 from src.repository.comments import (
     create_comment,
-    get_comments,
     get_comment,
-    get_user_by_comment_id,
     delete_comments,
     edit_comments
 
@@ -19,7 +17,7 @@ from src.repository.comments import (
 
 class TestComment(unittest.TestCase):
     def setUp(self):
-        self.db = MagicMock(spec=Session)
+        self.db = MagicMock(spec=AsyncSession)
         self.current_user = User(id=123)
         self.post = MagicMock()
         self.post.id = 1
@@ -46,40 +44,6 @@ class TestComment(unittest.TestCase):
         self.assertIsNone(result)
         self.db.query.return_value.filter_by.assert_called_once_with(id=999)
 
-    async def test_get_comments_successful(self):
-        skip = 0
-        limit = 10
-        comments = [Comment(), Comment(), Comment()]
-        self.db.query().filter_by().offset(skip).limit(limit).all = comments
-
-        result = await get_comments(skip, limit, self.db, self.post.id)
-
-        self.assertEqual(result, comments)
-        self.db.query.return_value.filter_by.assert_called_once_with(post_id=self.post.id)
-        self.db.query.return_value.filter_by.return_value.offset.assert_called_once_with(skip)
-        self.db.query.return_value.filter_by.return_value.offset.return_value.limit.assert_called_once_with(limit)
-        self.db.query.return_value.filter_by.return_value.offset.return_value.limit.return_value.all.assert_called_once()
-
-    async def test_get_user_by_comment_id_successful(self):
-        user = User(id=1)
-
-        result = await get_user_by_comment_id(self.db, user.id)
-
-        self.assertEqual(result, user.id)
-        self.db.query.return_value.filter_by.assert_called_once_with(id=user.id)
-        self.db.query.return_value.filter_by.return_value.first.assert_called_once()
-
-    async def test_get_user_by_comment_id_none(self):
-        user = User(id=3232323)
-
-        self.db.query.return_value.filter_by.return_value.first.return_value = None
-
-        result = get_user_by_comment_id(self.db, user.id)
-
-        self.assertIsNone(result)
-        self.db.query.return_value.filter_by.assert_called_once_with(id=user.id)
-        self.db.query.return_value.filter_by.return_value.first.assert_called_once()
-
     async def test_get_comment(self):
         # create a mock database session and comment object
         comment = Comment(id=1, comment_text='test comment', post_id=1, user_id=1)
@@ -1,24 +1,60 @@
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+from uuid import uuid4
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from src.database.connect import get_db
 from src.database.models import Base
+from src.repository import search_index
+from src.services.auth import auth_service
+from src.services.rate_limiter import rate_limit_backend
+from src.services.revocation import revocation_list
+from src.services.tag_index import tag_index
+from src.services.user_cache import user_cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# every test (and every TestClient request) runs in its own event loop, so async connections are not pooled
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class Executed(NamedTuple):
+    statement: str
+    parameters: Any
+
+
+def access_token_issued_before(user, seconds: int = 10) -> str:
+    # revocations cover the tokens issued in the seconds before them, not the one they were made in
+    issued_at = datetime.utcnow() - timedelta(seconds=seconds)
+    claims = {**auth_service.access_token_claims(user), 'iat': issued_at, 'exp': issued_at + timedelta(minutes=15),
+              'scope': 'access_token', 'jti': uuid4().hex}
+    return jwt.encode(claims, auth_service.SECRET_KEY, algorithm=auth_service.ALGORITHM)
+
 
 @pytest.fixture(scope="module")
 def session():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # users cached (or revoked) and tags indexed by the previous test module are gone with the tables
+    user_cache.clear()
+    revocation_list.clear()
+    tag_index.clear()
 
     db = TestingSessionLocal()
     try:
@@ -27,13 +63,47 @@ def session():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def rate_limits():
+    # every test logs in from the same client IP, so it starts with fresh rate limits
+    rate_limit_backend.clear()
+
+
+@pytest_asyncio.fixture()
+async def async_session(session):
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(scope="module")
+def index_posts(session):
+    def rebuild():
+        # posts seeded through the sync session bypass the repository, so index them explicitly
+        for statement in search_index.rebuild_statements(engine.dialect.name):
+            session.execute(statement)
+        session.commit()
+
+    return rebuild
+
+
+@pytest.fixture()
+def statements():
+    # statements executed through the async engine during the test, e.g. to count the queries of a function
+    executed = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        executed.append(Executed(statement, parameters))
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', listener)
+    yield executed
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', listener)
+
+
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
 
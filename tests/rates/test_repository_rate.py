@@ -70,92 +70,140 @@ def post(current_user, session):
 
 
 @pytest.mark.asyncio
-async def test_set_rate_for_image(post, session, second_user):
-    response = await rep_rate.set_rate_for_image(post.id, 4, second_user, session)
+async def test_set_rate_for_image(post, second_user, async_session):
+    response = await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session)
     assert response.photo_id == post.id
     assert response.user_id == second_user.id
 
 
 @pytest.mark.asyncio
-async def test_set_rate_for_own_image(post, session, current_user):
-    response = await rep_rate.set_rate_for_image(post.id, 4, current_user, session)
+async def test_set_rate_for_own_image(post, current_user, async_session):
+    response = await rep_rate.set_rate_for_image(post.id, 4, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_remove_rate_for_image(post, second_user, session):
-    response = await rep_rate.remove_rate_for_image(1, second_user, session)
+async def test_remove_rate_for_image(post, second_user, async_session):
+    response = await rep_rate.remove_rate_for_image(1, second_user, async_session)
     assert response.id == 1
     assert response.user_id == second_user.id
     assert response.photo_id == post.id
 
 
 @pytest.mark.asyncio
-async def test_remove_rate_for_image_as_admin(post, second_user, admin_user, session):
-    rate = await rep_rate.set_rate_for_image(post.id, 4, second_user, session)
-    response = await rep_rate.remove_rate_for_image(rate.id, admin_user, session)
+async def test_remove_rate_for_image_as_admin(post, second_user, admin_user, async_session):
+    rate = await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session)
+    response = await rep_rate.remove_rate_for_image(rate.id, admin_user, async_session)
     assert response.id == rate.id
     assert response.user_id == second_user.id
     assert response.photo_id == post.id
 
 
 @pytest.mark.asyncio
-async def test_remove_rate_for_image_as_other_user(post, second_user, current_user, session):
-    rate = await rep_rate.set_rate_for_image(post.id, 4, second_user, session)
-    response = await rep_rate.remove_rate_for_image(rate.id, current_user, session)
+async def test_remove_rate_for_image_as_other_user(post, second_user, current_user, async_session):
+    rate = await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session)
+    response = await rep_rate.remove_rate_for_image(rate.id, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_get_rate_for_image(post, current_user, second_user, admin_user, session):
+async def test_get_rate_for_image(post, current_user, second_user, admin_user, async_session):
     rates =[]
-    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, session))
-    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, session))
-    response = await rep_rate.get_rate_for_image(post.id,  0, 20, current_user, session)
+    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session))
+    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, async_session))
+    response = await rep_rate.get_rate_for_image(post.id,  0, 20, current_user, async_session)
     assert len(response) == len(rates)
 
 
 @pytest.mark.asyncio
-async def test_get_rate_for_image_as_admin(post, current_user, second_user, admin_user, session):
+async def test_get_rate_for_image_as_admin(post, current_user, second_user, admin_user, async_session):
     rates =[]
-    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, session))
-    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, session))
-    response = await rep_rate.get_rate_for_image(post.id, 0, 20, admin_user, session)
+    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session))
+    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, async_session))
+    response = await rep_rate.get_rate_for_image(post.id, 0, 20, admin_user, async_session)
     assert len(response) == len(rates)
 
 
 @pytest.mark.asyncio
-async def test_get_rate_for_image_as_other_user(post, current_user, second_user, admin_user, session):
+async def test_get_rate_for_image_as_other_user(post, current_user, second_user, admin_user, async_session):
     rates =[]
-    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, session))
-    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, session))
-    response = await rep_rate.get_rate_for_image(post.id, 0, 20, second_user, session)
+    rates.append(await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session))
+    rates.append(await rep_rate.set_rate_for_image(post.id, 5, admin_user, async_session))
+    response = await rep_rate.get_rate_for_image(post.id, 0, 20, second_user, async_session)
     assert response == []
 
 
 @pytest.mark.asyncio
-async def test_get_rate_for_user(second_user, post, session):
-    response = await rep_rate.get_rate_for_user(0, 20, second_user, session)
+async def test_get_rate_for_user(second_user, post, async_session):
+    response = await rep_rate.get_rate_for_user(0, 20, second_user, async_session)
     assert len(response) == 1
     assert response[0].rate == 4
 
 
 @pytest.mark.asyncio
-async def test_get_rate_for_user_as_admin(admin_user, post, session):
-    response = await rep_rate.get_rate_for_user(0, 20, admin_user, session)
+async def test_get_rate_for_user_as_admin(admin_user, post, async_session):
+    response = await rep_rate.get_rate_for_user(0, 20, admin_user, async_session)
     assert len(response) == 1
     assert response[0].rate == 5
 
 
 @pytest.mark.asyncio
-async def test_get_rate_from_user(admin_user, second_user, session):
-    response = await rep_rate.get_rate_from_user(second_user.id, 0, 20, admin_user, session)
+async def test_get_rate_from_user(admin_user, second_user, async_session):
+    response = await rep_rate.get_rate_from_user(second_user.id, 0, 20, admin_user, async_session)
     assert len(response) == 1
     assert response[0].rate == 4
     assert response[0].user_id == second_user.id
 
 
 @pytest.mark.asyncio
-async def test_get_rate_from_user_not_admin(current_user, second_user, session):
-    response = await rep_rate.get_rate_from_user(second_user.id, 0, 20, current_user, session)
+async def test_get_rate_from_user_not_admin(current_user, second_user, async_session):
+    response = await rep_rate.get_rate_from_user(second_user.id, 0, 20, current_user, async_session)
     assert response == []
+
+
+@pytest.mark.asyncio
+async def test_rating_aggregates(current_user, second_user, admin_user, session, async_session):
+    post = Post(photo_url='media/rating.jpg', description='Rating', user_id=current_user.id)
+    session.add(post)
+    session.commit()
+
+    await rep_rate.set_rate_for_image(post.id, 4, second_user, async_session)
+    rate = await rep_rate.set_rate_for_image(post.id, 2, admin_user, async_session)
+    await rep_rate.set_rate_for_image(post.id, 5, second_user, async_session)
+    session.refresh(post)
+    assert (post.rating_sum, post.rating_count, post.rating) == (7, 2, 3.5)
+
+    await rep_rate.remove_rate_for_image(rate.id, admin_user, async_session)
+    session.refresh(post)
+    assert (post.rating_sum, post.rating_count, post.rating) == (5, 1, 5.0)
+
+    post.rating_sum, post.rating_count, post.rating = 0, 0, 0
+    session.commit()
+    assert await rep_rate.recompute_ratings(async_session) == 1
+    session.refresh(post)
+    assert (post.rating_sum, post.rating_count, post.rating) == (5, 1, 5.0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_rate(current_user, second_user, session, async_session, monkeypatch):
+    post = Post(photo_url='media/concurrent.jpg', description='Concurrent', user_id=current_user.id)
+    session.add(post)
+    session.commit()
+    await rep_rate.set_rate_for_image(post.id, 2, second_user, async_session)
+    scalar = async_session.scalar
+    lookups = []
+
+    async def first_rate_not_seen(sql, *args, **kwargs):
+        # the first rate of the other request is committed right after this one looked for it
+        result = await scalar(sql, *args, **kwargs)
+        if isinstance(result, RatePost) and not lookups:
+            lookups.append(result)
+            return None
+        return result
+
+    monkeypatch.setattr(async_session, 'scalar', first_rate_not_seen)
+    rate = await rep_rate.set_rate_for_image(post.id, 5, second_user, async_session)
+
+    assert lookups and rate.rate == 5
+    session.refresh(post)
+    assert (post.rating_sum, post.rating_count, post.rating) == (5, 1, 5.0)
@@ -0,0 +1,66 @@
+from array import array
+
+import pytest
+
+from src.services.inverted_index import InvertedIndex, intersect
+
+
+@pytest.fixture()
+def index():
+    index = InvertedIndex()
+    index.add(1, ['sunset', 'sea'])
+    index.add(2, ['sunrise', 'sea', 'boat'])
+    index.add(3, ['boat', 'harbour'])
+    return index
+
+
+def test_intersect():
+    assert intersect(array('q', [1, 3, 5, 7]), array('q', [2, 3, 4, 7, 9])) == array('q', [3, 7])
+    assert intersect(array('q', [1, 2]), array('q', [])) == array('q')
+
+
+def test_search_intersects_tokens(index):
+    assert set(index.search(['sea'])) == {1, 2}
+    assert set(index.search(['sea', 'boat'])) == {2}
+    assert index.search(['sea', 'harbour']) == {}
+    assert index.search(['missing']) == {}
+
+
+def test_search_prefix_and_rank(index):
+    assert set(index.search(['sun'])) == {1, 2}
+    ranks = index.search(['sea', 'sun'])
+    assert ranks == {1: 3, 2: 3}
+    assert index.search(['sunset']) == {1: 2}
+
+
+def test_update_and_remove(index):
+    index.add(1, ['harbour'])
+    assert set(index.search(['harbour'])) == {1, 3}
+    assert set(index.search(['sea'])) == {2}
+    index.remove(2)
+    assert index.search(['sea']) == {}
+    assert 'sunrise' not in index.terms
+    assert list(index.postings['boat']) == [3]
+
+
+def test_snapshot(index, tmp_path):
+    path = str(tmp_path / 'index.json.gz')
+    index.watermark = '2026-10-17T10:00:00'
+    index.save(path)
+    assert [file.name for file in tmp_path.iterdir()] == ['index.json.gz']
+    restored = InvertedIndex()
+    assert restored.load(path)
+    assert restored.watermark == index.watermark
+    assert restored.documents == index.documents
+    assert restored.terms == index.terms
+    assert restored.search(['sea', 'boat']) == index.search(['sea', 'boat'])
+    assert not InvertedIndex().load(str(tmp_path / 'missing.json.gz'))
+
+
+def test_corrupt_snapshot(index, tmp_path):
+    path = tmp_path / 'index.json.gz'
+    index.save(str(path))
+    path.write_bytes(path.read_bytes()[:20])
+    with pytest.raises(Exception):
+        index.load(str(path))
+    assert sorted(index.documents) == [1, 2, 3]
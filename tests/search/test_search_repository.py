@@ -1,9 +1,14 @@
 from typing import List
 
 import pytest
+from fastapi import HTTPException
 
 import src.repository.search as rep_search
-from src.database.models import Post, User, RatePost, UserRole
+import src.repository.posts as rep_posts
+from src.repository import search_index
+from src.schemas import PostCreate
+from src.services.pagination import next_cursor
+from src.database.models import Post, User, RatePost, UserRole, Tag
 
 
 @pytest.fixture()
@@ -43,59 +48,247 @@ def admin_user(sec_user, session):
 
 
 @pytest.fixture()
-def post(current_user, session):
+def post(current_user, session, index_posts):
     post = session.query(Post).first()
     if post is None:
         post = Post(photo_url='PythonContactsApp/Irina', description='My new photo', user_id=current_user.id)
         session.add(post)
         session.commit()
         session.refresh(post)
+        index_posts()
     return post
 
 
 @pytest.mark.asyncio
-async def test_get_search_posts_date(post, session):
-    response = await rep_search.get_search_posts('My', 'date', 1, 0, 20, session)
+async def test_get_search_posts_date(post, async_session):
+    response = await rep_search.get_search_posts('My', 'date', 1, 0, 20, async_session)
     assert type(response) == list
     assert response[0]['id'] == post.id
 
 
 @pytest.mark.asyncio
-async def test_get_search_posts_date_desc(post, session):
-    response = await rep_search.get_search_posts('My', 'date', -1, 0, 20, session)
+async def test_get_search_posts_date_desc(post, async_session):
+    response = await rep_search.get_search_posts('My', 'date', -1, 0, 20, async_session)
     assert type(response) == list
     assert response[0]['id'] == post.id
 
 
 @pytest.mark.asyncio
-async def test_get_search_posts_rate(post, session):
-    response = await rep_search.get_search_posts('My', 'rate', 1, 0, 20, session)
+async def test_get_search_posts_rate(post, async_session):
+    response = await rep_search.get_search_posts('My', 'rate', 1, 0, 20, async_session)
     assert type(response) == list
     assert response[0]['id'] == post.id
 
 
 @pytest.mark.asyncio
-async def test_get_search_posts_rate_desc(post, session):
-    response = await rep_search.get_search_posts('My', 'rate', -1, 0, 20, session)
+async def test_get_search_posts_rate_desc(post, async_session):
+    response = await rep_search.get_search_posts('My', 'rate', -1, 0, 20, async_session)
     assert type(response) == list
     assert response[0]['id'] == post.id
 
+@pytest.fixture()
+def tagged_posts(current_user, session, index_posts):
+    posts = session.query(Post).filter(Post.description.like('Batch%')).all()
+    if not posts:
+        tags = [Tag(tag=f'batch{i}', user_id=current_user.id) for i in range(3)]
+        posts = [Post(photo_url=f'media/batch{i}.jpg', description=f'Batch photo {i}', user_id=current_user.id,
+                      tags=tags[:i + 1]) for i in range(3)]
+        session.add_all(posts)
+        session.commit()
+        index_posts()
+    return posts
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_tags_batched(tagged_posts, async_session, statements):
+    response = await rep_search.get_search_posts('Batch', 'date', 1, 0, 20, async_session)
+    assert len(statements) == 2
+    assert [len(item['tags']) for item in response] == [1, 2, 3]
+    assert response[2]['tags'] == [{'id': tag.id, 'tag': tag.tag} for tag in tagged_posts[2].tags]
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_by_tag(tagged_posts, async_session):
+    response = await rep_search.get_search_posts('batch2', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [tagged_posts[2].id]
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_relevance(tagged_posts, async_session):
+    # 'batch0' only tags the first post; 'batch' is a prefix of every tag
+    response = await rep_search.get_search_posts('batch photo 0', 'relevance', -1, 0, 20, async_session)
+    assert response[0]['id'] == tagged_posts[0].id
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_index_maintained(current_user, async_session):
+    body = PostCreate(description='Sunset over the lighthouse', tags=['seaside'])
+    post = await rep_posts.create_post(body, 'media/sunset.jpg', async_session, current_user)
+    response = await rep_search.get_search_posts('lighthouse', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [post.id]
+
+    body = PostCreate(description='Sunrise over the harbour', tags=['seaside'])
+    await rep_posts.update_post(post.id, body, async_session, current_user)
+    assert await rep_search.get_search_posts('lighthouse', 'date', 1, 0, 20, async_session) == []
+    response = await rep_search.get_search_posts('harb', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [post.id]
+
+    await rep_posts.remove_post(post.id, async_session)
+    assert await rep_search.get_search_posts('seaside', 'date', 1, 0, 20, async_session) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('sort, sort_type', [('date', 1), ('date', -1), ('rate', -1), ('relevance', -1)])
+async def test_get_search_posts_cursor(tagged_posts, async_session, sort, sort_type):
+    expected = await rep_search.get_search_posts('batch', sort, sort_type, 0, 20, async_session)
+    keys = rep_search.get_post_sort_keys(sort)
+    ids, cursor = [], None
+    while True:
+        page = await rep_search.get_search_posts('batch', sort, sort_type, 0, 2, async_session, cursor)
+        ids += [item['id'] for item in page]
+        cursor = next_cursor(page, keys, 2)
+        if cursor is None:
+            break
+    assert ids == [item['id'] for item in expected]
+
+
 @pytest.mark.asyncio
-async def test_get_search_users_date(c_user, session):
-    response = await rep_search.get_search_users('test', 'date', 1, 0, 20, session)
+async def test_get_search_posts_invalid_cursor(tagged_posts, async_session):
+    with pytest.raises(HTTPException) as error:
+        await rep_search.get_search_posts('batch', 'date', 1, 0, 2, async_session, 'not a cursor')
+    assert error.value.status_code == 400
+
+
+@pytest.fixture()
+def memory_backend(monkeypatch):
+    backend = search_index.MemorySearchBackend()
+    monkeypatch.setattr(search_index, 'search_backend', backend)
+    return backend
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_memory_backend(tagged_posts, memory_backend, async_session):
+    await memory_backend.rebuild(async_session)
+    response = await rep_search.get_search_posts('batch2', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [tagged_posts[2].id]
+    response = await rep_search.get_search_posts('batch photo 0', 'relevance', -1, 0, 20, async_session)
+    assert response[0]['id'] == tagged_posts[0].id
+    assert await rep_search.get_search_posts('batch nothing', 'date', 1, 0, 20, async_session) == []
+
+
+@pytest.mark.asyncio
+async def test_get_search_posts_memory_backend_maintained(current_user, memory_backend, async_session):
+    body = PostCreate(description='Fog over the bridge', tags=['river'])
+    post = await rep_posts.create_post(body, 'media/fog.jpg', async_session, current_user)
+    response = await rep_search.get_search_posts('bridge riv', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [post.id]
+
+    body = PostCreate(description='Rain over the canal', tags=['river'])
+    await rep_posts.update_post(post.id, body, async_session, current_user)
+    assert await rep_search.get_search_posts('bridge', 'date', 1, 0, 20, async_session) == []
+    response = await rep_search.get_search_posts('canal', 'date', 1, 0, 20, async_session)
+    assert [item['id'] for item in response] == [post.id]
+
+    await rep_posts.remove_post(post.id, async_session)
+    assert await rep_search.get_search_posts('river', 'date', 1, 0, 20, async_session) == []
+    assert len(memory_backend.index) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_catches_up_with_snapshot(current_user, session, async_session, tmp_path):
+    path = str(tmp_path / 'index.json.gz')
+    backend = search_index.MemorySearchBackend(path)
+    await backend.startup(async_session)
+    removed = Post(photo_url='media/dune.jpg', description='Dune at dawn', user_id=current_user.id)
+    session.add(removed)
+    session.commit()
+    await backend.rebuild(async_session)
+    backend.shutdown()
+
+    # written by another process after the snapshot
+    session.add(Post(photo_url='media/cliff.jpg', description='Cliff at dawn', user_id=current_user.id))
+    session.delete(removed)
+    session.commit()
+
+    restarted = search_index.MemorySearchBackend(path)
+    await restarted.startup(async_session)
+    assert [terms for terms in restarted.index.documents.values() if 'dawn' in terms] == [('at', 'cliff', 'dawn')]
+
+    with open(path, 'wb') as f:
+        f.write(b'truncated')
+    restarted = search_index.MemorySearchBackend(path)
+    await restarted.startup(async_session)
+    assert [terms for terms in restarted.index.documents.values() if 'dawn' in terms] == [('at', 'cliff', 'dawn')]
+
+
+@pytest.mark.asyncio
+async def test_get_search_users_date(c_user, async_session):
+    response = await rep_search.get_search_users('test', 'date', 1, 0, 20, async_session)
     assert type(response) == list
     assert response[0].username == c_user['username']
 
 
 @pytest.mark.asyncio
-async def test_get_search_users_name_desc(c_user, session):
-    response = await rep_search.get_search_users('test', 'name', -1, 0, 20, session)
+async def test_get_search_users_name_desc(c_user, async_session):
+    response = await rep_search.get_search_users('test', 'name', -1, 0, 20, async_session)
     assert type(response) == list
     assert response[0].username == c_user['username']
 
 
 @pytest.mark.asyncio
-async def test_get_search_users_email(c_user, session):
-    response = await rep_search.get_search_users('test', 'email', 1, 0, 20, session)
+async def test_get_search_users_cursor(c_user, current_user, async_session):
+    keys = rep_search.get_user_sort_keys('username')
+    page = await rep_search.get_search_users('test', 'username', 1, 0, 1, async_session)
+    assert [user.username for user in page] == [c_user['username']]
+    cursor = next_cursor(page, keys, 1)
+    page = await rep_search.get_search_users('test', 'username', 1, 0, 1, async_session, cursor)
+    assert c_user['username'] not in [user.username for user in page]
+
+
+@pytest.mark.asyncio
+async def test_get_search_users_email(c_user, async_session):
+    response = await rep_search.get_search_users('test', 'email', 1, 0, 20, async_session)
     assert type(response) == list
     assert response[0].username == c_user['username']
+
+
+@pytest.mark.asyncio
+async def test_get_search_users_trigram(session, async_session):
+    user = User(email='marguerite@example.com', username='daisy', first_name='Marguerite', last_name='Duras',
+                password='testtest')
+    session.add(user)
+    session.commit()
+    response = await rep_search.get_search_users('GUERI', 'username', 1, 0, 20, async_session)
+    assert [item.username for item in response] == ['daisy']
+    assert await rep_search.get_search_users('ura', 'username', 1, 0, 20, async_session) != []
+
+    # the trigram index follows the searched columns of the users table
+    user.last_name = 'Sagan'
+    session.commit()
+    assert await rep_search.get_search_users('uras', 'username', 1, 0, 20, async_session) == []
+    response = await rep_search.get_search_users('sagan', 'username', 1, 0, 20, async_session)
+    assert [item.username for item in response] == ['daisy']
+
+    session.delete(user)
+    session.commit()
+    assert await rep_search.get_search_users('sagan', 'username', 1, 0, 20, async_session) == []
+
+
+@pytest.mark.asyncio
+async def test_get_search_users_relevance(session, async_session):
+    session.add_all([User(email='anna.maria@example.com', username='annamaria', first_name='Anna',
+                          last_name='Maria', password='testtest'),
+                     User(email='anna@example.com', username='anna', first_name='Anna', password='testtest')])
+    session.commit()
+    keys = rep_search.get_user_sort_keys('relevance')
+    page = await rep_search.get_search_users('anna', 'relevance', -1, 0, 1, async_session)
+    assert [user.username for user in page] == ['anna']
+    page = await rep_search.get_search_users('anna', 'relevance', -1, 0, 1, async_session, next_cursor(page, keys, 1))
+    assert [user.username for user in page] == ['annamaria']
+
+
+@pytest.mark.asyncio
+async def test_get_search_users_short_string(c_user, current_user, async_session):
+    # too short for trigrams, falls back to ILIKE
+    response = await rep_search.get_search_users('te', 'username', 1, 0, 20, async_session)
+    assert c_user['username'] in [user.username for user in response]
@@ -1,7 +1,7 @@
 import pytest
 
 from src.database.models import Post, User, UserRole
-from src.services.messages_templates import FORBIDDEN_ACCESS
+from src.services.messages_templates import FORBIDDEN_ACCESS, INVALID_CURSOR
 
 
 @pytest.fixture()
@@ -43,7 +43,7 @@ def cur_token(c_user, client, session, monkeypatch):
 
 
 @pytest.fixture()
-def post_id(c_user, cur_token, session):
+def post_id(c_user, cur_token, session, index_posts):
     cur_user = session.query(User).filter(User.email == c_user['email']).first()
     post = session.query(Post).first()
     if post is None:
@@ -51,6 +51,7 @@ def post_id(c_user, cur_token, session):
         session.add(post)
         session.commit()
         session.refresh(post)
+        index_posts()
     return post.id
 
 
@@ -70,6 +71,28 @@ def test_search_users(client, token):
     assert len(data) == 2
 
 
+def test_search_users_cursor(client, token, cur_token):
+    response = client.post('/api/search/users?limit=1', json={"search_str": "te", "sort": "username", "sort_type": 1},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    first = response.json()
+    cursor = response.headers['X-Next-Cursor']
+    response = client.post(f'/api/search/users?limit=1&cursor={cursor}',
+                           json={"search_str": "te", "sort": "username", "sort_type": 1},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    second = response.json()
+    assert len(first) == len(second) == 1
+    assert first[0]['id'] != second[0]['id']
+
+
+def test_search_users_invalid_cursor(client, token):
+    response = client.post('/api/search/users?cursor=abc', json={"search_str": "te"},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400, response.text
+    assert response.json()['detail'] == INVALID_CURSOR
+
+
 def test_search_users_as_user(client, cur_token):
     response = client.post('/api/search/users', json={"search_str": "te", "sort": "name", "sort_type": 1},
                           headers={"Authorization": f"Bearer {cur_token}"})
@@ -0,0 +1,117 @@
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+import src.repository.posts as rep_posts
+from src.database.models import User
+from src.schemas import PostCreate
+from src.services import media_storage
+
+
+@pytest.fixture()
+def media_root(tmp_path, monkeypatch):
+    root = tmp_path.as_posix()
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', root)
+    return root
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'uploader@example.com').first()
+    if user is None:
+        user = User(email='uploader@example.com', username='uploader', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    return user
+
+
+def upload(content: bytes, filename: str = 'photo.JPG') -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+@pytest.mark.asyncio
+async def test_store_upload_deduplicates(media_root):
+    first = await media_storage.store_upload(upload(b'same photo'))
+    # the same content under another spelling of the extension
+    second = await media_storage.store_upload(upload(b'same photo', 'photo.jpeg'))
+    other = await media_storage.store_upload(upload(b'other photo'))
+    for stored in (first, second, other):
+        await media_storage.finish_upload(stored)
+
+    assert first.path == second.path == media_storage.blob_path(first.sha256, '.jpg')
+    assert first.path.startswith(f'{media_root}/{first.sha256[:2]}/{first.sha256[2:4]}/')
+    assert other.path != first.path
+    assert sorted(media_storage.iter_blobs()) == sorted([first.path, other.path])
+    assert os.listdir(os.path.join(media_root, media_storage.INCOMING_DIR)) == []
+
+
+@pytest.mark.asyncio
+async def test_remove_post_keeps_shared_file(media_root, current_user, async_session):
+    saved = await media_storage.store_upload(upload(b'shared photo'))
+    body = PostCreate(description='Shared', tags=[])
+    first = await rep_posts.create_post(body, saved.path, async_session, current_user)
+    second = await rep_posts.create_post(body, saved.path, async_session, current_user)
+
+    await rep_posts.remove_post(first.id, async_session)
+    assert os.path.exists(saved.path)
+    await rep_posts.remove_post(second.id, async_session)
+    assert not os.path.exists(saved.path)
+
+
+@pytest.mark.asyncio
+async def test_upload_republished_after_concurrent_remove(media_root, current_user, async_session):
+    body = PostCreate(description='Raced', tags=[])
+    old = await media_storage.store_upload(upload(b'raced photo'))
+    await media_storage.finish_upload(old)
+    old_post = await rep_posts.create_post(body, old.path, async_session, current_user)
+
+    # a new upload of the same content is published, then the old post is removed before the new one commits
+    new = await media_storage.store_upload(upload(b'raced photo'))
+    await rep_posts.remove_post(old_post.id, async_session)
+    assert not os.path.exists(new.path)
+    await rep_posts.create_post(body, new.path, async_session, current_user)
+    await media_storage.finish_upload(new)
+    assert os.path.exists(new.path)
+    assert os.listdir(os.path.join(media_root, media_storage.INCOMING_DIR)) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_unreferenced_file_keeps_referenced(media_root, current_user, async_session):
+    stored = await media_storage.store_upload(upload(b'referenced photo'))
+    await media_storage.finish_upload(stored)
+    # committed between the first count of remove_post and the deletion
+    await rep_posts.create_post(PostCreate(description='Kept', tags=[]), stored.path, async_session, current_user)
+    await rep_posts.delete_unreferenced_file(stored.path, async_session)
+    assert os.path.exists(stored.path)
+    assert os.listdir(os.path.join(media_root, media_storage.INCOMING_DIR)) == []
+
+
+def test_replacing_concurrent_writers(tmp_path):
+    path = str(tmp_path / 'image.jpg')
+    # two renders of the same file at the same time write their own temporary files, the last rename wins
+    with media_storage.replacing(path) as first, media_storage.replacing(path) as second:
+        assert first != second
+        for tmp, content in ((first, b'first'), (second, b'second')):
+            with open(tmp, 'wb') as f:
+                f.write(content)
+    assert open(path, 'rb').read() == b'first'
+
+    with pytest.raises(OSError):
+        with media_storage.replacing(path) as tmp:
+            open(tmp, 'wb').close()
+            raise OSError('disk full')
+    assert os.listdir(tmp_path) == ['image.jpg']
+
+
+@pytest.mark.asyncio
+async def test_trash_file_outside_media_root(media_root, tmp_path):
+    outside = tmp_path.parent / f'{tmp_path.name}-outside.jpg'
+    outside.write_bytes(b'outside')
+    try:
+        assert await media_storage.trash_file(f'{media_root}/../{outside.name}') is None
+        assert await media_storage.trash_file(outside.as_posix()) is None
+        assert outside.read_bytes() == b'outside'
+    finally:
+        outside.unlink()
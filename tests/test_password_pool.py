@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.auth import auth_service
+from src.services.password_pool import PasswordPool
+
+
+@pytest.fixture()
+def pool():
+    pool = PasswordPool(workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hash_offloaded():
+    hashed = await auth_service.get_password_hash_async('secret')
+    assert await auth_service.verify_password_async('secret', hashed) is True
+    assert await auth_service.verify_password_async('wrong', hashed) is False
+
+
+@pytest.mark.asyncio
+async def test_password_pool_rejects_when_full(pool):
+    release = threading.Event()
+    running = asyncio.gather(pool.run(release.wait), pool.run(release.wait))
+    await asyncio.sleep(0.05)
+    assert pool.stats()['pending'] == 2
+    assert pool.stats()['queued'] == 1
+
+    with pytest.raises(HTTPException) as e:
+        await pool.run(release.wait)
+    assert e.value.status_code == 503
+
+    release.set()
+    assert await running == [True, True]
+    stats = pool.stats()
+    assert (stats['pending'], stats['completed'], stats['rejected'], stats['max_pending']) == (0, 2, 1, 2)
@@ -1,16 +1,16 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Post
+from src.database.models import User, Post, Tag
 from src.repository.posts import create_post, get_post, get_user_posts, update_post, remove_post, change_post_mark
 from src.schemas import PostCreate
 
 
 class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
         self.user_mock = User(id=1)
 
     async def test_create_post(self):
@@ -19,6 +19,8 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             tags=["first", "second", "third"]
         )
         file_path = "test_path"
+        tags = [Tag(id=i, tag=tag_name) for i, tag_name in enumerate(body.tags)]
+        self.session.scalars.return_value.all = MagicMock(return_value=tags)
 
         result = await create_post(body, file_path, self.session, self.user_mock)
 
@@ -39,7 +41,7 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             photo_url="test_path"
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await get_post(post_id=post_id, db=self.session)
 
@@ -49,14 +51,14 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_post_not_found(self):
 
-        self.session.query(Post).filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await get_post(post_id=0, db=self.session)
         self.assertIsNone(result)
 
     async def test_get_user_posts(self):
         return_value = [Post(), Post(), Post()]
-        self.session.query(Post).filter().all.return_value = return_value
+        self.session.scalars.return_value.all = MagicMock(return_value=return_value)
         result = await get_user_posts(user_id=0, db=self.session)
 
         self.assertEqual(return_value, result)
@@ -70,7 +72,7 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             tags=[]
         )
 
-        self.session.query().filter().first.return_value = return_value
+        self.session.scalar.return_value = return_value
 
         body = PostCreate(
             description="Update description",
@@ -82,13 +84,13 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.description, body.description)
 
     async def test_update_post_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         body = PostCreate(
             description="Update description",
             tags=[]
         )
-        self.session.query(Post).filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await update_post(post_id=0, body=body, db=self.session, user=self.user_mock)
         self.assertIsNone(result)
@@ -102,14 +104,14 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             photo_url="test_path"
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await remove_post(post_id=post_id, db=self.session)
 
         self.assertEqual(post, result)
 
     async def test_remove_post_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await remove_post(post_id=1, db=self.session)
 
@@ -125,14 +127,14 @@ class TestPostCRUD(unittest.IsolatedAsyncioTestCase):
             marked=marked
         )
 
-        self.session.query().filter().first.return_value = post
+        self.session.scalar.return_value = post
 
         result = await change_post_mark(post_id=post_id, db=self.session)
 
         self.assertEqual(marked, not result.marked)
 
     async def test_change_post_mark_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalar.return_value = None
 
         result = await change_post_mark(post_id=1, db=self.session)
 
@@ -0,0 +1,86 @@
+"""
+The main listing queries of the repositories must find their rows through an index, not by scanning the table.
+The queries are captured while the repository functions run, then explained on the seeded SQLite database.
+"""
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from src.database.models import Comment, Post, RatePost, Tag, TransformPosts, User, post_tag
+from src.repository import comments as comments_repository
+from src.repository import posts as posts_repository
+from src.repository import rates as rates_repository
+from src.repository import tags as tags_repository
+from src.repository import transform_posts as transform_repository
+from tests.conftest import engine
+
+
+@pytest.fixture(scope='module')
+def seeded(session):
+    users = [User(username=f'plan{i}', email=f'plan{i}@example.com', password='testtest', user_role='User')
+             for i in range(20)]
+    admin = User(username='planadmin', email='planadmin@example.com', password='testtest', user_role='Admin')
+    session.add_all([*users, admin])
+    session.flush()
+    tags = [Tag(tag=f'plan{i}', user_id=users[0].id) for i in range(10)]
+    session.add_all(tags)
+    posts = [Post(photo_url=f'media/plan{i}.jpg', description=f'plan {i}', user_id=users[i % 20].id)
+             for i in range(200)]
+    session.add_all(posts)
+    session.flush()
+    session.execute(post_tag.insert(), [{'post': post.id, 'tag': tags[(post.id + i) % 10].id}
+                                        for post in posts for i in range(3)])
+    session.add_all([Comment(comment_text='plan', post_id=post.id, user_id=users[i % 20].id)
+                     for post in posts for i in range(5)])
+    session.add_all([RatePost(rate=3, photo_id=post.id, user_id=user.id) for post in posts for user in users[:5]
+                     if user.id != post.user_id])
+    session.add_all([TransformPosts(photo_url=f'transformed{i}', photo_id=post.id) for post in posts for i in range(2)])
+    session.commit()
+    return users[1], admin, posts[21]
+
+
+def query_plan(statement: str, parameters) -> str:
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', tuple(parameters)).all()
+    return '\n'.join(row[-1] for row in rows)
+
+
+def assert_searched(plan: str, table: str, index: str) -> None:
+    assert re.search(rf'SEARCH {table} USING (COVERING )?INDEX {index}\b', plan), plan
+    assert not re.search(rf'SCAN {table}\b', plan), plan
+
+
+@pytest.mark.asyncio
+async def test_listing_queries_use_indexes(seeded, async_session, statements):
+    user, admin, post = seeded
+    cases = [
+        (comments_repository.get_comments_with_authors(0, 20, async_session, post.id),
+         'comments', 'ix_comments_post_id_created_at'),
+        (posts_repository.get_user_posts(user.id, async_session), 'posts', 'ix_posts_user_id_created_at'),
+        (rates_repository.get_rate_for_image(post.id, 0, 20, admin, async_session),
+         'rates_posts', 'uq_rates_posts_photo_id_user_id'),
+        (rates_repository.get_rate_for_user(0, 20, user, async_session),
+         'rates_posts', 'ix_rates_posts_user_id_created_at'),
+        (transform_repository.get_all_transform_images(post.id, 0, 20, admin, async_session),
+         'transform_posts', 'ix_transform_posts_photo_id_created_at'),
+    ]
+    for query, table, index in cases:
+        statements.clear()
+        await query
+        assert_searched(query_plan(*statements[0]), table, index)
+
+    statements.clear()
+    await tags_repository.get_tags_for_posts([post.id], async_session)
+    assert_searched(query_plan(*statements[0]), 'post_tag', r'sqlite_autoindex_post_tag_\d')
+
+
+def test_unique_rate_and_tag(seeded):
+    with pytest.raises(IntegrityError):
+        with engine.begin() as connection:
+            connection.execute(text('INSERT INTO post_tag (post, tag) SELECT post, tag FROM post_tag LIMIT 1'))
+    with pytest.raises(IntegrityError):
+        with engine.begin() as connection:
+            connection.execute(text('INSERT INTO rates_posts (rate, photo_id, user_id) '
+                                    'SELECT rate, photo_id, user_id FROM rates_posts LIMIT 1'))
@@ -0,0 +1,98 @@
+import pytest
+from starlette.requests import Request
+
+from src.conf.config import settings
+from src.services.messages_templates import TOO_MANY_REQUESTS
+from src.services.rate_limiter import MemoryRateLimitBackend, client_ip, SqliteRateLimitBackend, get_rate_limit_backend, slide
+from src.services.urls_templates import URL_LOGIN
+
+
+def test_sliding_window():
+    counter = None
+    for _ in range(3):
+        allowed, _, counter = slide(counter, 100.0, 3, 10)
+        assert allowed
+    allowed, retry_after, counter = slide(counter, 105.0, 3, 10)
+    assert not allowed and retry_after == pytest.approx(5)
+
+    # halfway through the next window the 3 previous requests weigh 1.5
+    for _ in range(2):
+        allowed, _, counter = slide(counter, 115.0, 3, 10)
+        assert allowed
+    allowed, retry_after, counter = slide(counter, 115.0, 3, 10)
+    # until the previous requests weigh less than 1
+    assert not allowed and retry_after == pytest.approx(10 * (2 / 3) - 5)
+    # two windows later the counter is expired
+    assert slide(counter, 131.0, 3, 10)[2] == (13, 0, 1)
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_bounded():
+    backend = MemoryRateLimitBackend(max_keys=10000)
+    for i in range(20000):
+        assert (await backend.hit(f'login:ip:{i}', 5, 60))[0]
+    assert len(backend.counters) == 10000
+    assert 'login:ip:19999' in backend.counters and 'login:ip:0' not in backend.counters
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_shared(tmp_path):
+    # two worker processes sharing the same file
+    first = SqliteRateLimitBackend(str(tmp_path / 'rate_limits.sqlite3'))
+    second = SqliteRateLimitBackend(str(tmp_path / 'rate_limits.sqlite3'))
+
+    assert (await first.hit('upload:user:a', 2, 60))[0]
+    assert (await second.hit('upload:user:a', 2, 60))[0]
+    allowed, retry_after = await first.hit('upload:user:a', 2, 60)
+    assert not allowed and 0 < retry_after <= 120
+    assert (await second.hit('upload:user:b', 2, 60))[0]
+
+
+def test_get_rate_limit_backend():
+    assert get_rate_limit_backend('memory').name == 'memory'
+    with pytest.raises(ValueError):
+        get_rate_limit_backend('redis')
+
+
+def test_login_rate_limited(client, session):
+    for _ in range(10):
+        response = client.post(URL_LOGIN, data={'username': 'nobody@example.com', 'password': 'password'})
+        assert response.status_code == 401, response.text
+    response = client.post(URL_LOGIN, data={'username': 'nobody@example.com', 'password': 'password'})
+    assert response.status_code == 429, response.text
+    assert response.json()['detail'] == TOO_MANY_REQUESTS
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def request(peer: str, forwarded: str | None = None) -> Request:
+    headers = [(b'x-forwarded-for', forwarded.encode())] if forwarded is not None else []
+    return Request({'type': 'http', 'client': (peer, 50000), 'headers': headers})
+
+
+def test_client_ip_behind_proxy(monkeypatch):
+    # not behind a trusted proxy, the header is ignored
+    assert client_ip(request('203.0.113.7', '198.51.100.1')) == '203.0.113.7'
+
+    monkeypatch.setattr(settings, 'forwarded_allow_ips', '10.0.0.1, 10.0.0.2')
+    assert client_ip(request('10.0.0.1', '198.51.100.1')) == '198.51.100.1'
+    # the first address is set by the client, the proxies append the real ones
+    assert client_ip(request('10.0.0.1', '1.2.3.4, 198.51.100.1, 10.0.0.2')) == '198.51.100.1'
+    assert client_ip(request('10.0.0.1')) == '10.0.0.1'
+
+    monkeypatch.setattr(settings, 'forwarded_allow_ips', '*')
+    assert client_ip(request('10.0.0.9', '1.2.3.4, 198.51.100.1')) == '198.51.100.1'
+
+
+def test_login_rate_limited_per_forwarded_client(client, session, monkeypatch):
+    # every request comes from the router, the clients are only known by X-Forwarded-For
+    monkeypatch.setattr(settings, 'forwarded_allow_ips', 'testclient')
+    for i in range(10):
+        response = client.post(URL_LOGIN, data={'username': f'nobody{i}@example.com', 'password': 'password'},
+                               headers={'X-Forwarded-For': '198.51.100.1'})
+        assert response.status_code == 401, response.text
+    response = client.post(URL_LOGIN, data={'username': 'other@example.com', 'password': 'password'},
+                           headers={'X-Forwarded-For': '198.51.100.1'})
+    assert response.status_code == 429, response.text
+    response = client.post(URL_LOGIN, data={'username': 'other@example.com', 'password': 'password'},
+                           headers={'X-Forwarded-For': '198.51.100.2'})
+    assert response.status_code == 401, response.text
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from PIL import Image
+
+import src.repository.posts as rep_posts
+from src.database.models import User
+from src.schemas import PostCreate, PostModel
+from src.services import media_storage, renditions
+
+
+@pytest.fixture()
+def photo(tmp_path):
+    path = (tmp_path / 'photo.png').as_posix()
+    Image.new('RGBA', (2000, 1000), (200, 100, 50, 255)).save(path)
+    yield path
+    renditions.shutdown_pool()
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'renderer@example.com').first()
+    if user is None:
+        user = User(email='renderer@example.com', username='renderer', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    return user
+
+
+def test_render_renditions(photo):
+    paths = renditions.render_renditions(photo)
+
+    assert paths == [rendition['url'] for rendition in renditions.rendition_urls(photo)]
+    for rendition in renditions.rendition_urls(photo):
+        with Image.open(rendition['url']) as image:
+            assert image.size == (rendition['size'], rendition['size'] // 2)
+            assert image.format == renditions.RENDITION_FORMATS[rendition['format']][0]
+    assert not [name for name in os.listdir(os.path.dirname(photo)) if name.endswith('.tmp')]
+
+
+
+def test_rendition_source():
+    sha256 = 'ab' * 32
+    photo_url = media_storage.blob_path(sha256, '.jpg')
+    for rendition in renditions.rendition_urls(photo_url):
+        assert renditions.rendition_source(rendition['url']) == sha256
+        assert not media_storage.is_blob_path(rendition['url'])
+    assert renditions.rendition_source(photo_url) is None
+    assert renditions.rendition_source(f'{media_storage.MEDIA_ROOT}/transforms/ab/{sha256}_1.png') is None
+
+@pytest.mark.asyncio
+async def test_generate_renditions_not_an_image(tmp_path):
+    path = (tmp_path / 'broken.jpg').as_posix()
+    with open(path, 'wb') as f:
+        f.write(b'not an image')
+    assert await renditions.generate_renditions(path) is False
+    renditions.shutdown_pool()
+
+
+@pytest.mark.asyncio
+async def test_render_post_renditions(photo, current_user, async_session):
+    post = await rep_posts.create_post(PostCreate(description='Rendered', tags=[]), photo, async_session, current_user)
+    assert PostModel.from_orm(post).renditions == []
+
+    assert await rep_posts.render_post_renditions(photo, async_session) is True
+    await async_session.refresh(post)
+    assert post.renditions_ready
+    model = PostModel.from_orm(post)
+    assert [(item.size, item.format) for item in model.renditions] == \
+           [(size, ext) for size in renditions.RENDITION_SIZES for ext in renditions.RENDITION_FORMATS]
+    assert all(os.path.exists(item.url) for item in model.renditions)
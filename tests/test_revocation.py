@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from src.database.models import RevokedToken, User
+from src.repository.users import banned_user
+from src.services.auth import auth_service
+from src.services.messages_templates import TOKEN_REVOKED, USER_NOT_ACTIVE
+from src.services.urls_templates import URL_LOGIN, URL_LOGOUT, URL_RATES, URL_SIGNUP
+from src.services.revocation import BloomFilter, RevocationList, revocation_list
+from src.services.user_cache import user_cache
+from tests.conftest import TestingAsyncSessionLocal, access_token_issued_before
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'revoked@example.com').first()
+    if user is None:
+        user = User(email='revoked@example.com', username='revoked', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.fixture()
+def access_token(current_user):
+    async def create():
+        return await auth_service.create_access_token(data=auth_service.access_token_claims(current_user))
+
+    return create
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f'jti-{i}')
+
+    assert all(f'jti-{i}' in bloom for i in range(10000))
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 200
+    assert len(bloom.bits) < 10000 * 1.3
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_rejected(access_token):
+    token, other = await access_token(), await access_token()
+    payload = await auth_service.decode_access_token(token)
+    async with TestingAsyncSessionLocal() as db:
+        await revocation_list.revoke(payload['jti'], datetime.utcfromtimestamp(payload['exp']), db, payload['uid'])
+
+        with pytest.raises(HTTPException) as e:
+            await auth_service.get_current_user(token, db)
+        assert e.value.detail == TOKEN_REVOKED
+        assert (await auth_service.get_current_user(other, db)).email == 'revoked@example.com'
+
+
+@pytest.mark.asyncio
+async def test_banned_user_tokens_revoked(current_user, access_token):
+    token = access_token_issued_before(current_user)
+    async with TestingAsyncSessionLocal() as db:
+        await banned_user(current_user.id, db)
+
+    with pytest.raises(HTTPException) as e:
+        await auth_service.decode_access_token(token)
+    assert e.value.detail == TOKEN_REVOKED
+    # a token issued after the ban, even within the same second, isn't covered by it
+    revoked_at = revocation_list.entries[f'user:{current_user.id}'][0]
+    assert not revocation_list.is_revoked({'uid': current_user.id, 'iat': int(revoked_at)})
+    assert revocation_list.is_revoked({'uid': current_user.id, 'iat': int(revoked_at) - 1})
+
+    # but it doesn't authenticate the banned user
+    async with TestingAsyncSessionLocal() as db:
+        with pytest.raises(HTTPException) as e:
+            await auth_service.get_current_user(await access_token(), db)
+    assert (e.value.status_code, e.value.detail) == (403, USER_NOT_ACTIVE)
+
+
+@pytest.mark.asyncio
+async def test_sync_and_compact(current_user):
+    other_process = RevocationList(100, 0.01, session_factory=TestingAsyncSessionLocal)
+    async with TestingAsyncSessionLocal() as db:
+        await other_process.sync(db)
+        now = datetime.utcnow()
+        await revocation_list.revoke('live', now + timedelta(hours=1), db)
+        await revocation_list.revoke('expired', now + timedelta(seconds=-1), db)
+
+        await other_process.sync(db)
+        assert other_process.is_revoked({'jti': 'live'})
+        assert not other_process.is_revoked({'jti': 'expired'})
+
+        assert await revocation_list.compact(db) == 1
+        assert not revocation_list.is_revoked({'jti': 'expired'})
+        assert revocation_list.is_revoked({'jti': 'live'})
+        assert await db.scalar(select(func.count()).filter(RevokedToken.jti == 'expired')) == 0
+
+
+def test_logout(client, user):
+    response = client.post(URL_SIGNUP, json={**user, 'first_name': 'Dead', 'last_name': 'Pool'})
+    assert response.status_code == 201, response.text
+    response = client.post(URL_LOGIN, data={'username': user['email'], 'password': user['password']})
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+    headers = {'Authorization': f'Bearer {tokens["access_token"]}'}
+
+    response = client.post(URL_LOGOUT, headers=headers)
+    assert response.status_code == 204, response.text
+    response = client.post(URL_LOGOUT, headers=headers)
+    assert response.status_code == 401, response.text
+    assert response.json()['detail'] == TOKEN_REVOKED
+
+
+def test_banned_user_cannot_login(client, session):
+    response = client.post(URL_SIGNUP, json={'username': 'banned', 'email': 'banned@example.com',
+                                             'password': '123456789', 'first_name': 'Banned', 'last_name': 'User'})
+    assert response.status_code == 201, response.text
+    response = client.post(URL_LOGIN, data={'username': 'banned@example.com', 'password': '123456789'})
+    assert response.status_code == 200, response.text
+    headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+    assert client.get(URL_RATES, headers=headers).status_code == 200
+
+    user = session.query(User).filter(User.email == 'banned@example.com').first()
+    user.is_active = False
+    session.commit()
+    user_cache.clear()
+
+    response = client.post(URL_LOGIN, data={'username': 'banned@example.com', 'password': '123456789'})
+    assert response.status_code == 403, response.text
+    assert response.json()['detail'] == USER_NOT_ACTIVE
+    # the token issued before is rejected, although the ban was made without revoking it
+    assert client.get(URL_RATES, headers=headers).status_code == 403
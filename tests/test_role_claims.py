@@ -0,0 +1,101 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import object_session
+
+from src.database.models import User
+from src.repository.users import update_user_as_admin
+from src.schemas import UserUpdate
+from src.services.auth import auth_service
+from src.services.roles import RoleChecker
+from src.services.revocation import revocation_list
+from src.services.user_cache import UserCache, user_cache
+from tests.conftest import TestingAsyncSessionLocal, access_token_issued_before
+
+
+@pytest.fixture()
+def admin(session):
+    user = session.query(User).filter(User.email == 'claims@example.com').first()
+    if user is None:
+        user = User(email='claims@example.com', username='claims', password='testtest', user_role='Admin')
+        session.add(user)
+    else:
+        # banned by a previous test through another session
+        session.refresh(user)
+    user.is_active = True
+    user.user_role = 'Admin'
+    user.token_version = 0
+    session.commit()
+    user_cache.clear()
+    return user
+
+
+async def authorize(token, allowed_roles, statements):
+    statements.clear()
+    async with TestingAsyncSessionLocal() as db:
+        claims = await auth_service.get_token_claims(token, db)
+    RoleChecker(allowed_roles)(claims)
+    return list(statements)
+
+
+@pytest.mark.asyncio
+async def test_role_checker_without_queries(admin, statements):
+    token = await auth_service.create_access_token(data=auth_service.access_token_claims(admin))
+
+    assert await authorize(token, ['Admin'], statements) == []
+    with pytest.raises(HTTPException) as e:
+        await authorize(token, ['Moderator'], statements)
+    assert e.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_stale_claims_read_from_database(admin, statements):
+    token = await auth_service.create_access_token(data=auth_service.access_token_claims(admin))
+    # e.g. the role changed in another transaction of this process
+    admin.token_version = 1
+    admin.user_role = 'Moderator'
+    session = object_session(admin)
+    session.commit()
+    user_cache.set_version(admin.id, 1)
+
+    # the token still says Admin, but its version is older than the one of the user
+    assert await authorize(token, ['Moderator'], statements) != []
+    with pytest.raises(HTTPException) as e:
+        await authorize(token, ['Admin'], statements)
+    assert e.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_role_change_revokes_tokens_in_every_process(admin, statements):
+    token = access_token_issued_before(admin)
+    body = UserUpdate(username='claims', first_name='Claims', last_name='Admin', email='claims@example.com', is_active=True,
+                      user_role='Moderator')
+    async with TestingAsyncSessionLocal() as db:
+        await update_user_as_admin(body, admin, db)
+
+    # another worker process (or this one after a restart) doesn't know the version of the user,
+    # it syncs the revocation of its tokens
+    user_cache.clear()
+    revocation_list.clear()
+    async with TestingAsyncSessionLocal() as db:
+        await revocation_list.sync(db)
+    with pytest.raises(HTTPException) as e:
+        await authorize(token, ['Admin'], statements)
+    assert e.value.status_code == 401
+
+
+def test_versions_bounded():
+    cache = UserCache(ttl=60, max_size=2)
+    for user_id in range(3):
+        cache.set_version(user_id, 1)
+    assert list(cache.versions) == [1, 2]
+    assert not cache.is_stale(0, 0)
+
+
+@pytest.mark.asyncio
+async def test_token_without_claims(admin, statements):
+    token = await auth_service.create_access_token(data={'sub': 'claims@example.com'})
+
+    assert await authorize(token, ['Admin'], statements) != []
+    with pytest.raises(HTTPException) as e:
+        await authorize(token, ['User'], statements)
+    assert e.value.status_code == 403
@@ -0,0 +1,77 @@
+import pytest
+
+from src.database.models import User
+from src.repository import posts as rep_posts
+from src.repository import tags as rep_tags
+from src.schemas import PostCreate
+from src.services.auth import auth_service
+from src.services.tag_index import TagIndex, tag_index
+from src.services.urls_templates import URL_TAGS_SUGGEST
+
+
+@pytest.fixture()
+def author(session):
+    user = session.query(User).filter(User.email == 'tagger@example.com').first()
+    if user is None:
+        user = User(email='tagger@example.com', username='tagger', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    return user
+
+
+def test_tag_index_ranks_by_usage():
+    index = TagIndex()
+    index.load([('Sunset', 3), ('sunrise', 5), ('sun', 1), ('summer', 9), ('moon', 7)])
+    assert index.suggest('sun') == [('sunrise', 5), ('Sunset', 3), ('sun', 1)]
+    assert index.suggest('SU', 2) == [('summer', 9), ('sunrise', 5)]
+    assert index.suggest('x') == []
+
+    # the cached short prefixes follow the changes
+    index.update('sun', 10)
+    index.add('surf')
+    index.update('surf', 20)
+    assert index.suggest('su', 3) == [('surf', 20), ('sun', 11), ('summer', 9)]
+    index.update('surf', -25)
+    assert index.suggest('su', 3) == [('sun', 11), ('summer', 9), ('sunrise', 5)]
+
+
+@pytest.mark.asyncio
+async def test_tag_counts_follow_posts(author, async_session):
+    await rep_tags.create_tag('alpine', author, async_session)
+    assert rep_tags.suggest_tags('alp', 10) == [{'tag': 'alpine', 'count': 0}]
+
+    first = await rep_posts.create_post(PostCreate(description='Peak', tags=['alpine', 'alps']), 'media/peak.jpg',
+                                        async_session, author)
+    second = await rep_posts.create_post(PostCreate(description='Lake', tags=['alps']), 'media/lake.jpg',
+                                         async_session, author)
+    assert rep_tags.suggest_tags('alp', 10) == [{'tag': 'alps', 'count': 2}, {'tag': 'alpine', 'count': 1}]
+
+    await rep_posts.update_post(first.id, PostCreate(description='Peak', tags=['alpine']), async_session, author)
+    await rep_posts.remove_post(second.id, async_session)
+    assert rep_tags.suggest_tags('alp', 10) == [{'tag': 'alpine', 'count': 1}, {'tag': 'alps', 'count': 0}]
+
+    # counts of a rolled back transaction are discarded
+    await rep_tags.get_tags_list(['alpaca'], author, async_session)
+    await async_session.rollback()
+    assert 'alpaca' not in tag_index.counts
+
+    tag_index.clear()
+    await rep_tags.load_tag_index(async_session)
+    assert rep_tags.suggest_tags('alp', 10) == [{'tag': 'alpine', 'count': 1}, {'tag': 'alps', 'count': 0}]
+
+
+@pytest.mark.asyncio
+async def test_suggest_route(author, client):
+    tag_index.load([('river', 4), ('riverside', 2), ('road', 8)])
+    token = await auth_service.create_access_token(data=auth_service.access_token_claims(author))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get(URL_TAGS_SUGGEST, params={'prefix': 'r', 'limit': 2}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == [{'tag': 'road', 'count': 8}, {'tag': 'river', 'count': 4}]
+    response = client.get(URL_TAGS_SUGGEST, params={'prefix': 'RIVERS'}, headers=headers)
+    assert response.json() == [{'tag': 'riverside', 'count': 2}]
+
+    assert client.get(URL_TAGS_SUGGEST, params={'prefix': ''}, headers=headers).status_code == 422
+    assert client.get(URL_TAGS_SUGGEST, params={'prefix': 'r'}).status_code == 401
@@ -1,7 +1,7 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, Tag
 from src.repository.tags import get_tag_by_name, create_tag, get_tags_list
@@ -10,7 +10,7 @@ from src.schemas import TagCreate, TagBase
 
 class TestTag(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
         self.user_mock = User(id=1)
 
     async def test_get_tag_by_name(self):
@@ -21,18 +21,18 @@ class TestTag(unittest.IsolatedAsyncioTestCase):
             tag=tag_name
         )
 
-        self.session.query(Tag).filter().first.return_value = tag
-        result = get_tag_by_name(tag_name=tag_name, db=self.session)
+        self.session.scalar.return_value = tag
+        result = await get_tag_by_name(tag_name=tag_name, db=self.session)
         self.assertEqual(result.tag, tag_name)
 
     async def test_get_tag_by_name_not_found(self):
-        self.session.query(Tag).filter().first.return_value = None
-        result = get_tag_by_name(tag_name="", db=self.session)
+        self.session.scalar.return_value = None
+        result = await get_tag_by_name(tag_name="", db=self.session)
         self.assertIsNone(result)
 
     async def test_create_tag(self):
         tag_name = "test"
-        result = create_tag(tag_name=tag_name, user=self.user_mock, db=self.session)
+        result = await create_tag(tag_name=tag_name, user=self.user_mock, db=self.session)
         self.assertEqual(tag_name, result.tag)
         self.assertTrue(hasattr(result, "id"))
 
@@ -44,9 +44,9 @@ class TestTag(unittest.IsolatedAsyncioTestCase):
             tag=tag_name
         )
 
-        self.session.query(Tag).filter().first.return_value = tag
+        self.session.scalars.return_value.all = MagicMock(return_value=[tag])
 
-        result = get_tags_list(tags=tags, user=self.user_mock, db=self.session)
+        result = await get_tags_list(tags=tags, user=self.user_mock, db=self.session)
         self.assertEqual(len(result), 1)
         self.assertEqual(tag_name, result[0].tag)
 
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, func
+
+from src.database.models import User, Tag
+from src.repository.tags import get_tags_list
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'tagger@example.com').first()
+    if user is None:
+        user = User(email='tagger@example.com', username='tagger', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_bulk(current_user, async_session, statements):
+    tags = await get_tags_list(['bulk1', 'bulk2', 'bulk3', 'bulk4', 'bulk5'], current_user, async_session)
+    await async_session.commit()
+    # lookup, multi-row insert, lookup of the inserted tags
+    assert len(statements) == 3
+    assert [tag.tag for tag in tags] == ['bulk1', 'bulk2', 'bulk3', 'bulk4', 'bulk5']
+    assert all(tag.id for tag in tags)
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_existing_and_duplicates(current_user, async_session):
+    first = await get_tags_list(['reuse1'], current_user, async_session)
+    await async_session.commit()
+    tags = await get_tags_list(['reuse2', 'reuse1', 'reuse2'], current_user, async_session)
+    await async_session.commit()
+    assert [tag.tag for tag in tags] == ['reuse2', 'reuse1']
+    assert tags[1].id == first[0].id
+
+
+@pytest.mark.asyncio
+async def test_get_tags_list_concurrent(current_user, session):
+    async def upload():
+        async with TestingAsyncSessionLocal() as db:
+            tags = await get_tags_list(['race1', 'race2'], current_user, db)
+            await db.commit()
+            return [tag.id for tag in tags]
+
+    first, second = await asyncio.gather(upload(), upload())
+    assert first == second
+    assert session.scalar(select(func.count(Tag.id)).filter(Tag.tag.in_(['race1', 'race2']))) == 2
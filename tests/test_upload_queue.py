@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import select
+
+import src.repository.posts as rep_posts
+from src.database.models import User, Post
+from src.schemas import PostCreate, CdnStatus
+from src.services import cloudynary
+from src.services.job_queue import JobQueue
+from src.services.upload_queue import UploadWorker, UPLOAD_JOB
+from tests.conftest import TestingAsyncSessionLocal
+
+
+class FailingBackend:
+    def upload(self, image_url: str, public_id: str) -> None:
+        raise ConnectionError('CDN is down')
+
+
+@pytest.fixture()
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2, backoff=0)
+
+
+@pytest.fixture()
+def backend(tmp_path, monkeypatch):
+    backend = cloudynary.MemoryUploadBackend()
+    monkeypatch.setattr(cloudynary, 'upload_backend', backend)
+    monkeypatch.setattr(cloudynary, 'upload_registry', cloudynary.UploadRegistry(str(tmp_path / 'uploads.sqlite3')))
+    yield backend
+    cloudynary.shutdown_pool()
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'queue@example.com').first()
+    if user is None:
+        user = User(email='queue@example.com', username='queue', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    return user
+
+
+def test_job_queue_retries(queue):
+    job_id = queue.enqueue('test', {'n': 1})
+    job, = queue.claim(10)
+    assert (job.id, job.kind, job.payload, job.attempts) == (job_id, 'test', {'n': 1}, 1)
+    # leased jobs are not claimed twice
+    assert queue.claim(10) == []
+
+    assert queue.fail(job, 'error') is True
+    job, = queue.claim(10)
+    assert job.attempts == 2
+    assert queue.fail(job, 'error') is False
+    assert queue.status(job_id) == 'failed'
+    assert queue.claim(10) == []
+
+
+def test_job_queue_lease_expired(queue):
+    queue.lease = 0
+    job_id = queue.enqueue('test', {})
+    queue.claim(10)
+    # the worker died: the job is claimed again
+    job, = queue.claim(10)
+    queue.complete(job)
+    assert queue.status(job_id) == 'done'
+    assert queue.purge(-1) == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_worker(queue, backend, current_user, async_session, tmp_path):
+    photo = (tmp_path / 'photo.jpg').as_posix()
+    with open(photo, 'wb') as f:
+        f.write(b'photo')
+    post = await rep_posts.create_post(PostCreate(description='Queued', tags=[]), photo, async_session, current_user,
+                                       CdnStatus.pending)
+    assert post.cdn_status == CdnStatus.pending
+    queue.enqueue(UPLOAD_JOB, {'photo_url': photo})
+
+    worker = UploadWorker(queue, TestingAsyncSessionLocal, concurrency=2)
+    assert await worker.run_once() == 1
+
+    assert cloudynary.get_public_id(photo) in backend.uploads
+    cdn_status = await async_session.scalar(select(Post.cdn_status).filter(Post.id == post.id))
+    assert cdn_status == CdnStatus.uploaded
+
+
+@pytest.mark.asyncio
+async def test_upload_worker_failed(queue, backend, current_user, async_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(cloudynary, 'upload_backend', FailingBackend())
+    photo = (tmp_path / 'broken.jpg').as_posix()
+    with open(photo, 'wb') as f:
+        f.write(b'broken')
+    post = await rep_posts.create_post(PostCreate(description='Failing', tags=[]), photo, async_session, current_user,
+                                       CdnStatus.pending)
+    job_id = queue.enqueue(UPLOAD_JOB, {'photo_url': photo})
+
+    worker = UploadWorker(queue, TestingAsyncSessionLocal)
+    await worker.run_once()
+    cdn_status = await async_session.scalar(select(Post.cdn_status).filter(Post.id == post.id))
+    assert cdn_status == CdnStatus.pending
+    await worker.run_once()
+
+    assert queue.status(job_id) == 'failed'
+    cdn_status = await async_session.scalar(select(Post.cdn_status).filter(Post.id == post.id))
+    assert cdn_status == CdnStatus.failed
+
+
+@pytest.mark.asyncio
+async def test_upload_worker_purges_finished_jobs(queue):
+    done, failed, running = (queue.enqueue('test', {}) for _ in range(3))
+    jobs = {job.id: job for job in queue.claim(3)}
+    queue.complete(jobs[done])
+    queue.max_attempts = 1
+    queue.fail(jobs[failed], 'error')
+
+    worker = UploadWorker(queue, TestingAsyncSessionLocal, retention=-1, purge_interval=3600)
+    assert await worker.purge() == 2
+    assert [queue.status(job_id) for job_id in (done, failed, running)] == [None, None, 'running']
+    # not again before purge_interval
+    queue.enqueue('test', {})
+    assert await worker.purge() == 0
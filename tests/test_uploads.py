@@ -0,0 +1,31 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from src.services.uploads import save_upload
+
+
+@pytest.mark.asyncio
+async def test_save_upload(tmp_path):
+    content = os.urandom(200 * 1024 + 7)
+    file_path = str(tmp_path / 'photo.jpg')
+    saved = await save_upload(UploadFile(io.BytesIO(content), filename='photo.jpg'), file_path, max_size=len(content),
+                              chunk_size=4096)
+    assert saved.size == len(content)
+    assert saved.sha256 == hashlib.sha256(content).hexdigest()
+    with open(file_path, 'rb') as f:
+        assert f.read() == content
+
+
+@pytest.mark.asyncio
+async def test_save_upload_too_large(tmp_path):
+    content = b'x' * 10000
+    file_path = str(tmp_path / 'photo.jpg')
+    with pytest.raises(HTTPException) as error:
+        await save_upload(UploadFile(io.BytesIO(content), filename='photo.jpg'), file_path, max_size=5000,
+                          chunk_size=1024)
+    assert error.value.status_code == 413
+    assert not os.path.exists(file_path)
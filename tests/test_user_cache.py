@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import select
+
+from src.database.models import User
+from src.repository.users import update_token
+from src.services.auth import auth_service
+from src.services.user_cache import UserCache, user_cache
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture()
+def current_user(session):
+    user = session.query(User).filter(User.email == 'cached@example.com').first()
+    if user is None:
+        user = User(email='cached@example.com', username='cached', password='testtest', user_role='User')
+        session.add(user)
+        session.commit()
+    user_cache.clear()
+    return user
+
+
+@pytest.fixture()
+def access_token():
+    async def create():
+        return await auth_service.create_access_token(data={'sub': 'cached@example.com'})
+
+    return create
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_cached(current_user, access_token, statements):
+    token = await access_token()
+    stats = user_cache.stats()
+    async with TestingAsyncSessionLocal() as db:
+        first = await auth_service.get_current_user(token, db)
+    statements.clear()
+    async with TestingAsyncSessionLocal() as db:
+        again = await auth_service.get_current_user(token, db)
+        assert again in db
+
+    assert statements == []
+    assert (again.id, again.email, again.username) == (first.id, first.email, first.username)
+    assert user_cache.hits == stats['hits'] + 1
+    assert user_cache.misses == stats['misses'] + 1
+
+
+@pytest.mark.asyncio
+async def test_cached_user_changes_committed(current_user, access_token):
+    token = await access_token()
+    async with TestingAsyncSessionLocal() as db:
+        await auth_service.get_current_user(token, db)
+    async with TestingAsyncSessionLocal() as db:
+        user = await auth_service.get_current_user(token, db)
+        await update_token(user, 'refresh', db)
+
+    # update_token invalidated the cache entry
+    assert user_cache.stats()['size'] == 0
+    async with TestingAsyncSessionLocal() as db:
+        assert await db.scalar(select(User.refresh_token).filter(User.id == current_user.id)) == 'refresh'
+        user = await auth_service.get_current_user(token, db)
+        assert user.refresh_token == 'refresh'
+
+
+@pytest.mark.asyncio
+async def test_user_cache_ttl_and_size(current_user, monkeypatch):
+    cache = UserCache(ttl=10, max_size=2)
+    clock = [100.0]
+    monkeypatch.setattr('src.services.user_cache.time.monotonic', lambda: clock[0])
+    async with TestingAsyncSessionLocal() as db:
+        user = await db.scalar(select(User).filter(User.id == current_user.id))
+        for email in ('a@example.com', 'b@example.com', 'c@example.com'):
+            cache.set(email, user)
+        assert list(cache.entries) == ['b@example.com', 'c@example.com']
+
+    async with TestingAsyncSessionLocal() as db:
+        assert (await cache.get('c@example.com', db)).id == current_user.id
+        clock[0] += 11
+        assert await cache.get('c@example.com', db) is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from src.services import media_storage, qrcodes
+
+
+@pytest.fixture()
+def renders(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    monkeypatch.setattr(qrcodes, '_cache', qrcodes.OrderedDict())
+    calls = []
+    render = qrcodes.render_qrcode
+
+    def counting_render(data, image_format):
+        calls.append((data, image_format))
+        return render(data, image_format)
+
+    monkeypatch.setattr(qrcodes, 'render_qrcode', counting_render)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_get_qrcode_rendered_once(renders, monkeypatch):
+    first = await qrcodes.get_qrcode('https://example.com/a.jpg', 'png')
+    again = await qrcodes.get_qrcode('https://example.com/a.jpg', 'png')
+    svg = await qrcodes.get_qrcode('https://example.com/a.jpg', 'svg')
+
+    assert again is first
+    assert first.content.startswith(b'\x89PNG') and first.media_type == 'image/png'
+    assert svg.content.startswith(b'<svg') and svg.media_type == 'image/svg+xml'
+    assert svg.etag != first.etag
+    assert len(renders) == 2
+
+    # a new process finds the rendered QR code in the media store
+    monkeypatch.setattr(qrcodes, '_cache', qrcodes.OrderedDict())
+    assert await qrcodes.get_qrcode('https://example.com/a.jpg', 'png') == first
+    assert len(renders) == 2
+    assert not [name for _, _, names in os.walk(media_storage.MEDIA_ROOT) for name in names if name.endswith('.tmp')]
+
+
+@pytest.mark.asyncio
+async def test_get_qrcode_memory_lru(renders, monkeypatch):
+    monkeypatch.setattr(qrcodes.settings, 'qrcode_cache_items', 2)
+    for name in ('a', 'b', 'c'):
+        await qrcodes.get_qrcode(name)
+    assert list(qrcodes._cache) == [('b', 'png'), ('c', 'png')]
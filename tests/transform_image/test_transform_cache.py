@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from src.schemas_transform_posts import TransformImageModel
+from src.services import media_storage, transform_engine
+from src.services.transform_cache import TransformCache
+from src.services.transform_posts import create_list_transformation, transformation_signature
+
+
+@pytest.fixture()
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    cache = TransformCache(f'{tmp_path.as_posix()}/{transform_engine.TRANSFORMS_DIR}', 1000, 2)
+    monkeypatch.setattr(transform_engine, 'transform_cache', cache)
+    return cache
+
+
+class CountingEngine:
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    async def transform(self, image_url, transform_list):
+        self.calls += 1
+        return f'https://example.com/{image_url}/{self.calls}'
+
+
+def write(path: str, size: int) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return path
+
+
+def test_signature_canonical():
+    body = TransformImageModel(resize={'width': 100, 'height': 50, 'crop': 'scale', 'gravity': 'center'},
+                               rotate={'degree': 360}, radius={'all': 0})
+    assert create_list_transformation(body) == [{'height': 50, 'width': 100}]
+    assert transformation_signature([{'width': 100, 'height': 50}]) == \
+           transformation_signature([{'height': 50, 'width': 100, 'crop': 'scale', 'background': None}])
+    assert transformation_signature([{'angle': 90}, {'effect': 'negate:0'}]) != \
+           transformation_signature([{'effect': 'negate:0'}, {'angle': 90}])
+
+
+@pytest.mark.asyncio
+async def test_memory_tier(cache, monkeypatch):
+    engine = CountingEngine()
+    monkeypatch.setattr(transform_engine, 'transform_engine', engine)
+
+    first = await transform_engine.transform('media/a.jpg', [{'width': 100, 'crop': 'scale'}])
+    start = time.perf_counter()
+    again = await transform_engine.transform('media/a.jpg', [{'width': 100}])
+    assert time.perf_counter() - start < 0.001
+    assert again == first
+    assert engine.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    await transform_engine.transform('media/b.jpg', [{'width': 100}])
+    await transform_engine.transform('media/c.jpg', [{'width': 100}])
+    # the least recently used entry left the memory tier
+    await transform_engine.transform('media/a.jpg', [{'width': 100}])
+    assert engine.calls == 4
+
+
+def test_disk_tier_lru_by_bytes(cache):
+    first = write(f'{cache.root}/aa/first.png', 400)
+    second = write(f'{cache.root}/bb/second.png', 400)
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+
+    assert cache.use_file(first)
+    third = write(f'{cache.root}/cc/third.png', 400)
+    cache.add_file(third)
+
+    assert cache.size == 800
+    assert os.path.exists(first) and os.path.exists(third)
+    assert not os.path.exists(second)
+    assert not cache.use_file(second)
+
+
+@pytest.mark.asyncio
+async def test_local_engine_uses_disk_tier(cache, tmp_path, monkeypatch):
+    original = (tmp_path / 'original.png').as_posix()
+    Image.new('RGB', (64, 64), (1, 2, 3)).save(original)
+    engine = transform_engine.LocalTransformEngine()
+    monkeypatch.setattr(transform_engine, 'transform_engine', engine)
+    try:
+        url = await transform_engine.transform(original, [{'width': 32, 'height': 32}])
+        cache.memory.clear()
+        mtime = os.path.getmtime(url)
+        os.utime(url, (mtime - 10, mtime - 10))
+        assert await transform_engine.transform(original, [{'height': 32, 'width': 32}]) == url
+        # served from the disk tier and marked as used, not rendered again
+        assert os.path.getmtime(url) > mtime - 10
+        assert list(cache.files) == [url]
+    finally:
+        engine.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_local_engine_disk_tier_off_event_loop(cache, monkeypatch):
+    threads = []
+    use_file = cache.use_file
+
+    def record(path):
+        threads.append(threading.current_thread())
+        return use_file(path)
+
+    monkeypatch.setattr(cache, 'use_file', record)
+    write(transform_engine.transform_path('media/a.jpg', [{'width': 100}]), 10)
+
+    url = await transform_engine.LocalTransformEngine().transform('media/a.jpg', [{'width': 100}])
+
+    assert url in cache.files
+    # the directory walk and the utime of the disk tier don't block the event loop
+    assert threads and threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_saved_transformation_outlives_eviction(cache, monkeypatch):
+    url = write(transform_engine.transform_path('media/a.jpg', [{'width': 100}]), 600)
+    cache.add_file(url)
+
+    saved = await transform_engine.save_transformation(url)
+    assert saved.startswith(f'{media_storage.MEDIA_ROOT}/{transform_engine.SAVED_TRANSFORMS_DIR}/')
+    cache.add_file(write(transform_engine.transform_path('media/b.jpg', [{'width': 100}]), 600))
+
+    assert not os.path.exists(url)
+    assert os.path.getsize(saved) == 600
+    assert await transform_engine.save_transformation(url) == saved
+    assert await transform_engine.save_transformation('https://example.com/a.jpg') == 'https://example.com/a.jpg'
+    assert await transform_engine.save_transformation(f'{cache.root}/../../a.jpg') is None
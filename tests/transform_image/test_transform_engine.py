@@ -0,0 +1,111 @@
+import os
+
+import pytest
+from PIL import Image
+
+from src.schemas_transform_posts import TransformImageModel
+from src.services import transform_engine, media_storage
+from src.services.transform_cache import TransformCache
+from src.services.transform_posts import create_list_transformation
+
+
+@pytest.fixture()
+def image():
+    image = Image.new('RGB', (400, 200), (200, 100, 50))
+    image.paste((10, 20, 30), (0, 0, 200, 200))
+    return image
+
+
+@pytest.fixture()
+def local_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    cache = TransformCache(f'{tmp_path.as_posix()}/{transform_engine.TRANSFORMS_DIR}', 1024 * 1024, 16)
+    monkeypatch.setattr(transform_engine, 'transform_cache', cache)
+    engine = transform_engine.LocalTransformEngine()
+    monkeypatch.setattr(transform_engine, 'transform_engine', engine)
+    yield engine
+    engine.shutdown()
+
+
+def transform(image: Image.Image, body: dict) -> Image.Image:
+    return transform_engine.apply_transformations(image, create_list_transformation(TransformImageModel(**body)))
+
+
+@pytest.mark.parametrize('crop, size', [('scale', (100, 100)), ('fit', (100, 50)), ('fill', (100, 100)),
+                                        ('pad', (100, 100)), ('crop', (100, 100))])
+def test_resize(image, crop, size):
+    result = transform(image, {'resize': {'width': 100, 'height': 100, 'crop': crop, 'gravity': 'west'}})
+    assert result.size == size
+
+
+def test_crop_gravity(image):
+    west = transform(image, {'resize': {'width': 100, 'height': 100, 'crop': 'crop', 'gravity': 'west'}})
+    east = transform(image, {'resize': {'width': 100, 'height': 100, 'crop': 'crop', 'gravity': 'east'}})
+    assert west.getpixel((50, 50)) == (10, 20, 30)
+    assert east.getpixel((50, 50)) == (200, 100, 50)
+
+
+def test_rotate_clockwise(image):
+    result = transform(image, {'rotate': {'degree': 90}})
+    assert result.size == (200, 400)
+    # the left half of the original ends up on top
+    assert result.getpixel((100, 50)) == (10, 20, 30)
+
+
+def test_radius(image):
+    result = transform(image, {'radius': {'all': 50}})
+    assert result.mode == 'RGBA'
+    assert result.getpixel((0, 0))[3] == 0
+    assert result.getpixel((200, 100))[3] == 255
+    corners = transform(image, {'radius': {'left_top': 50}})
+    assert corners.getpixel((0, 0))[3] == 0
+    assert corners.getpixel((399, 0))[3] == 255
+
+
+def test_effects(image):
+    gray = transform(image, {'simple_effect': [{'effect': 'grayscale', 'strength': 100}]})
+    r, g, b = gray.getpixel((300, 100))
+    assert r == g == b
+    negative = transform(image, {'simple_effect': [{'effect': 'negative', 'strength': 100}]})
+    assert negative.getpixel((300, 100)) == (55, 155, 205)
+    darker = transform(image, {'contrast_effect': [{'effect': 'brightness', 'level': -50}]})
+    assert darker.getpixel((300, 100)) == (100, 50, 25)
+
+
+def test_unsupported(image):
+    with pytest.raises(transform_engine.UnsupportedTransformation):
+        transform(image, {'art_effect': {'effect': 'al_dente'}})
+
+
+@pytest.mark.asyncio
+async def test_local_engine(image, local_engine, tmp_path):
+    original = (tmp_path / 'original.jpg').as_posix()
+    image.save(original)
+    transform_list = [{'width': 100, 'height': 50, 'crop': 'fill'}, {'radius': 10}]
+
+    url = await local_engine.transform(original, transform_list)
+
+    assert url == transform_engine.transform_path(original, transform_list)
+    assert url.startswith(f'{media_storage.MEDIA_ROOT}/{transform_engine.TRANSFORMS_DIR}/')
+    with Image.open(url) as result:
+        assert result.format == 'JPEG'
+        assert result.size == (100, 50)
+        # the transparent corners are flattened on the background
+        assert min(result.getpixel((0, 0))) > 240
+    assert not [name for name in os.listdir(os.path.dirname(url)) if name.endswith('.tmp')]
+
+
+def test_size_limit():
+    with pytest.raises(ValueError):
+        TransformImageModel(resize={'width': 100000, 'height': 100000})
+    assert TransformImageModel(resize={'width': 0.5, 'height': 4096}).resize.width == 0.5
+
+
+@pytest.mark.asyncio
+async def test_local_engine_invalid_image(local_engine, tmp_path):
+    original = (tmp_path / 'original.jpg').as_posix()
+    with open(original, 'wb') as f:
+        f.write(b'not an image')
+
+    with pytest.raises(transform_engine.InvalidImage):
+        await local_engine.transform(original, [{'width': 100}])
@@ -51,92 +51,92 @@ def post(current_user, session):
 
 
 @pytest.mark.asyncio
-async def test_get_image_for_transform(current_user, post, session):
-    response = await rep_transform.get_image_for_transform(post.id, current_user, session)
+async def test_get_image_for_transform(current_user, post, async_session):
+    response = await rep_transform.get_image_for_transform(post.id, current_user, async_session)
     assert response == post.photo_url
 
 
 @pytest.mark.asyncio
-async def test_get_image_for_transform_not_found(current_user, session):
-    response = await rep_transform.get_image_for_transform(9999, current_user, session)
+async def test_get_image_for_transform_not_found(current_user, async_session):
+    response = await rep_transform.get_image_for_transform(9999, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_set_transform_image(post, current_user, session):
+async def test_set_transform_image(post, current_user, async_session):
     url = 'https://res.cloudinary.com/drilpksk7/image/upload/e_grayscale:100/v1/media/test.jpg'
-    response = await rep_transform.set_transform_image(post.id, url, current_user, session)
+    response = await rep_transform.set_transform_image(post.id, url, current_user, async_session)
     assert response.photo_url == url
     assert response.photo_id == post.id
 
 
 @pytest.mark.asyncio
-async def test_set_transform_image_not_found(post, current_user, session):
+async def test_set_transform_image_not_found(post, current_user, async_session):
     url = 'https://res.cloudinary.com/drilpksk7/image/upload/e_grayscale:100/v1/media/test.jpg'
-    response = await rep_transform.set_transform_image(999, url, current_user, session)
+    response = await rep_transform.set_transform_image(999, url, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_get_transform_image(post, current_user, session):
+async def test_get_transform_image(post, current_user, session, async_session):
     t_post = session.query(TransformPosts).first()
-    response = await rep_transform.get_transform_image(t_post.id, current_user, session)
+    response = await rep_transform.get_transform_image(t_post.id, current_user, async_session)
     assert response.id == t_post.id
     assert response.photo_url == t_post.photo_url
 
 
 @pytest.mark.asyncio
-async def test_get_transform_image_not_found(current_user, session):
-    response = await rep_transform.get_transform_image(999, current_user, session)
+async def test_get_transform_image_not_found(current_user, async_session):
+    response = await rep_transform.get_transform_image(999, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_get_all_transform_images(post, current_user, session):
+async def test_get_all_transform_images(post, current_user, session, async_session):
     t_post = session.query(TransformPosts).first()
     l_post = session.query(TransformPosts).filter(TransformPosts.photo_id == t_post.id).all()
-    response = await rep_transform.get_all_transform_images(post.id, 0, 20, current_user, session)
-    assert response == l_post
+    response = await rep_transform.get_all_transform_images(post.id, 0, 20, current_user, async_session)
+    assert [item.id for item in response] == [item.id for item in l_post]
 
 
 @pytest.mark.asyncio
-async def test_get_all_transform_images_not_found(current_user, session):
-    response = await rep_transform.get_all_transform_images(999, 0, 20, current_user, session)
+async def test_get_all_transform_images_not_found(current_user, async_session):
+    response = await rep_transform.get_all_transform_images(999, 0, 20, current_user, async_session)
     assert response == []
 
 
 
 @pytest.mark.asyncio
-async def test_remove_transform_image(current_user, session):
+async def test_remove_transform_image(current_user, session, async_session):
     t_post = session.query(TransformPosts).first()
-    response = await rep_transform.remove_transform_image(t_post.id, current_user, session)
+    response = await rep_transform.remove_transform_image(t_post.id, current_user, async_session)
     assert response.id == t_post.id
     assert response.photo_url == t_post.photo_url
 
 
 @pytest.mark.asyncio
-async def test_remove_transform_image(admin_user, session):
+async def test_remove_transform_image(admin_user, session, async_session):
     t_post = session.query(TransformPosts).first()
-    response = await rep_transform.remove_transform_image(t_post.id, admin_user, session)
+    response = await rep_transform.remove_transform_image(t_post.id, admin_user, async_session)
     assert response.id == t_post.id
     assert response.photo_url == t_post.photo_url
 
 
 @pytest.mark.asyncio
-async def test_remove_transform_image_not_found(current_user, session):
-    response = await rep_transform.remove_transform_image(999, current_user, session)
+async def test_remove_transform_image_not_found(current_user, async_session):
+    response = await rep_transform.remove_transform_image(999, current_user, async_session)
     assert response is None
 
 
 @pytest.mark.asyncio
-async def test_get_all_transform_images_for_user(current_user, session):
+async def test_get_all_transform_images_for_user(current_user, session, async_session):
     l_post = session.query(TransformPosts).all()
-    response = await rep_transform.get_all_transform_images_for_user(0, 20, current_user, session)
-    assert response == l_post
+    response = await rep_transform.get_all_transform_images_for_user(0, 20, current_user, async_session)
+    assert [item.id for item in response] == [item.id for item in l_post]
 
 
 @pytest.mark.asyncio
-async def test_get_all_transform_images_for_user_as_admin(admin_user, session):
+async def test_get_all_transform_images_for_user_as_admin(admin_user, session, async_session):
     l_post = session.query(TransformPosts).all()
-    response = await rep_transform.get_all_transform_images_for_user(0, 20, admin_user, session)
-    assert response == l_post
+    response = await rep_transform.get_all_transform_images_for_user(0, 20, admin_user, async_session)
+    assert [item.id for item in response] == [item.id for item in l_post]
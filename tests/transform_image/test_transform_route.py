@@ -1,7 +1,11 @@
+import os
+
 import pytest
 
 from src.database.models import Post, User
-from src.services.messages_templates import NOT_FOUND
+from src.services import media_storage, transform_engine
+from src.services.transform_cache import TransformCache
+from src.services.messages_templates import NOT_FOUND, UNSUPPORTED_TRANSFORMATION
 
 
 @pytest.fixture()
@@ -121,6 +125,35 @@ def test_transformation_for_image_blur(post_id, client, token):
     assert data.get('url') is not None
 
 
+@pytest.fixture()
+def local_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    cache = TransformCache(f'{tmp_path.as_posix()}/{transform_engine.TRANSFORMS_DIR}', 1024 * 1024, 16)
+    monkeypatch.setattr(transform_engine, 'transform_cache', cache)
+    engine = transform_engine.LocalTransformEngine()
+    monkeypatch.setattr(transform_engine, 'transform_engine', engine)
+    yield engine
+    engine.shutdown()
+
+
+def test_transformation_for_image_local(post_id, client, token, local_engine):
+    transformation = {"simple_effect": [{"effect": "grayscale", "strength": 100}], "rotate": {"degree": 90}}
+    response = client.post(f'/api/image/transform/{post_id}', json=transformation,
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    url = response.json()['url']
+    assert url.startswith(f'{media_storage.MEDIA_ROOT}/{transform_engine.TRANSFORMS_DIR}/')
+    assert os.path.exists(url)
+
+
+def test_transformation_for_image_local_unsupported(post_id, client, token, local_engine):
+    transformation = {"art_effect": {"effect": "al_dente"}}
+    response = client.post(f'/api/image/transform/{post_id}', json=transformation,
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400, response.text
+    assert response.json()['detail'].startswith(UNSUPPORTED_TRANSFORMATION)
+
+
 def test_transformation_for_image_not_found(client, token):
     transformation = {"simple_effect": [{"effect": "grayscale", "strength": 100}]}
     response = client.post(f'/api/image/transform/9999', json=transformation,
@@ -139,14 +172,34 @@ def test_save_transform_image(post_id, client, token):
     assert data['photo_url'] == url
 
 
-def test_get_qrcode_for_transform_image(post_id, client, token):
+def test_get_qrcode_for_transform_image(post_id, client, token, tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
     # qrcode = "iVBORw0KGgoAAAANSUhEUgAAAeoAAAHqAQAAAADjFjCXAAADC0lEQVR4nO3aUY6jMAzGcUs9AEfi6hyJA1TKltifY9rdkUpYaR7+eWBayC99sZzYjLWZsRkcDofD4XA4/Ddxi/E4PdzNXhPsmPI0W/tl19QVDp/kq89/tD6/j7Yt/cEzuaYMAYfP8CMYVz173T4WWp6xUAnf15Qe3HD4jXzTM7OleQz3hVyucPj/4ArVmLBkqoTDb+b9T59w7Mg9ck2hGkvm1yHg8AkeQ2H5w8VOIQ2HX+ZlRICOJVUCe9C+TYbDL/OaIP0SSPt15ND3NeDwGb5rR+7Vb2zLsQ9HDHsg13oFDp/iLWOzlyV5b81zoKks8bL4I+bh8O94v+OdFh+lIm5xyUBW0QKHT/EekbW1sugNmqdPnRI9XjOHwuETvNzuI7Nkz5xtHBAd5dkQDr/ObZQgcSwUyk9Wt+9cCA6f4MsIy6fFQks+GGXxrmIYDp/lnhH3h4rcsi1HDMen9o/GCxx+geezcTbUQuOr/8xm9hG0cPglbvkfBP7JPgtfxTUcPs9b9o0jNlu0+0bSLLv0lg0aOHyK1xSonsvxZNcGvepnfDIcPslHgPqnVsqNjOZxSvwsRuDwr3mMDFDvw2R/b/xCywK5weFzvJ4De0R6RWzquYwXH/4zcPg89ybLqsKjvkbT15Iq//JmBA7/mpdZ3lpR+CqkI4dGWQKH38BPXT0rafEtS4624PlYCId/z+tUr36fVspiPyVqq25jwOETPOY/ouY1y7Q4XmgsTcdCOPwGHoXvEi/UWjt1X6I2aSOQVZbA4dd5tPvOHeQ+NtUhY13PpnD4JG8ekcqN8bbWC4+WbZlnXnJxOPwyL3VIFsMxQfEaaxxjLe/X4PCrfAw7d/WiSrH6LjfWgMPnuMJRW3AcEOOeVlNwR/cFDp/jPQRHRsyvMUuZ89Tzg8MneUe6XYJ2rBs51Kxu33D4DTxaeyqGPVX2dUv3rynM4fA7eHRaTKsdI5LmD8dCOPwK738Um5YHRH1Va9lXax+pEg7/nsfQhE0vdD1fZgvacsDhs/zqgMPhcDgcDof/Fv4HhwN5tI0WpSwAAAAASUVORK5CYII="
-    response = client.get(f'/api/image/transform/qrcode/{post_id}', headers={"Authorization": f"Bearer {token}"})
+    response = client.get(f'/api/image/transform/qrcode/{post_id}', params={'format': 'json'},
+                          headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200, response.text
     data = response.json()
     assert data is not None
 
 
+@pytest.mark.parametrize('qr_format, media_type, signature', [('png', 'image/png', b'\x89PNG'),
+                                                              ('svg', 'image/svg+xml', b'<svg')])
+def test_get_qrcode_for_transform_image_raw(post_id, client, token, qr_format, media_type, signature, tmp_path,
+                                            monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(f'/api/image/transform/qrcode/{post_id}', params={'format': qr_format}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers['content-type'] == media_type
+    assert response.content.startswith(signature)
+    etag = response.headers['etag']
+
+    response = client.get(f'/api/image/transform/qrcode/{post_id}', params={'format': qr_format},
+                          headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+
+
 def test_get_transformed_image(post_id, client, token):
     url = 'https://res.cloudinary.com/drilpksk7/image/upload/e_grayscale:100/v1/media/test.jpg'
     response = client.get(f'/api/image/transform/{post_id}', headers={"Authorization": f"Bearer {token}"})
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src.services import cloudynary, media_storage
+
+
+class CountingBackend(cloudynary.MemoryUploadBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def upload(self, image_url: str, public_id: str) -> None:
+        self.calls += 1
+        super().upload(image_url, public_id)
+
+
+@pytest.fixture()
+def backend(tmp_path, monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setattr(cloudynary, 'upload_backend', backend)
+    monkeypatch.setattr(cloudynary, 'upload_registry', cloudynary.UploadRegistry(str(tmp_path / 'uploads.sqlite3')))
+    yield backend
+    cloudynary.shutdown_pool()
+
+
+@pytest.fixture()
+def blob(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_storage, 'MEDIA_ROOT', tmp_path.as_posix())
+    sha256 = 'ab' * 32
+    path = media_storage.blob_path(sha256, '.jpg')
+    (tmp_path / 'ab' / 'ab').mkdir(parents=True)
+    with open(path, 'wb') as f:
+        f.write(b'photo')
+    return path
+
+
+@pytest.mark.asyncio
+async def test_upload_image_once(backend, blob):
+    await asyncio.gather(cloudynary.upload_image(blob), cloudynary.upload_image(blob))
+    await cloudynary.upload_image(blob)
+
+    assert backend.calls == 1
+    assert backend.uploads == {cloudynary.get_public_id(blob): blob}
+
+
+@pytest.mark.asyncio
+async def test_upload_registry_persistent(backend, blob, monkeypatch):
+    await cloudynary.upload_image(blob)
+    # a restarted process finds the original in the registry file
+    monkeypatch.setattr(cloudynary, 'upload_registry', cloudynary.UploadRegistry(cloudynary.upload_registry.path))
+    await cloudynary.upload_image(blob)
+    assert backend.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_image_changed_content(backend, tmp_path):
+    path = (tmp_path / 'legacy.jpg').as_posix()
+    with open(path, 'wb') as f:
+        f.write(b'first')
+    await cloudynary.upload_image(path)
+    await cloudynary.upload_image(path)
+    with open(path, 'wb') as f:
+        f.write(b'second')
+    await cloudynary.upload_image(path)
+    assert backend.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_get_transformed_url(backend, blob):
+    url = await cloudynary.get_transformed_url(blob, [{'angle': 90}])
+    assert 'a_90' in url
+    assert cloudynary.get_public_id(blob) in backend.uploads